@@ -11,23 +11,263 @@ v3.0 License.
 
 ################################################################################
 
-from itertools import chain
-from collections import defaultdict
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict, deque, OrderedDict
 
-import nltk
-from nltk.util import bigrams, trigrams
-from nltk.probability import ConditionalFreqDist
-from nltk.probability import ConditionalProbDist
+import frozen
 
 ################################################################################
 ################################################################################
 
-__all__ = [ 'GazBasedModel']
+__all__ = [ 'ScoreCache',
+            'CountTable',
+            'GazBasedModel']
+
+################################################################################
+
+class ScoreCache(object):
+    '''Bounded memoization of the phrase probabilities. The same phrases (e.g.,
+    "anna salai", "mount road") are scored over and over while building the
+    trees of a stream of tweets.
+
+        maxsize:  the maximum number of cached phrases, 0 disables the cache
+
+        eviction: "lru" evicts the least recently used phrase and "fifo" the
+                  oldest cached phrase, which is cheaper on hits'''
+
+    evictions = ("lru", "fifo")
+
+    def __init__(self, maxsize=100000, eviction="lru"):
+
+        if eviction not in self.evictions:
+            raise ValueError("Unknown cache eviction: %s" % eviction)
+
+        self.maxsize = maxsize
+        self.eviction = eviction
+
+        self._lock = threading.Lock()
+
+        self.clear()
+
+    def __getstate__(self):
+        '''Only the configuration of the cache is pickled'''
+
+        return {"maxsize": self.maxsize, "eviction": self.eviction}
+
+    def __setstate__(self, state):
+
+        self.__init__(state["maxsize"], state["eviction"])
+
+    def clear(self):
+        '''Empties the cache and resets its counters'''
+
+        with self._lock:
+
+            if self.eviction == "lru":
+                self._scores = OrderedDict()
+            else:
+                self._scores = dict()
+                self._order = deque()
+
+            self.hits = 0
+            self.misses = 0
+            self.evicted = 0
+
+    def get(self, phrase):
+        '''Returns the cached probability of the phrase or None'''
+
+        with self._lock:
+
+            if self.eviction == "lru":
+                score = self._scores.pop(phrase, None)
+                if score is not None:
+                    self._scores[phrase] = score
+            else:
+                score = self._scores.get(phrase)
+
+            if score is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+            return score
+
+    def peek(self, phrase):
+        '''Returns the cached probability of the phrase or None, without
+        counting it nor updating its recency'''
+
+        return self._scores.get(phrase)
+
+    def put(self, phrase, score):
+        '''Caches the probability of the phrase evicting the older phrases
+        when the cache is full'''
+
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+
+            if phrase in self._scores:
+                return
+
+            while len(self._scores) >= self.maxsize:
+
+                if self.eviction == "lru":
+                    self._scores.popitem(last=False)
+                else:
+                    del self._scores[self._order.popleft()]
+
+                self.evicted += 1
+
+            self._scores[phrase] = score
+
+            if self.eviction == "fifo":
+                self._order.append(phrase)
+
+    def items(self):
+        '''Returns the list of the cached (phrase, probability) pairs, from the
+        first to be evicted to the last'''
+
+        with self._lock:
+
+            if self.eviction == "lru":
+                return self._scores.items()
+
+            return [(phrase, self._scores[phrase]) for phrase in self._order]
+
+    def stats(self):
+        '''Returns the counters of the cache'''
+
+        with self._lock:
+
+            lookups = self.hits + self.misses
+
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evicted,
+                    "size": len(self._scores),
+                    "maxsize": self.maxsize,
+                    "hit_rate": self.hits / float(lookups) if lookups else 0.0}
+
+################################################################################
+
+class CountTable(object):
+    '''Frequencies of (context id, token id) pairs stored in flat arrays as
+    compressed sparse rows. The tokens following the context c are
+    successors[offsets[c]:offsets[c + 1]] sorted by their ids, with their
+    frequencies at the same positions in counts. The total frequency of every
+    context is kept in totals for the maximum likelihood estimates.'''
+
+    def __init__(self, pair_counts, number_of_contexts):
+        '''Builds the table from a dict of {(context id, token id): count}'''
+
+        self.offsets = array('l', [0]) * (number_of_contexts + 1)
+        self.successors = array('i')
+        self.counts = array('l')
+        self.totals = array('l', [0]) * number_of_contexts
+
+        for context, token_id in sorted(pair_counts):
+
+            count = pair_counts[(context, token_id)]
+
+            self.offsets[context + 1] += 1
+            self.successors.append(token_id)
+            self.counts.append(count)
+            self.totals[context] += count
+
+        for context in xrange(number_of_contexts):
+            self.offsets[context + 1] += self.offsets[context]
+
+    def __len__(self):
+        return len(self.successors)
+
+    def index(self, context, token_id):
+        '''Returns the position of the pair in the table or -1 if the token
+        never follows the context'''
+
+        if context is None or token_id is None or \
+           context >= len(self.totals):
+            return -1
+
+        lo = self.offsets[context]
+        hi = self.offsets[context + 1]
+
+        idx = bisect_left(self.successors, token_id, lo, hi)
+
+        if idx < hi and self.successors[idx] == token_id:
+            return idx
+
+        return -1
+
+    def count(self, context, token_id):
+        '''Returns the frequency of the pair, 0 if the token never follows the
+        context'''
+
+        if context is None or context < 0:
+            return 0
+
+        idx = self.index(context, token_id)
+
+        return self.counts[idx] if idx >= 0 else 0
+
+    def total(self, context):
+        '''Returns the total frequency of the context'''
+
+        if context is None or context < 0 or context >= len(self.totals):
+            return 0
+
+        return self.totals[context]
+
+    def prob(self, context, token_id):
+        '''Returns the MLE probability of the token given the context'''
+
+        if context is None or token_id is None or \
+           context >= len(self.totals):
+            return 0.0
+
+        lo = self.offsets[context]
+        hi = self.offsets[context + 1]
+
+        idx = bisect_left(self.successors, token_id, lo, hi)
+
+        if idx < hi and self.successors[idx] == token_id:
+            return self.counts[idx] / float(self.totals[context])
+
+        return 0.0
+
+################################################################################
+
+def _add_count(counts, key, count):
+    '''Adds to the count of the key, dropping the counts which cancel out'''
+
+    counts[key] += count
+
+    if counts[key] == 0:
+        del counts[key]
 
 ################################################################################
 
 class GazBasedModel(object):
-    '''The implementation of the language model using NLTK.'''
+    '''The implementation of the gazetteer-based n-gram language model. The
+    tokens are interned to integer ids and the bigram and trigram frequencies
+    are kept in flat count tables (see CountTable). The names added or removed
+    afterwards (see add_name and remove_name) update the frequencies in small
+    dictionaries on top of the count tables.'''
+
+    def _conditional_probability(self, table, context, token_id, updates,
+                                 total_updates, key, context_key):
+        '''Returns the MLE probability of the token given the context from the
+        frequencies of the count table and their updates'''
+
+        count = table.count(context, token_id) + updates.get(key, 0)
+
+        if count <= 0:
+            return 0.0
+
+        return count / float(table.total(context) +
+                             total_updates.get(context_key, 0))
 
     def _bigram_probability(self, n_gram):
         '''Returns the probability of bigrams using the following equation:
@@ -36,16 +276,22 @@ class GazBasedModel(object):
 
 
         # p(w_0)
-        prob = (self.unigrams["words"][n_gram[0]] /
+        prob = (self.unigrams["words"].get(n_gram[0], 0) /
                 float(self.unigrams["words_count"]))
 
         if len(n_gram) == 2:
 
-            t1 = n_gram[0]
-            t2 = n_gram[1]
+            t1 = self.token_ids.get(n_gram[0])
+            t2 = self.token_ids.get(n_gram[1])
 
             # p(w_1 | w_0)
-            prob *= self.cpd_bigrams[t1].prob(t2)
+            if self.bigram_updates:
+                prob *= self._conditional_probability(self.bigrams, t1, t2,
+                                                      self.bigram_updates,
+                                                      self.bigram_total_updates,
+                                                      (t1, t2), t1)
+            else:
+                prob *= self.bigrams.prob(t1, t2)
 
         return prob
 
@@ -54,7 +300,37 @@ class GazBasedModel(object):
     def phrase_probability(self, phrase):
         '''Returns the probability of a phrase using the following equation:
 
-            p (w_1 ... w_n) = p (w1) x p(w2 | w_1) ... x p (w_n | w_n-1) '''
+            p (w_1 ... w_n) = p (w1) x p(w2 | w_1) ... x p (w_n | w_n-1)
+
+        The probabilities are memoized in the bounded cache of the model.'''
+
+        score = self.cache.get(phrase)
+
+        if score is None:
+            score = self._phrase_probability(phrase)
+            self.cache.put(phrase, score)
+
+        return score
+
+    ############################################################################
+
+    def phrase_probability_batch(self, phrases):
+        '''Returns the list of probabilities of a list of phrases, e.g., all the
+        candidate phrases of a tree level. Every distinct phrase is scored once
+        per batch.'''
+
+        scores = dict()
+
+        for phrase in phrases:
+            if phrase not in scores:
+                scores[phrase] = self.phrase_probability(phrase)
+
+        return [scores[phrase] for phrase in phrases]
+
+    ############################################################################
+
+    def _phrase_probability(self, phrase):
+        '''Calculates the probability of a phrase using the language model'''
 
 
         n_gram = phrase.split()
@@ -66,15 +342,28 @@ class GazBasedModel(object):
             # this will take care of p(w_0) * p(w_1|w_0)
             prob = self._bigram_probability(n_gram[:2])
 
+            ids = [self.token_ids.get(t) for t in n_gram]
+
             # calculate the probabilities where n > 3
             for __x in range(2, len(n_gram)):
 
-                # I went home > t12 = I went , t3 = home
-                t12 = " ".join(n_gram[__x - 2:__x])
-                t3 = n_gram[__x]
+                # I went home > t12 = I went , t3 = home. The context t12 is the
+                # position of the bigram (I, went) in the bigrams table
+                t12 = self.bigrams.index(ids[__x - 2], ids[__x - 1])
+                t3 = ids[__x]
 
                 # p(w_i | w_i-2 w_i-1)
-                prob *= self.cpd_trigrams[t12].prob(t3)
+                if self.trigram_updates:
+                    t1, t2 = ids[__x - 2], ids[__x - 1]
+
+                    prob *= self._conditional_probability(self.trigrams, t12,
+                                                    t3, self.trigram_updates,
+                                                    self.trigram_total_updates,
+                                                    (t1, t2, t3), (t1, t2))
+                elif t12 < 0:
+                    prob *= 0.0
+                else:
+                    prob *= self.trigrams.prob(t12, t3)
 
             return prob
 
@@ -85,59 +374,159 @@ class GazBasedModel(object):
 
     ############################################################################
 
-    def __init__(self, geo_locations):
-        '''Initializes the language model by creating the ConditionalFreqDist
-        and ConditionalProbDist'''
+    def __init__(self, geo_locations, cache_size=100000, cache_eviction="lru"):
+        '''Initializes the language model by counting the n-grams of the
+        gazetteer names into the count tables, and the cache of the phrase
+        probabilities of size cache_size (see ScoreCache)'''
 
-        words_count = 0
+        self.cache = ScoreCache(cache_size, cache_eviction)
 
-        # will contain all names in a list which preserves their frequenceis as
-        # they appear in the gazetteer. The frequenceis are going to be used in
-        # the language model.
-        gaz_n_grams = list()
+        words_count = 0
 
         self.unigrams = defaultdict(int)
 
+        # token > integer id
+        self.token_ids = dict()
+
+        # the n-grams are counted once per mention of the name in the
+        # gazetteer by adding the number of mentions directly to their counts,
+        # so the memory used is proportional to the distinct n-grams only
+        bigram_counts = defaultdict(int)
+
         for ln in geo_locations:
 
             number_of_mentions = len(geo_locations[ln])
 
             n_gram = ln.split()
 
-            new_list = [n_gram] * number_of_mentions
-
-            gaz_n_grams.extend(new_list)
-
             for token in n_gram:
                 words_count += 1
                 self.unigrams[token] += 1
 
-        self.unigrams = {"words": self.unigrams, "words_count": words_count}
+                if token not in self.token_ids:
+                    self.token_ids[token] = len(self.token_ids)
 
-        # bigrams +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-        train_bigrams = list(chain(*[bigrams(i) for i in gaz_n_grams]))
+            if number_of_mentions == 0:
+                continue
 
-        cfd_bigrams = ConditionalFreqDist()
+            ids = [self.token_ids[token] for token in n_gram]
 
-        for bg in train_bigrams:
-            cfd_bigrams[bg[0]][bg[1]] += 1
+            for bg in zip(ids, ids[1:]):
+                bigram_counts[bg] += number_of_mentions
+
+        self.unigrams = {"words": self.unigrams, "words_count": words_count}
 
         # bigrams MLE probabilities
-        self.cpd_bigrams = ConditionalProbDist(cfd_bigrams, nltk.MLEProbDist)
+        self.bigrams = CountTable(bigram_counts, len(self.token_ids))
+
+        del bigram_counts
 
-        # trigrams ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-        train_trigrams = list(chain(*[trigrams(i) for i in gaz_n_grams]))
+        # trigrams +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-        cfd_trigrams = ConditionalFreqDist()
+        # counted in a second pass since the context of a trigram is the
+        # position of its first two tokens in the bigrams table
+        trigram_counts = defaultdict(int)
 
-        for bg in train_trigrams:
+        for ln in geo_locations:
 
-            bi_gr = " ".join(bg[:-1])
+            number_of_mentions = len(geo_locations[ln])
 
-            cfd_trigrams[bi_gr][bg[2]] += 1
+            if number_of_mentions == 0:
+                continue
+
+            ids = [self.token_ids[token] for token in ln.split()]
+
+            for __x in range(2, len(ids)):
+
+                bi_gr = self.bigrams.index(ids[__x - 2], ids[__x - 1])
+
+                trigram_counts[(bi_gr, ids[__x])] += number_of_mentions
 
         # trigrams MLE probabilities
-        self.cpd_trigrams = ConditionalProbDist(cfd_trigrams, nltk.MLEProbDist)
+        self.trigrams = CountTable(trigram_counts, len(self.bigrams))
+
+        # updates of the frequencies by add_name and remove_name keyed by the
+        # token ids of the n-grams and of their contexts
+        self.bigram_updates = defaultdict(int)
+        self.bigram_total_updates = defaultdict(int)
+        self.trigram_updates = defaultdict(int)
+        self.trigram_total_updates = defaultdict(int)
+
+    ############################################################################
+
+    def _update_name(self, ln, number_of_mentions, sign):
+        '''Adds (sign=1) or subtracts (sign=-1) the n-grams of a location name
+        to the frequencies, the same way they are counted when initializing'''
+
+        n_gram = ln.split()
+
+        for token in n_gram:
+
+            self.unigrams["words_count"] += sign
+            self.unigrams["words"][token] += sign
+
+            # the unigrams are the tokens of the gazetteer names
+            if self.unigrams["words"][token] <= 0:
+                del self.unigrams["words"][token]
+
+            if token not in self.token_ids:
+                self.token_ids[token] = len(self.token_ids)
+
+        if number_of_mentions > 0:
+
+            weight = sign * number_of_mentions
+
+            ids = [self.token_ids[token] for token in n_gram]
+
+            for bg in zip(ids, ids[1:]):
+                _add_count(self.bigram_updates, bg, weight)
+                _add_count(self.bigram_total_updates, bg[0], weight)
+
+            for tg in zip(ids, ids[1:], ids[2:]):
+                _add_count(self.trigram_updates, tg, weight)
+                _add_count(self.trigram_total_updates, tg[:2], weight)
+
+        # every probability depends on the total number of words
+        self.cache.clear()
+
+    def add_name(self, ln, number_of_mentions):
+        '''Counts the n-grams of a location name added to the gazetteer'''
+
+        self._update_name(ln, number_of_mentions, 1)
+
+    def remove_name(self, ln, number_of_mentions):
+        '''Discounts the n-grams of a location name removed from the gazetteer,
+        with the number of mentions it was counted with'''
+
+        self._update_name(ln, number_of_mentions, -1)
+
+    def count(self, n_gram):
+        '''Returns the frequency of a unigram, bigram or trigram (tuple of
+        tokens), bigrams and trigrams are counted once per mention'''
+
+        if len(n_gram) == 1:
+            return self.unigrams["words"].get(n_gram[0], 0)
+
+        ids = tuple(self.token_ids.get(token) for token in n_gram)
+
+        if len(n_gram) == 2:
+            return self.bigrams.count(ids[0], ids[1]) + \
+                   self.bigram_updates.get(ids, 0)
+
+        t12 = self.bigrams.index(ids[0], ids[1])
+
+        return self.trigrams.count(t12, ids[2]) + \
+               self.trigram_updates.get(ids, 0)
+
+    ############################################################################
+
+    def freeze(self):
+        '''Converts the dictionaries of the tokens to read-only flat buffers
+        (see frozen.FrozenStringMap), the count tables are already flat'''
+
+        self.token_ids = frozen.FrozenStringMap(self.token_ids)
+
+        self.unigrams["words"] = frozen.FrozenStringMap(self.unigrams["words"])
 
 ################################################################################
 
@@ -6,10 +6,11 @@ v3.0 License.
 #############################################################################"""
 
 import core
-import osm_gazetteer
+from core import Extractor, WorkerPool, memory_usage
 import os, json
 
-import elasticsearch
+# osm_gazetteer (elasticsearch, elasticsearch_dsl and geopy) is imported only
+# when the elastic index is used, which keeps importing LNEx fast
 
 ################################################################################
 ################################################################################
@@ -17,20 +18,51 @@ import elasticsearch
 __all__ = [ 'initialize_using_files',
             'initialize',
             'extract',
+            'extract_exact',
+            'extract_batch',
+            'extract_stream',
+            'save_environment',
+            'load_environment',
+            'freeze_environment',
+            'rebuild_environment',
+            'environment_status',
+            'enable_stats',
+            'disable_stats',
+            'extraction_stats',
+            'cache_stats',
+            'add_locations',
+            'remove_locations',
+            'save_hashtag_cache',
+            'load_hashtag_cache',
+            'Extractor',
+            'WorkerPool',
+            'memory_usage',
             'elasticindex']
 
 ################################################################################
 
-def initialize_using_files(geo_locations, extended_words3, capital_word_shape=False):
+def initialize_using_files(geo_locations, extended_words3, capital_word_shape=False,
+                           engine="tree", exact_first=False,
+                           lm_cache_size=100000, lm_cache_eviction="lru",
+                           hashtag_segmenter="wordsegment",
+                           work_budget=None):
     """Initialize LNEx using files in _Data without using the elastic index"""
 
-    core.initialize(geo_locations, extended_words3, capital_word_shape)
+    core.initialize(geo_locations, extended_words3, capital_word_shape, engine,
+                    exact_first, lm_cache_size, lm_cache_eviction,
+                    hashtag_segmenter, work_budget)
 
 ################################################################################
 
-def initialize(bb, augment, cache, dataset_name, capital_word_shape=False):
+def initialize(bb, augment, cache, dataset_name, capital_word_shape=False,
+               engine="tree", exact_first=False, lm_cache_size=100000,
+               lm_cache_eviction="lru", hashtag_segmenter="wordsegment",
+               work_budget=None):
     """Initialize LNEx using the elastic index"""
 
+    import elasticsearch
+    import osm_gazetteer
+
     geo_locations = None
     geo_info = None
     extended_words3 = None
@@ -43,7 +75,9 @@ def initialize(bb, augment, cache, dataset_name, capital_word_shape=False):
             pass
 
     # initialize LNEx using the retrieved (possible augmented) location names
-    core.initialize(geo_locations, extended_words3, capital_word_shape)
+    core.initialize(geo_locations, extended_words3, capital_word_shape, engine,
+                    exact_first, lm_cache_size, lm_cache_eviction,
+                    hashtag_segmenter, work_budget)
 
     if cache:
 
@@ -64,6 +98,111 @@ def initialize(bb, augment, cache, dataset_name, capital_word_shape=False):
 
 ################################################################################
 
+def save_environment(path):
+    """Saves the initialized LNEx environment (gazetteer, language model and
+    dictionaries) to a snapshot file"""
+
+    core.save_environment(path)
+
+################################################################################
+
+def load_environment(path, capital_word_shape=False, engine="tree",
+                     exact_first=False, hashtag_segmenter="wordsegment",
+                     work_budget=None):
+    """Initialize LNEx from a snapshot file saved using save_environment"""
+
+    core.load_environment(path, capital_word_shape, engine, exact_first,
+                          hashtag_segmenter, work_budget)
+
+################################################################################
+
+def freeze_environment():
+    """Converts the initialized LNEx environment to read-only flat buffers
+    which are shared by the worker processes forked afterwards"""
+
+    core.freeze_environment()
+
+################################################################################
+
+def rebuild_environment(geo_locations, extended_words3, wait=False):
+    """Rebuilds the LNEx environment from the updated location names in the
+    background and atomically swaps it in without blocking the extraction"""
+
+    return core.rebuild_environment(geo_locations, extended_words3, wait=wait)
+
+################################################################################
+
+def environment_status():
+    """Returns the version of the LNEx environment and the duration of its
+    last rebuild and swap"""
+
+    return core.environment_status()
+
+################################################################################
+
+def enable_stats():
+    """Starts recording the wall time of the stages of the extraction and the
+    work done, e.g., before starting the worker processes"""
+
+    core.enable_stats()
+
+################################################################################
+
+def disable_stats():
+    """Stops recording the stats of the extraction"""
+
+    core.disable_stats()
+
+################################################################################
+
+def extraction_stats():
+    """Returns the histograms of the stage times and the counters recorded
+    since enable_stats, and the stage times of the initialization"""
+
+    return core.extraction_stats()
+
+################################################################################
+
+def cache_stats():
+    """Returns the hits, misses and evictions of the caches of the language
+    model probabilities and of the hashtag segmentations in this process"""
+
+    return core.cache_stats()
+
+################################################################################
+
+def add_locations(geo_locations_delta, augment=None):
+    """Adds location names to the LNEx environment without rebuilding it. With
+    augment=True (or False) the raw names retrieved from the elastic index are
+    augmented (or only filtered) the same way as when initializing"""
+
+    return core.add_locations(geo_locations_delta, augment)
+
+################################################################################
+
+def remove_locations(names):
+    """Removes location names from the LNEx environment without rebuilding
+    it"""
+
+    return core.remove_locations(names)
+
+################################################################################
+
+def save_hashtag_cache(path):
+    """Saves the cached hashtag segmentations to a json file"""
+
+    core.save_hashtag_cache(path)
+
+################################################################################
+
+def load_hashtag_cache(path):
+    """Loads the hashtag segmentations saved using save_hashtag_cache, e.g.,
+    before starting the worker processes"""
+
+    core.load_hashtag_cache(path)
+
+################################################################################
+
 def extract(tweet):
     """Extracts location names from a tweet text and return a list of tuples"""
 
@@ -71,8 +210,35 @@ def extract(tweet):
 
 ################################################################################
 
+def extract_exact(tweet):
+    """Extracts only the location names which exactly match gazetteer names
+    (no abbreviations or misspellings) in a single pass over the tweet"""
+
+    return core.extract_exact(tweet)
+
+################################################################################
+
+def extract_batch(tweets, workers=None, chunksize=None, pool=None):
+    """Extracts location names from a list of tweets using a pool of worker
+    processes (or an existing WorkerPool) and returns the list of outputs in
+    the same order as the input"""
+
+    return core.extract_batch(tweets, workers, chunksize, pool)
+
+################################################################################
+
+def extract_stream(tweets, workers=1, batch_size=1000, pool=None):
+    """Lazily extracts location names from an iterable of tweets (e.g., a file)
+    and yields the outputs one by one in the same order as the input"""
+
+    return core.extract_stream(tweets, workers, batch_size, pool=pool)
+
+################################################################################
+
 def elasticindex(conn_string, index_name):
     """sets the elasticindex connection string and index name where the
     gazetteer data resides"""
 
+    import osm_gazetteer
+
     osm_gazetteer.set_elasticindex_conn(conn_string, index_name)
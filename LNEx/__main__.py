@@ -0,0 +1,308 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Streams tweets line by line from files (or stdin) through LNEx and writes one
+# JSON line of results per tweet, e.g.:
+#
+#   cat tweets.txt | python -m LNEx --geo-locations chennai_geo_locations.json \
+#                                   --extended-words3 chennai_extended_words3.json
+
+import os
+import sys
+import json
+import argparse
+from collections import deque
+
+import LNEx as lnex
+
+################################################################################
+################################################################################
+
+def phrases(value):
+    '''Parses a work budget of phrases, "none" for no limit'''
+
+    if value.lower() == "none":
+        return None
+
+    value = int(value)
+
+    if value < 0:
+        raise argparse.ArgumentTypeError("must not be negative")
+
+    return value
+
+def engine_work_budgets(idx):
+    '''Returns the default work budgets of the engines for the help, idx 0
+    of the tweets and 1 of the sub-queries'''
+
+    return ", ".join("%s %s" % (engine, budget[idx]) for engine, budget in
+                     sorted(lnex.core.default_work_budgets.items()))
+
+################################################################################
+
+def add_environment_arguments(parser):
+    '''Adds the arguments of initializing the environment and its options,
+    also used by LNEx.serve'''
+
+    parser.add_argument("--geo-locations",
+        help="JSON file of the gazetteer location names, "
+             "e.g., _Data/chennai_geo_locations.json")
+    parser.add_argument("--extended-words3",
+        help="JSON file of the list of english words and gazetteer tokens")
+    parser.add_argument("--environment",
+        help="environment snapshot saved by LNEx.save_environment, used "
+             "instead of --geo-locations and --extended-words3")
+    parser.add_argument("--capital-word-shape", action="store_true",
+        help="use the capitalization orthographic feature")
+    parser.add_argument("--engine", choices=["tree", "dp"], default="tree",
+        help="engine used for building the valid n-grams (default: tree)")
+    parser.add_argument("--exact-first", action="store_true",
+        help="resolve the exact gazetteer matches first and run the engine "
+             "only around the tokens they do not resolve")
+    parser.add_argument("--hashtag-segmenter",
+        choices=["wordsegment", "gazetteer"], default="wordsegment",
+        help="model used for breaking the hashtags into words, the gazetteer "
+             "uses the unigrams of the language model (default: wordsegment)")
+    parser.add_argument("--hashtag-cache", metavar="FILE",
+        help="JSON file of hashtag segmentations loaded at the start, if it "
+             "exists, and saved at the end")
+    parser.add_argument("--work-budget", type=phrases, metavar="PHRASES",
+        default=argparse.SUPPRESS,
+        help="candidate phrases scored per tweet before falling back to exact "
+             "and unigram matches, \"none\" for no limit (default: %s)" %
+             engine_work_budgets(0))
+    parser.add_argument("--sub-query-work-budget", type=phrases,
+        metavar="PHRASES", default=argparse.SUPPRESS,
+        help="candidate phrases scored per sub-query, \"none\" for no limit "
+             "(default: %s)" % engine_work_budgets(1))
+    parser.add_argument("--frozen", action="store_true",
+        help="freeze the environment into read-only buffers shared by the "
+             "worker processes")
+
+def check_environment_arguments(parser, args):
+
+    if args.environment is None and \
+       (args.geo_locations is None or args.extended_words3 is None):
+        parser.error("either --environment or both --geo-locations and "
+                     "--extended-words3 are required")
+
+################################################################################
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(prog="python -m LNEx",
+        description="Extracts location names from a stream of tweets and "
+                    "writes the results as JSON lines.")
+
+    parser.add_argument("inputs", nargs="*", default=["-"],
+        help="input files, one tweet per line (default: stdin)")
+
+    add_environment_arguments(parser)
+
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text",
+        help="format of the input lines (default: text)")
+    parser.add_argument("--text-field", default="text",
+        help="field holding the tweet text in jsonl input (default: text)")
+    parser.add_argument("--output-field", default="locations",
+        help="field the results are written to (default: locations)")
+    parser.add_argument("-o", "--output", default="-",
+        help="output file (default: stdout)")
+
+    parser.add_argument("--workers", type=int, default=1,
+        help="number of worker processes (default: 1)")
+    parser.add_argument("--batch-size", type=int, default=1000,
+        help="number of tweets read ahead per batch (default: 1000)")
+    parser.add_argument("--report-memory", action="store_true",
+        help="write the memory usage (kB) of every worker to stderr at the "
+             "end")
+    parser.add_argument("--report-stats", action="store_true",
+        help="write the stage times and counters of the extraction as JSON to "
+             "stderr at the end")
+
+    args = parser.parse_args(argv)
+
+    check_environment_arguments(parser, args)
+
+    return args
+
+################################################################################
+
+def read_lines(inputs):
+    '''Lazily yields the lines of all input files, "-" is stdin'''
+
+    for fname in inputs:
+
+        f = sys.stdin if fname == "-" else open(fname)
+
+        try:
+            for line in f:
+                yield line.rstrip("\r\n").decode("utf-8", "replace")
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+################################################################################
+
+def read_records(lines, input_format, text_field):
+    '''Yields (record, tweet text) pairs from the input lines'''
+
+    for line in lines:
+
+        if input_format == "text":
+            yield {"text": line}, line
+
+        # skip blank lines between json records
+        elif line.strip():
+            record = json.loads(line)
+            yield record, record.get(text_field) or u""
+
+################################################################################
+
+def to_json(output):
+    '''Converts the output tuple of LNEx.extract to a json serializable dict'''
+
+    location_mention, mention_offsets, geo_location, geo_info_ids = output
+
+    # augmented gazetteers map names to {'main': set(ids), 'meta': set(ids)}
+    if isinstance(geo_info_ids, dict):
+        geo_info_ids = {k: sorted(v) for k, v in geo_info_ids.items()}
+
+    return {"mention": location_mention,
+            "offsets": list(mention_offsets),
+            "geo_location": geo_location,
+            "geo_info_ids": geo_info_ids}
+
+################################################################################
+
+def report_memory(pool):
+    '''Writes the memory usage of the workers (or of this process) to stderr'''
+
+    if pool is None:
+        usage = {"main": lnex.memory_usage()}
+    else:
+        usage = pool.memory_usage()
+
+    for pid in sorted(usage):
+
+        if usage[pid] is None:
+            sys.stderr.write("memory usage of %s: unavailable\n" % pid)
+            continue
+
+        sys.stderr.write("memory usage of %s: " % pid +
+                         "rss %(rss)d kB, pss %(pss)d kB, shared %(shared)d "
+                         "kB, private %(private)d kB\n" % usage[pid])
+
+################################################################################
+
+def initialize_environment(args):
+    '''Initializes the global environment of LNEx using the environment
+    arguments (see add_environment_arguments), before any worker is started'''
+
+    # the budgets which are not given are the defaults of the engine
+    default = lnex.core.default_work_budgets[args.engine]
+
+    work_budget = (getattr(args, "work_budget", default[0]),
+                   getattr(args, "sub_query_work_budget", default[1]))
+
+    # keep the initialization messages out of the output
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        if args.environment is not None:
+            lnex.load_environment(args.environment,
+                                  capital_word_shape=args.capital_word_shape,
+                                  engine=args.engine,
+                                  exact_first=args.exact_first,
+                                  hashtag_segmenter=args.hashtag_segmenter,
+                                  work_budget=work_budget)
+        else:
+            with open(args.geo_locations) as f:
+                geo_locations = json.load(f)
+
+            with open(args.extended_words3) as f:
+                extended_words3 = json.load(f)
+
+            lnex.initialize_using_files(geo_locations, extended_words3,
+                                    capital_word_shape=args.capital_word_shape,
+                                    engine=args.engine,
+                                    exact_first=args.exact_first,
+                                    hashtag_segmenter=args.hashtag_segmenter,
+                                    work_budget=work_budget)
+
+        if args.frozen:
+            lnex.freeze_environment()
+
+        # loaded before the workers are started so that they share it
+        if args.hashtag_cache and os.path.exists(args.hashtag_cache):
+            lnex.load_hashtag_cache(args.hashtag_cache)
+    finally:
+        sys.stdout = stdout
+
+################################################################################
+
+def main(argv=None):
+
+    args = parse_args(argv)
+
+    initialize_environment(args)
+
+    if args.report_stats:
+        lnex.enable_stats()
+
+    # --------------------------------------------------------------------------
+
+    records = read_records(read_lines(args.inputs), args.format,
+                           args.text_field)
+
+    # records are buffered only within the batch being processed
+    pending = deque()
+
+    def tweets():
+        for record, text in records:
+            pending.append(record)
+            yield text
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+
+    pool = lnex.WorkerPool(args.workers) if args.workers > 1 else None
+
+    try:
+        for outputs in lnex.extract_stream(tweets(), args.workers,
+                                           args.batch_size, pool=pool):
+
+            record = pending.popleft()
+            record[args.output_field] = [to_json(x) for x in outputs]
+
+            # only the exact and unigram matches of some sub-queries
+            if getattr(outputs, "degraded", False):
+                record["degraded"] = True
+
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+        if args.report_memory:
+            report_memory(pool)
+
+        if args.report_stats:
+            sys.stderr.write(json.dumps(lnex.extraction_stats()) + "\n")
+
+        if args.hashtag_cache:
+            lnex.save_hashtag_cache(args.hashtag_cache)
+
+        if pool is not None:
+            pool.close()
+    except BaseException:
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+################################################################################
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+from array import array
+from collections import deque, defaultdict
+
+import frozen
+
+################################################################################
+################################################################################
+
+__all__ = [ 'TokenAutomaton']
+
+################################################################################
+
+class TokenAutomaton(object):
+    '''Aho-Corasick automaton over the token ids of the gazetteer names. Finds
+    all the gazetteer names which appear in a list of tokens in a single pass,
+    regardless of the number of names in the gazetteer.'''
+
+    def __init__(self, names):
+        '''Compiles the automaton from the location names (space separated
+        tokens)'''
+
+        # token > token id
+        self.token_ids = dict()
+
+        # the transitions of the trie keyed by (node << 32) | token id
+        self.goto = dict()
+
+        # the number of tokens from the root to every node
+        self.depth = array('i', [0])
+
+        # the gazetteer name which ends at a node
+        self.names = dict()
+
+        for name in names:
+            self._add(name)
+
+        self._build_links()
+
+        # the names added and removed after building the automaton, the added
+        # names are matched using a separate automaton (see add_names)
+        self.added = None
+        self.removed = set()
+
+    ############################################################################
+
+    def _add(self, name):
+        '''Adds the tokens of a location name to the trie'''
+
+        node = 0
+
+        for token in name.split():
+
+            token_id = self.token_ids.setdefault(token, len(self.token_ids))
+
+            key = (node << 32) | token_id
+
+            child = self.goto.get(key)
+
+            if child is None:
+                child = len(self.depth)
+                self.depth.append(self.depth[node] + 1)
+                self.goto[key] = child
+
+            node = child
+
+        if node != 0:
+            self.names[node] = name
+
+    ############################################################################
+
+    def _build_links(self):
+        '''Computes the failure links (the longest proper suffix which is also
+        a path in the trie) and the output links (the longest proper suffix
+        which is a gazetteer name) in breadth first order'''
+
+        children = defaultdict(list)
+
+        for key, child in self.goto.iteritems():
+            children[key >> 32].append((key & 0xFFFFFFFF, child))
+
+        self.fail = array('i', [0]) * len(self.depth)
+        self.output = array('i', [0]) * len(self.depth)
+
+        queue = deque(child for __, child in children[0])
+
+        while queue:
+
+            node = queue.popleft()
+
+            for token_id, child in children[node]:
+
+                # follow the failure links of the parent until the token
+                # can be consumed
+                fail = self.fail[node]
+                while fail and ((fail << 32) | token_id) not in self.goto:
+                    fail = self.fail[fail]
+
+                fail = self.goto.get((fail << 32) | token_id, 0)
+
+                self.fail[child] = fail
+                self.output[child] = fail if fail in self.names else \
+                                     self.output[fail]
+
+                queue.append(child)
+
+    ############################################################################
+
+    def add_names(self, names):
+        '''Adds location names to the automaton. Since the failure links
+        depend on all the names, the added names are compiled into a separate
+        automaton which is rebuilt from the added names only.'''
+
+        added = set(self.added.names.values()) if self.added else set()
+
+        for name in names:
+
+            # a name of this automaton which was removed is matched again
+            if name in self.removed:
+                self.removed.discard(name)
+            elif not self._has_name(name):
+                added.add(name)
+
+        self.added = TokenAutomaton(added) if added else None
+
+    def remove_names(self, names):
+        '''Removes location names from the automaton'''
+
+        names = set(names)
+
+        if self.added:
+            added = set(self.added.names.values())
+
+            if added & names:
+                added -= names
+                self.added = TokenAutomaton(added) if added else None
+
+        self.removed.update(name for name in names if self._has_name(name))
+
+    def _has_name(self, name):
+        '''Checks whether the name was compiled into this automaton'''
+
+        node = 0
+
+        for token in name.split():
+
+            token_id = self.token_ids.get(token)
+
+            if token_id is None:
+                return False
+
+            node = self.goto.get((node << 32) | token_id)
+
+            if node is None:
+                return False
+
+        return node in self.names
+
+    ############################################################################
+
+    def freeze(self):
+        '''Converts the dictionaries of the automaton to read-only flat buffers
+        (see frozen.FrozenStringMap and frozen.FrozenIntMap)'''
+
+        self.token_ids = frozen.FrozenStringMap(self.token_ids)
+        self.goto = frozen.FrozenIntMap(self.goto)
+        self.names = frozen.FrozenIntMap(self.names)
+
+        if self.added:
+            self.added.freeze()
+
+    ############################################################################
+
+    def scan(self, tokens):
+        '''Yields (start index, end index, name) of all the gazetteer names
+        which match a sequence of consecutive tokens, including the nested and
+        the overlapping ones'''
+
+        for start, end, name in self._scan(tokens):
+            if name not in self.removed:
+                yield start, end, name
+
+        if self.added:
+            for match in self.added.scan(tokens):
+                yield match
+
+    def _scan(self, tokens):
+
+        node = 0
+
+        for idx, token in enumerate(tokens):
+
+            token_id = self.token_ids.get(token)
+
+            # a token which is not part of any gazetteer name
+            if token_id is None:
+                node = 0
+                continue
+
+            while node and ((node << 32) | token_id) not in self.goto:
+                node = self.fail[node]
+
+            node = self.goto.get((node << 32) | token_id, 0)
+
+            match = node if node in self.names else self.output[node]
+
+            while match:
+                yield idx - self.depth[match] + 1, idx, self.names[match]
+                match = self.output[match]
@@ -7,58 +7,120 @@ v3.0 License.
 
 import re
 import os
+import gc
 import json
+import time
+import bisect
 import string
+import cPickle
+import threading
 import itertools
 import collections
 import unicodedata
+import multiprocessing
 from itertools import groupby
-from wordsegment import load, segment
 from operator import itemgetter
 from collections import defaultdict
 
-load()
-
 # importing local modules
 import Language_Modeling
+import gaz_augmentation_and_filtering
+import aho_corasick
+import snapshot
+import segmentation
+import frozen
 from tokenizer import Twokenize
 
 ################################################################################
 ################################################################################
 
 __all__ = [ 'set_global_env',
+            'set_global_extractor',
             'Stack',
             'Tree',
+            'NgramPrefixSet',
+            'segment',
+            'preprocess_and_map',
             'preprocess_tweet',
+            'align_tokens',
             'flatten',
+            'WorkBudgetExhausted',
+            'WorkBudget',
+            'StageTimer',
+            'NullTimer',
+            'ExtractedLocations',
             'build_tree',
+            'build_spans',
+            'set_engine',
             'using_split2',
             'findall',
             'align_and_split',
+            'has_gazetteer_vocabulary',
+            'has_raw_gazetteer_vocabulary',
+            'add_exact_matches',
             'extract',
+            'extract_exact',
+            'extract_batch',
+            'extract_stream',
+            'memory_usage',
+            'PrefilterCounters',
+            'ExtractionStats',
+            'WorkerPool',
+            'WorkerResult',
             'do_they_overlap',
             'filterout_overlaps',
+            'pairwise_filterout_overlaps',
+            'remove_shorter_duplicates',
             'find_ngrams',
+            'index_query_tokens',
             'remove_non_full_mentions',
             'init_Env',
-            'initialize']
+            'Extractor',
+            'initialize',
+            'save_environment',
+            'load_environment',
+            'freeze_environment',
+            'rebuild_environment',
+            'environment_status',
+            'enable_stats',
+            'disable_stats',
+            'extraction_stats',
+            'cache_stats',
+            'add_locations',
+            'remove_locations',
+            'save_hashtag_cache',
+            'load_hashtag_cache']
 
 ################################################################################
 
 printable = set(string.printable)
 exclude = set(string.punctuation)
 
-# LNEx global environment
+# LNEx global environment and the extractor using it, which are used by the
+# module-wide functions
 env = None
+global_extractor = None
+
+def set_global_extractor(extractor):
+    '''Sets the global extractor and its environment to be used module-wide'''
+
+    global env, global_extractor
+    env = extractor.env
+    global_extractor = extractor
 
 def set_global_env(g_env):
     '''Sets the global environment at the time of initialization to be used
-    module-wide'''
-
-    global env
-    env = g_env
+    module-wide, keeping the options of the global extractor'''
 
-cap_word_shape = False
+    if global_extractor is None:
+        set_global_extractor(Extractor.from_environment(g_env))
+    else:
+        set_global_extractor(Extractor.from_environment(g_env,
+                                            global_extractor.capital_word_shape,
+                                            global_extractor.engine,
+                                            global_extractor.exact_first,
+                                            global_extractor.hashtag_segmenter,
+                                            global_extractor.work_budget))
 
 ################################################################################
 
@@ -100,6 +162,92 @@ class Tree(object):
 
 ################################################################################
 
+class NgramPrefixSet(object):
+    '''Hash sets of the token windows (unigrams, bigrams and trigrams) of the
+    gazetteer location names. A phrase is a candidate location name only if
+    each of its windows is a prefix or an infix of a gazetteer name, which is
+    exactly when the gazetteer language model gives it a non-zero probability.
+    This allows pruning the candidate phrases with constant-time lookups
+    instead of scoring every one of them using the language model. The windows
+    are kept as space separated strings.'''
+
+    def __init__(self, geo_locations):
+
+        self.unigrams = set()
+        self.bigrams = set()
+        self.trigrams = set()
+
+        for ln in geo_locations:
+            self.add(ln, len(geo_locations[ln]))
+
+    def add(self, ln, number_of_mentions):
+        '''Adds the windows of a location name'''
+
+        n_gram = ln.split()
+
+        self.unigrams.update(n_gram)
+
+        # the language model counts bigrams and trigrams once per mention
+        if number_of_mentions == 0:
+            return
+
+        self.bigrams.update(" ".join(bg) for bg in zip(n_gram, n_gram[1:]))
+        self.trigrams.update(" ".join(tg) for tg in
+                             zip(n_gram, n_gram[1:], n_gram[2:]))
+
+    def discard(self, ln, glm):
+        '''Removes the windows of a location name removed from the gazetteer
+        which are not part of any other name, i.e., whose frequencies in the
+        language model (glm) dropped to zero'''
+
+        n_gram = ln.split()
+
+        for windows, n in ((self.unigrams, 1), (self.bigrams, 2),
+                           (self.trigrams, 3)):
+
+            for window in zip(*[n_gram[i:] for i in range(n)]):
+                if glm.count(window) <= 0:
+                    windows.discard(" ".join(window))
+
+    def __contains__(self, phrase):
+        '''Checks whether the phrase (space separated tokens) could have a
+        non-zero probability in the language model'''
+
+        n_gram = phrase.split()
+
+        if len(n_gram) == 1:
+            return n_gram[0] in self.unigrams
+
+        elif len(n_gram) == 2:
+            return " ".join(n_gram) in self.bigrams
+
+        # the trigram windows also cover the first bigram
+        for __x in range(2, len(n_gram)):
+            if " ".join(n_gram[__x - 2:__x + 1]) not in self.trigrams:
+                return False
+
+        return True
+
+    def freeze(self):
+        '''Converts the sets of windows to read-only flat buffers'''
+
+        self.unigrams = frozen.FrozenStringMap(self.unigrams)
+        self.bigrams = frozen.FrozenStringMap(self.bigrams)
+        self.trigrams = frozen.FrozenStringMap(self.trigrams)
+
+################################################################################
+
+# the general-purpose hashtag segmenter shared by all the extractors, its
+# corpora are loaded on the first hashtag
+word_segmenter = segmentation.WordSegmenter()
+
+def segment(text):
+    '''Breaks a hashtag into the list of its words using wordsegment'''
+
+    return word_segmenter.segment(text)
+
+################################################################################
+
 def strip_non_ascii(s):
     if isinstance(s, unicode):
         nfkd = unicodedata.normalize('NFKD', s)
@@ -107,34 +255,110 @@ def strip_non_ascii(s):
     else:
         return s
 
-def preprocess_tweet(tweet):
-    '''Preprocesses the tweet text and break the hashtags'''
+# the normalizations of preprocess_tweet, applied in this order. The removed
+# urls, "http" and mentions:
+url_re = re.compile(r'\w+:\/{2}[\d\w-]+(\.[\d\w-]+)*(?:(?:\/[^\s/]*))*')
+https_re = re.compile(" https")
+http_re = re.compile("http")
+mention_re = re.compile(r"@\w+")
+
+# the non-printable characters, which are removed
+nonprintable_re = re.compile("[^%s]" % re.escape(string.printable))
+
+hashtag_re = re.compile(r"#\w+")
+
+# the punctuations padded with spaces, the dots only when followed by a space
+pad_re = re.compile("[,!?():]")
+dot_re = re.compile(r"\. ")
+
+# replaced by a space
+newline_re = re.compile("\n")
+dash_re = re.compile("-")
+spaces_re = re.compile(r"\s{2,}")
+
+def sub_and_map(pattern, replace, text, offsets):
+    '''Replaces the matches of the pattern in the text as re.sub, and maps the
+    offsets of the characters of the text (a list) to the new text.
+    replace(match, match_offsets) returns the replacement and the offsets of
+    its characters.
+
+        returns the new text and the offsets of its characters'''
+
+    pieces = list()
+    new_offsets = list()
+
+    last = 0
+
+    for match in pattern.finditer(text):
+
+        start, end = match.span()
+
+        replacement, replacement_offsets = replace(match, offsets[start:end])
+
+        pieces.append(text[last:start])
+        pieces.append(replacement)
+
+        new_offsets.extend(offsets[last:start])
+        new_offsets.extend(replacement_offsets)
+
+        last = end
+
+    # no match
+    if not pieces:
+        return text, offsets
+
+    pieces.append(text[last:])
+    new_offsets.extend(offsets[last:])
+
+    return "".join(pieces), new_offsets
+
+def remove(match, offsets):
+    return "", ()
+
+def replace_by_space(match, offsets):
+    return " ", offsets[:1]
+
+def pad_punctuation(match, offsets):
+    return " %s " % match.group(), offsets * 3
+
+def pad_dot(match, offsets):
+    return " . ", (offsets[0], offsets[0], offsets[1])
+
+def preprocess_and_map(tweet, segment_hashtag=segment):
+    '''Preprocesses the tweet text and break the hashtags using
+    segment_hashtag, while keeping the offset in the tweet of every character
+    of the preprocessed text, so that its tokens are aligned by lookup.
+
+        returns the preprocessed tweet and the list of the offsets in the tweet
+        of each of its characters'''
+
+    offsets = range(len(tweet))
 
     # remove retweet handler
     if tweet[:2] == "rt":
-        try:
-            colon_idx = tweet.index(": ")
+        colon_idx = tweet.find(": ")
+        if colon_idx != -1:
             tweet = tweet[colon_idx + 2:]
-        except BaseException:
-            pass
+            offsets = offsets[colon_idx + 2:]
 
     # remove url from tweet
-    tweet = re.sub(
-        r'\w+:\/{2}[\d\w-]+(\.[\d\w-]+)*(?:(?:\/[^\s/]*))*',
-        '',
-        tweet)
+    tweet, offsets = sub_and_map(url_re, remove, tweet, offsets)
 
     # remove non-ascii characters
-    tweet = "".join([x for x in tweet if x in printable])
+    if nonprintable_re.search(tweet):
+        offsets = [i for x, i in zip(tweet, offsets) if x in printable]
+        tweet = "".join(x for x in tweet if x in printable)
 
     # additional preprocessing
-    tweet = tweet.replace("\n", " ").replace(" https", "").replace("http", "")
+    tweet, offsets = sub_and_map(newline_re, replace_by_space, tweet, offsets)
+    tweet, offsets = sub_and_map(https_re, remove, tweet, offsets)
+    tweet, offsets = sub_and_map(http_re, remove, tweet, offsets)
 
     # remove all mentions
-    tweet = re.sub(r"@\w+", "", tweet)
+    tweet, offsets = sub_and_map(mention_re, remove, tweet, offsets)
 
     # extract hashtags to break them -------------------------------------------
-    hashtags = re.findall(r"#\w+", tweet)
+    hashtags = hashtag_re.findall(tweet)
 
     # This will contain all hashtags mapped to their broken segments
     # e.g., #ChennaiFlood : {chennai, flood}
@@ -150,39 +374,93 @@ def preprocess_tweet(tweet):
         _h = _h.translate(None, ''.join(string.punctuation))
 
         # breaks the hashtag
-        segments = segment(_h)
-        # concatenate the tokens with spaces between them
-        segments = ' '.join(segments)
+        replacements[hashtag] = segment_hashtag(_h)
+
+    def break_hashtag(match, hashtag_offsets):
+
+        segments = replacements[match.group()]
+
+        # the characters of the segments are those of the hashtag without its
+        # punctuations, unless the segmentation changed them
+        chars = [i for x, i in zip(match.group(), hashtag_offsets)[1:]
+                 if x not in exclude]
+
+        if "".join(segments) != "".join(x for x in match.group()[1:]
+                                        if x not in exclude):
+            chars = hashtag_offsets[:1] * sum(len(x) for x in segments)
 
-        replacements[hashtag] = segments
+        # concatenate the tokens with spaces between them, mapped to the
+        # character after them
+        segments_offsets = list()
+
+        i = 0
+        for x in segments:
+            if i:
+                segments_offsets.append(chars[i])
+            segments_offsets.extend(chars[i:i + len(x)])
+            i += len(x)
+
+        return " ".join(segments), segments_offsets
 
     # replacement of hashtags in tweets
     # e.g., if #la & #laflood in the same tweet >> replace the longest first
     for k in sorted(
             replacements,
             key=lambda k: len(
-                replacements[k]),
+                " ".join(replacements[k])),
             reverse=True):
-        tweet = tweet.replace(k, replacements[k])
+        tweet, offsets = sub_and_map(re.compile(re.escape(k)), break_hashtag,
+                                     tweet, offsets)
 
     # --------------------------------------------------------------------------
 
     # padding punctuations
-    tweet = re.sub('([,!?():])', r' \1 ', tweet)
+    tweet, offsets = sub_and_map(pad_re, pad_punctuation, tweet, offsets)
 
-    tweet = tweet.replace(". ", " . ").replace("-", " ")
+    tweet, offsets = sub_and_map(dot_re, pad_dot, tweet, offsets)
+    tweet, offsets = sub_and_map(dash_re, replace_by_space, tweet, offsets)
 
     # shrink blank spaces in preprocessed tweet text to only one space
-    tweet = re.sub('\s{2,}', ' ', tweet)
-
-    # # remove consecutive duplicate tokens which causes an explosion in tree
-    # while re.search(r'\b(.+)(\s+\1\b)+', tweet):
-    #     tweet = re.sub(r'\b(.+)(\s+\1\b)+', r'\1', tweet)
+    tweet, offsets = sub_and_map(spaces_re, replace_by_space, tweet, offsets)
 
     # remove trailing spaces
-    tweet = tweet.strip()
+    start = len(tweet) - len(tweet.lstrip())
+    end = len(tweet.rstrip())
+
+    return tweet[start:end], offsets[start:end]
+
+################################################################################
+
+def preprocess_tweet(tweet, segment_hashtag=segment):
+    '''Preprocesses the tweet text and break the hashtags using
+    segment_hashtag, see preprocess_and_map'''
+
+    return preprocess_and_map(tweet, segment_hashtag)[0]
+
+################################################################################
+
+def align_tokens(preprocessed_tweet, offsets):
+    '''Tokenizes the preprocessed tweet and maps the tokens to their offsets
+    in the raw tweet using the offsets of preprocess_and_map. The tokens are
+    shared by the splitting on stop words and the candidates generation.
+
+        returns the list of (token, start offset, end offset) tuples'''
+
+    # the tokens are found in order, so the alignments of Twokenize are skipped
+    find = preprocessed_tweet.find
+
+    aligned = list()
+    end = 0
+
+    for token in Twokenize.tokenize(preprocessed_tweet, align_tokens=False):
+
+        start = find(token, end)
+        end = start + len(token)
 
-    return tweet
+        aligned.append((preprocessed_tweet[start:end], offsets[start],
+                        offsets[end - 1]))
+
+    return aligned
 
 ################################################################################
 
@@ -200,9 +478,103 @@ def flatten(l):
 
 ################################################################################
 
-def build_tree(glm, ts):
+class WorkBudgetExhausted(Exception):
+    '''Raised by WorkBudget.spend when the phrases exceed the budget'''
+
+class WorkBudget(object):
+    '''The work allowed for extracting a tweet, counted in the candidate
+    phrases built by the engines (see engines) and checked against the
+    language model. It bounds the extraction time of spammy or adversarial
+    tweets, whose sub-queries have many tokens with long vectors of
+    expansions.
+
+        tweet_phrases:     the phrases allowed for the whole tweet
+
+        sub_query_phrases: the phrases allowed for every sub-query
+
+    Either is unlimited when None. The budget also counts the work done (see
+    ExtractionStats): the sub-queries, the degraded ones which exhausted the
+    budget, the nodes of the engine (tree nodes or spans) and the phrases
+    scored by the language model.'''
+
+    def __init__(self, tweet_phrases=None, sub_query_phrases=None):
+
+        self.tweet_phrases = tweet_phrases
+        self.sub_query_phrases = sub_query_phrases
+
+        self.spent = 0
+        self.sub_query_spent = 0
+
+        self.sub_queries = 0
+        self.degraded_sub_queries = 0
+        self.nodes = 0
+        self.scored = 0
+
+    @property
+    def degraded(self):
+
+        return self.degraded_sub_queries > 0
+
+    def start_sub_query(self):
+
+        self.sub_query_spent = 0
+        self.sub_queries += 1
+
+    def spend(self, phrases):
+        '''Counts the phrases about to be built for a node of the engine, or
+        raises WorkBudgetExhausted if they exceed the budget of the tweet or of
+        the sub-query'''
+
+        if (self.tweet_phrases is not None and
+            self.spent + phrases > self.tweet_phrases) or \
+           (self.sub_query_phrases is not None and
+            self.sub_query_spent + phrases > self.sub_query_phrases):
+
+            self.degraded_sub_queries += 1
+            raise WorkBudgetExhausted()
+
+        self.spent += phrases
+        self.sub_query_spent += phrases
+        self.nodes += 1
+
+class StageTimer(object):
+    '''Accumulates the wall time (seconds) of the stages of extracting a tweet,
+    each lap ends a stage which started at the end of the previous lap'''
+
+    def __init__(self):
+
+        self.start = self.last = time.time()
+        self.times = dict()
+
+    def lap(self, stage):
+
+        now = time.time()
+
+        self.times[stage] = self.times.get(stage, 0.0) + now - self.last
+        self.last = now
+
+class NullTimer(object):
+    '''A StageTimer which times nothing, used when the stats are disabled'''
+
+    def lap(self, stage):
+        pass
+
+null_timer = NullTimer()
+
+class ExtractedLocations(list):
+    '''The list of the location names extracted from a tweet, degraded is True
+    if the work budget of the tweet was exhausted (see WorkBudget), so that some
+    sub-queries only have their exact and unigram matches'''
+
+    degraded = False
+
+################################################################################
+
+def build_tree(glm, ts, prefixes=None, budget=None):
     ''' Build a bottom-up tree of valid ngrams using the gazetteer langauge
-    model (glm) and the tweet segment (ts)'''
+    model (glm) and the tweet segment (ts). When given, the gazetteer n-gram
+    prefixes (NgramPrefixSet) are used to prune the invalid phrases before
+    scoring them, and the phrases are counted by the budget (WorkBudget).'''
 
     # dictionary of valid n-grams
     valid_n_grams = defaultdict(float)
@@ -243,7 +615,12 @@ def build_tree(glm, ts):
 
             tokens_list = list()
 
-            # find valid n-grams from the cartisian product of two tree nodes
+            # candidate n-grams from the cartisian product of two tree nodes
+            candidates = list()
+
+            if budget is not None:
+                budget.spend(len(node1.cargo) * len(_node2.cargo))
+
             for i in itertools.product(node1.cargo, _node2.cargo):
 
                 # flatten the list of lists
@@ -256,8 +633,21 @@ def build_tree(glm, ts):
                 p = " ".join(final_list)
                 p = p.strip()
 
-                # the probability of a phrase p calculated by the language model
-                score = glm.phrase_probability(p)
+                # the phrase is not part of any gazetteer name, so its
+                # probability is zero
+                if prefixes is not None and p not in prefixes:
+                    continue
+
+                candidates.append((final_list, p))
+
+            # the probabilities of the candidate phrases calculated by the
+            # language model at once for the whole tree level
+            scores = glm.phrase_probability_batch([p for __, p in candidates])
+
+            if budget is not None:
+                budget.scored += len(candidates)
+
+            for (final_list, p), score in zip(candidates, scores):
 
                 # if an n-gram is valid then add it to the dictionary
                 if score > 0:
@@ -286,6 +676,125 @@ def build_tree(glm, ts):
 
 ################################################################################
 
+def build_spans(glm, ts, prefixes=None, budget=None):
+    ''' Build the valid ngrams of the tweet segment (ts) using dynamic
+    programming over its spans instead of the bottom-up tree.
+
+    The spans are composed as by the overlapping nodes of the tree, so that
+    both engines return the same dictionary of valid n-grams, e.g.,
+    ('avadi', 'rd', (4, 5)) 5.67800416892e-05. A span of two tokens is the
+    product of their vectors, and a longer span (i, j) is the product of the
+    valid phrases of the span (i, j-1) and of the span (i+2, j), e.g., the
+    phrases of the tokens (0, 1, 2, 3) from those of (0, 1, 2) and (2, 3).
+
+    Unlike the tree, the phrases of every span are kept once (in the order in
+    which the tree first finds them, which breaks the ties between equally
+    likely location names downstream), the spans with no valid phrases are not
+    composed any further and the construction stops at the first width with
+    no valid phrases at all. When given, the gazetteer
+    n-gram prefixes (NgramPrefixSet) are used to prune the invalid phrases
+    before scoring them, and the phrases are counted by the budget
+    (WorkBudget).'''
+
+    # dictionary of valid n-grams
+    valid_n_grams = defaultdict(float)
+
+    # the valid phrases of the spans of the last two widths keyed by the
+    # start index of the span, the unigrams are the leaves which are composed
+    # without being validated
+    shorter = None
+    spans = [[(token,) for token in vector] for vector in ts]
+
+    width = 1
+
+    while width < len(ts) and any(spans):
+
+        width += 1
+
+        # candidate phrases of all the spans of this width
+        candidates = list()
+
+        for start in xrange(len(ts) - width + 1):
+
+            if width == 2:
+                right = spans[start + 1]
+            else:
+                right = shorter[start + 2]
+
+            if budget is not None:
+                budget.spend(len(spans[start]) * len(right))
+
+            for left_phrase in spans[start]:
+                for right_phrase in right:
+
+                    # remove consecutive duplicates
+                    if left_phrase[-1] == right_phrase[0]:
+                        final_list = left_phrase + right_phrase[1:]
+                    else:
+                        final_list = left_phrase + right_phrase
+
+                    # prune based on the probability from the language model
+                    p = " ".join(final_list)
+                    p = p.strip()
+
+                    if prefixes is not None and p not in prefixes:
+                        continue
+
+                    candidates.append((start, final_list, p))
+
+        # the probabilities of the candidate phrases calculated by the
+        # language model at once for all the spans of this width
+        scores = glm.phrase_probability_batch([p for __, __, p in candidates])
+
+        if budget is not None:
+            budget.scored += len(candidates)
+
+        composed_spans = [list() for __ in xrange(len(ts) - width + 1)]
+
+        for (start, final_list, p), score in zip(candidates, scores):
+
+            if score > 0:
+                tokensIndexes = tuple(set(range(start, start + width)))
+                valid_n_gram = final_list + (tokensIndexes,)
+
+                # the n-gram is keyed by its span, so it is new to the span
+                if valid_n_gram not in valid_n_grams:
+                    composed_spans[start].append(final_list)
+
+                valid_n_grams[valid_n_gram] = score
+
+        shorter, spans = spans, composed_spans
+
+    return valid_n_grams
+
+################################################################################
+
+# the available engines for building the valid n-grams of a sub-query
+engines = {"tree": build_tree, "dp": build_spans}
+
+# the available hashtag segmenters, see Extractor.segmenter
+hashtag_segmenters = ("wordsegment", "gazetteer")
+
+# the candidate phrases allowed per tweet and per sub-query by every engine,
+# see WorkBudget. The phrases of the tree engine grow exponentially with the
+# tokens of a sub-query, e.g., "st st st st new avadi rd" builds 2949 phrases
+# and one more "st" 43863, two more 2.6 millions. The phrases of the dp engine
+# grow polynomially, e.g., 13040 for 15 "st" before "new avadi rd" (0.02
+# seconds), and are scored faster, so its budget only bounds the spammy tweets
+# which would take longer than about 0.4 seconds.
+default_work_budgets = {"tree": (50000, 10000), "dp": (250000, 100000)}
+
+def set_engine(name):
+    '''Sets the engine of the global extractor'''
+
+    _check_env()
+
+    Extractor._check_options(name)
+
+    global_extractor.engine = name
+
+################################################################################
+
 def using_split2(line, _len=len):
     '''Tokenizes the tweet and retain the offsets of each token
     Based on aquavitae answer @ http://stackoverflow.com/questions/9518806/'''
@@ -337,62 +846,187 @@ def align_and_split(raw_string, preprocessed_string):
 
     return tokens
 
+################################################################################
+
+def _check_env():
+    '''Exits if the LNEx environment was not initialized'''
+
+    if env == None:
+        print "\n##################################################"
+        print "Global ERROR: LNEx environment must be initialized"
+        print "##################################################\n"
+        exit()
+
 ################################################################################
 ################################################################################
 
-def extract(tweet):
-    '''Extracts all location names from a tweet.
+# if tweet contains the following then remove them from the tweet and split
+# based on their presence
+query_separators = set(
+        ["[", "]", ".", ",", "(", ")", "!", "?", ":", "<", ">", "newline"])
 
-        returns a list of the following 4 items tuple:
-            tweet_mention, mention_offsets, geo_location, geo_info_id
+def has_gazetteer_vocabulary(env, query_tokens):
+    '''Returns whether the query tokens, or their expansions, include both
+    key tokens of a gazetteer name, i.e., its two least frequent unigrams
+    preferably of three characters or more, which are found in fewer hashtags
+    (see has_raw_gazetteer_vocabulary). The location names extracted from a
+    query are gazetteer names made of the tokens and expansions of the query,
+    so otherwise it has none.'''
 
-            tweet_mention:   is the location mention in the tweet
-                             (substring retrieved from the mention offsets)
+    return _has_key_tokens(env, set(token[0] for token in query_tokens))
 
-            mention_offsets: a tuple of the start and end offsets of the LN
+# split the raw query into the words kept by preprocess_and_map
+raw_separators_re = re.compile(r"[\s,!?():-]+")
+alnum_re = re.compile(r"[a-z0-9]+")
 
-            geo_location:    the matched location name from the gazetteer.
-                             e.g., new avadi rd > New Avadi Road
+def has_raw_gazetteer_vocabulary(env, query, segmenter=None):
+    '''The check of has_gazetteer_vocabulary on the raw (lowercased) query,
+    before its hashtags are broken and its tokens aligned. Its vocabulary is a
+    superset of the query tokens: the words of the query, the same stripped of
+    their punctuations, split on them or tokenized, and the segments of the
+    hashtags cached by the segmenter or else all the substrings of which
+    their segments are made.'''
 
-            geo_info_id:     contains the attached metadata of all the matched
-                             location names from the gazetteer '''
+    # the urls, characters and mentions removed by preprocess_and_map join
+    # the words around them
+    if "://" in query:
+        query = url_re.sub("", query)
 
-    # --------------------------------------------------------------------------
-    # check if environment was correctly initialized
-    if env == None:
-        print "\n##################################################"
-        print "Global ERROR: LNEx environment must be initialized"
-        print "##################################################\n"
-        exit()
+    if nonprintable_re.search(query):
+        query = nonprintable_re.sub("", query)
 
-    # --------------------------------------------------------------------------
+    query = query.replace("\n", " ").replace(" https", "").replace("http", "")
+
+    if "@" in query:
+        query = mention_re.sub("", query)
+
+    vocabulary = set()
+
+    for word in raw_separators_re.split(query):
+
+        vocabulary.add(word)
+
+        # the words with punctuations are tokenized alone
+        if not word.isalnum():
+            vocabulary.add(word.strip(string.punctuation))
+            vocabulary.update(alnum_re.findall(word))
+            vocabulary.update(Twokenize.scan_tokenize(word.replace("#", "") +
+                                                      " "))
+
+    max_length = segmentation.GazetteerSegmenter.max_word_length
+
+    for hashtag in hashtag_re.findall(query):
+
+        words = None
+
+        if segmenter is not None:
+            words = segmenter.cached(
+                hashtag[1:].translate(None, string.punctuation))
+
+        if words is not None:
+            vocabulary.update(words)
+            continue
+
+        # as wordsegment.clean
+        hashtag = "".join(x for x in hashtag if x.isalnum())
+
+        # a segment of a single character does not let the tweet through
+        vocabulary.update(hashtag[start:end]
+                          for start in xrange(len(hashtag))
+                          for end in xrange(start + 1, min(start + max_length,
+                                                           len(hashtag)) + 1))
+
+    return _has_key_tokens(env, vocabulary)
+
+def _has_key_tokens(env, vocabulary):
+
+    # only the expanded tokens have vectors, see init_Env
+    for token in list(vocabulary):
+        vocabulary.update(env.token_expansions.get(token, ()))
 
-    #will contain for example: (0, 11): [(u'new avadi road', 3)]
-    valid_ngrams = defaultdict(list)
+    key_tokens = env.gaz_key_tokens
+
+    for token in vocabulary:
+
+        if token in key_tokens and \
+           not vocabulary.isdisjoint(key_tokens[token]):
+            return True
+
+    return False
+
+################################################################################
+
+def _in_raw_tweet(query, token):
+    '''Checks if an aligned token (see align_tokens) is a word of the raw
+    query, i.e., it is found at its offsets and not in a hashtag'''
+
+    token, start, end = token
+
+    if query[start:end + 1] != token:
+        return False
+
+    # the start of the word of the token
+    while start > 0 and (query[start - 1].isalnum() or query[start - 1] == "_"):
+        start -= 1
+
+    return query[start - 1:start] != "#"
+
+################################################################################
+
+def _split_query(env, tweet, segmenter=word_segmenter, timer=null_timer):
+    '''Preprocesses and tokenizes the tweet, then splits the query into
+    sub-queries based on the existence of stop words of the environment. The
+    stages are timed by the timer (see StageTimer).
+
+        returns the ascii tweet, the list of aligned query tokens and the list
+        of sub-queries, each is a dict of "tokens" and "offsets". The tokens
+        and sub-queries are None if the query has no gazetteer vocabulary (see
+        has_gazetteer_vocabulary).'''
 
     tweet = strip_non_ascii(tweet)
 
+    timer.lap("strip_non_ascii")
+
     # we will call a tweet from now onwards a query
     query = str(tweet.lower())
 
-    preprocessed_query = preprocess_tweet(query)
+    # most tweets contain no location name at all, they are rejected before
+    # breaking their hashtags
+    vocabulary = has_raw_gazetteer_vocabulary(env, query, segmenter)
+
+    timer.lap("prefilter")
 
-    query_tokens = align_and_split(query, preprocessed_query)
+    if not vocabulary:
+        return tweet, None, None
+
+    preprocessed_query, offsets = preprocess_and_map(query, segmenter.segment)
+
+    timer.lap("preprocess_tweet")
+
+    query_tokens = align_tokens(preprocessed_query, offsets)
+
+    timer.lap("align_tokens")
+
+    # the tokens of the query, including the segments of its hashtags
+    vocabulary = has_gazetteer_vocabulary(env, query_tokens)
+
+    timer.lap("prefilter")
+
+    if not vocabulary:
+        return tweet, None, None
 
     # --------------------------------------------------------------------------
     # prune the tree of locations based on the exisitence of stop words
     # by splitting the query into multiple queries
-    query_splits = Twokenize.tokenize(query)
-    stop_in_query = env.stopwords_notin_gazetteer & set(query_splits)
-
-    # if tweet contains the following then remove them from the tweet and
-    # split based on their presence:
-    stop_in_query = stop_in_query | set(
-        ["[", "]", ".", ",", "(", ")", "!", "?", ":", "<", ">", "newline"])
+    # only the stop words of the raw tweet split it, not the ones found by
+    # breaking its hashtags (e.g., "rains" of #chennai_rains)
+    stop_in_query = set(token[0] for token in query_tokens
+                        if token[0] in env.stopwords_notin_gazetteer and
+                        _in_raw_tweet(query, token))
 
     # remove stops from query
     for index, token in enumerate(query_tokens):
-        if token[0] in stop_in_query:
+        if token[0] in query_separators or token[0] in stop_in_query:
             query_tokens[index] = ()
 
     # combine consecutive tokens in a query as possible location names
@@ -418,169 +1052,205 @@ def extract(tweet):
     # Remove empty query tokens
     query_tokens = [qt for qt in query_tokens if qt != tuple()]
 
-    ##########################################################################
+    timer.lap("split_query")
 
-    # start the core extraction procedure using the bottom up trees
-    for sub_query in query_filtered: # ----------------------------------- for I
+    return tweet, query_tokens, query_filtered
 
-        sub_query_tokens = sub_query["tokens"]
-        sub_query_offsets = sub_query["offsets"]
+################################################################################
 
-        if len(sub_query_tokens) == 0:
-            continue
+def _extract_sub_query(env, engine, sub_query_tokens, sub_query_offsets,
+                       valid_ngrams, budget=None, timer=null_timer):
+    '''The core extraction procedure of a sub-query using the environment and
+    the engine (see engines) of an extractor. Adds the valid ngrams of the
+    sub-query to valid_ngrams keyed by their offsets,
+    e.g., (0, 11): [(u'new avadi road', 3)]
 
-        # expand tokens in sub_query_tokens to vectors
-        for idx, token in enumerate(sub_query_tokens): # ---------------- for II
+    Once the work budget (WorkBudget) is exhausted, only the exact and unigram
+    matches of the sub-query are added (see _add_degraded_matches). The stages
+    are timed by the timer (see StageTimer).'''
 
-            token_edited = ''.join(ch for ch in token if ch not in exclude)
+    if len(sub_query_tokens) == 0:
+        return
 
-            # if the token is for sure misspilled
-            if  token not in env.extended_words3 and \
-                token_edited not in env.extended_words3:
+    if budget is not None:
+        budget.start_sub_query()
 
-                sub_query_tokens[idx] = [token]
+    # the tokens before their expansion, for the degraded matches
+    tokens = list(sub_query_tokens)
 
-                # expand the token into the full name without abbreviations.
-                # Ex=> rd to road
-                token_exp = env.streets_suffixes_dict.get(token)
-                if token_exp and token_exp not in sub_query_tokens[idx]:
-                    sub_query_tokens[idx].append(token_exp)
+    # expand tokens in sub_query_tokens to vectors using the table of token
+    # expansions, the vectors are shared and must not be modified
+    for idx, token in enumerate(sub_query_tokens): # ---------------- for II
 
-            # do not expand the word if it is not misspilled
-            else:
+        sub_query_tokens[idx] = env.token_expansions.get(token) or [token]
 
-                loc_name = sub_query_tokens[idx]
+    # ----------------------------------------------------------- End for II
 
-                sub_query_tokens[idx] = [sub_query_tokens[idx]]
+    timer.lap("expand_tokens")
 
-                # expand the token into the full name without abbreviations.
-                # Ex=> rd to road
-                token_exp = env.streets_suffixes_dict.get(loc_name)
-                if token_exp and token_exp not in sub_query_tokens[idx]:
-                    sub_query_tokens[idx].append(token_exp)
+    valid_n_grams = defaultdict(float)
+
+    # this would build the bottom up tree of valid n-grams
+    # if the query contains more than one vector then build the tree
+    if len(sub_query_tokens) > 1:
 
-                sub_query_tokens[idx] = list(set(sub_query_tokens[idx]))
+        # the time complexity of the tree construction is O(|v|^s), where v
+        # is the longest synonyms vector and s is the number of tokens in the
+        # subquery, the dp engine composes the same spans without repeating
+        # them. Both are bounded by the budget.
+        try:
+            valid_n_grams = engines[engine](env.glm, sub_query_tokens,
+                                            env.gaz_prefixes, budget)
 
+        except WorkBudgetExhausted:
+            timer.lap(engines[engine].__name__)
 
-            # ------------------------------------------------------------------
+            _add_degraded_matches(env, tokens, sub_query_offsets, valid_ngrams)
 
-            # Expand a token to its abbreviation and visa versa
-            exp_words = list()
-            for x in sub_query_tokens[idx]:
-                if x in set(env.osm_abbreviations):
-                    exp_words += env.osm_abbreviations[x]
+            timer.lap("degraded_matches")
+            return
 
-            sub_query_tokens[idx] += exp_words
+        timer.lap(engines[engine].__name__)
 
-        # ----------------------------------------------------------- End for II
+        # imporoving recall by adding unigram location names ++++++++++++++
 
-        valid_n_grams = defaultdict(float)
+        already_assigned_locations_tokens = list()
 
-        # skip if the time complexity is large due to tree construction
-        #   O(|v|^s): where v is the longest synonyms vector and s is the number
-        #             of tokens in the subquery.
-        if len(max(sub_query_tokens,key=len)) ** len(sub_query_tokens) > 400000:
-            continue
+        for valid_n_gram in valid_n_grams:
+            for token_index in valid_n_gram[-1]:
+                already_assigned_locations_tokens.append(token_index)
 
-        # this would build the bottom up tree of valid n-grams
-        # if the query contains more than one vector then build the tree
-        if len(sub_query_tokens) > 1:
+        for idx, item in enumerate(sub_query_tokens):
+            if idx not in already_assigned_locations_tokens:
 
-            valid_n_grams = build_tree(env.glm, sub_query_tokens)
+                for token_match in item:
 
-            # imporoving recall by adding unigram location names ++++++++++++++
+                    if token_match in env.gazetteer_unique_names_set:
+                        valid_n_grams[(token_match, (idx,))] = 1
 
-            already_assigned_locations_tokens = list()
+    # when the size of the subquery is only one token
+    elif len(sub_query_tokens) == 1:
 
-            for valid_n_gram in valid_n_grams:
-                for token_index in valid_n_gram[-1]:
-                    already_assigned_locations_tokens.append(token_index)
+        for token in sub_query_tokens[0]:
+            valid_n_grams[(token, (0,))] = env.glm.phrase_probability(token)
 
-            for idx, item in enumerate(sub_query_tokens):
-                if idx not in already_assigned_locations_tokens:
+        if budget is not None:
+            budget.scored += len(sub_query_tokens[0])
 
-                    for token_match in item:
+    # ----------------------------------------------------------------------
 
-                        if token_match in env.gazetteer_unique_names_set:
-                            valid_n_grams[(token_match, (idx,))] = 1
+    for valid_n_gram in valid_n_grams:
 
-        # when the size of the subquery is only one token
-        elif len(sub_query_tokens) == 1:
+        # sort the offsets
+        # e.g., valid_n_gram = ("token", "token", (index-1, index-2))
+        offsets = sorted([sub_query_offsets[token_idx]
+                          for token_idx in valid_n_gram[-1]])
 
-            for token in sub_query_tokens[0]:
-                valid_n_grams[(token, (0,))] = env.glm.phrase_probability(token)
+        # the start index of the first token
+        start_idx = offsets[0][0]
+        # the end index of the last token
+        end_idx = offsets[-1][1]
 
-        # ----------------------------------------------------------------------
+        # contains the matched location name from cartisian product
+        mached_ln = " ".join(valid_n_gram[:-1])
 
-        for valid_n_gram in valid_n_grams:
+        index_tub = (start_idx, end_idx + 1)
 
-            # sort the offsets
-            # e.g., valid_n_gram = ("token", "token", (index-1, index-2))
-            offsets = sorted([sub_query_offsets[token_idx]
-                              for token_idx in valid_n_gram[-1]])
+        number_of_tokens = len(valid_n_gram[:-1])
 
-            # the start index of the first token
-            start_idx = offsets[0][0]
-            # the end index of the last token
-            end_idx = offsets[-1][1]
+        valid_ngrams[index_tub].append(
+            (mached_ln, number_of_tokens))
 
-            # contains the matched location name from cartisian product
-            mached_ln = " ".join(valid_n_gram[:-1])
+    # ----------------------------------------------------------------------
 
-            index_tub = (start_idx, end_idx + 1)
+    # if length is zero means no more than unigrams were found in the query
+    if len(valid_n_grams) == 0:
 
-            number_of_tokens = len(valid_n_gram[:-1])
+        for index, value in enumerate(sub_query_tokens):
 
-            valid_ngrams[index_tub].append(
-                (mached_ln, number_of_tokens))
+            max_prob_reco = ("", 0)
 
-        # ----------------------------------------------------------------------
+            for y in value: # ----------------------------------------------
+
+                # if the unigram is an actual full location name
+                if y in env.gazetteer_unique_names_set:
+                    if max_prob_reco[1] < len(
+                            env.gazetteer_unique_names[y]):
+                        max_prob_reco = (
+                            y, len(env.gazetteer_unique_names[y]))
+
+            # --------------------------------------------------------------
+
+            # this is the solution for only one grams found in the sentence
+            if max_prob_reco[1] > 0:
+
+                # here we add the unigram toponyms found in query
 
-        # if length is zero means no more than unigrams were found in the query
-        if len(valid_n_grams) == 0:
+                tub_1 = sub_query_offsets[index][0]
+                tub_2 = sub_query_offsets[index][1] + 1
 
-            for index, value in enumerate(sub_query_tokens):
+                # tuble would have: ((start_idx,end_idx),prob)
 
-                max_prob_reco = ("", 0)
+                tub = (tub_1, tub_2)
 
-                for y in value: # ----------------------------------------------
+                mached_ln = max_prob_reco[0]
 
-                    # if the unigram is an actual full location name
-                    if y in env.gazetteer_unique_names_set:
-                        if max_prob_reco[1] < len(
-                                env.gazetteer_unique_names[y]):
-                            max_prob_reco = (
-                                y, len(env.gazetteer_unique_names[y]))
+                number_of_tokens = mached_ln.count(" ") + 1
 
-                # --------------------------------------------------------------
+                valid_ngrams[tub].append(
+                    (mached_ln, number_of_tokens))
 
-                # this is the solution for only one grams found in the sentence
-                if max_prob_reco[1] > 0:
+    timer.lap("add_ngrams")
 
-                    # here we add the unigram toponyms found in query
+################################################################################
+
+def _add_degraded_matches(env, sub_query_tokens, sub_query_offsets,
+                          valid_ngrams):
+    '''Adds the exact gazetteer matches of a sub-query (see add_exact_matches)
+    and, for every token they do not cover, the unigram location name among
+    its expansions with the most geo info ids'''
+
+    for tokens, offsets in _add_exact_matches(env, sub_query_tokens,
+                                              sub_query_offsets, valid_ngrams):
+
+        for token, token_offsets in zip(tokens, offsets):
 
-                    tub_1 = sub_query_offsets[index][0]
-                    tub_2 = sub_query_offsets[index][1] + 1
+            names = [x for x in env.token_expansions.get(token) or [token]
+                     if x in env.gazetteer_unique_names_set]
 
-                    # tuble would have: ((start_idx,end_idx),prob)
+            if names:
 
-                    tub = (tub_1, tub_2)
+                mached_ln = max(names,
+                                key=lambda x: len(env.gazetteer_unique_names[x]))
+
+                tub = (token_offsets[0], token_offsets[1] + 1)
+
+                valid_ngrams[tub].append((mached_ln, mached_ln.count(" ") + 1))
+
+################################################################################
 
-                    mached_ln = max_prob_reco[0]
+def _resolve_location_names(env, cap_word_shape, tweet, valid_ngrams,
+                            query_tokens, timer=null_timer):
+    '''Filters the overlapping and non full mention ngrams and returns the
+    list of the output tuples of the location names found in the tweet'''
 
-                    number_of_tokens = mached_ln.count(" ") + 1
+    remove_shorter_duplicates(valid_ngrams, env.gazetteer_unique_names_set)
 
-                    valid_ngrams[tub].append(
-                        (mached_ln, number_of_tokens))
+    remove_inexact_ties(valid_ngrams, query_tokens,
+                        env.gazetteer_unique_names_set)
 
-    # ---------------------------------------------------------------- end for I
+    filtered_n_grams = filterout_overlaps(valid_ngrams,
+                                          env.gazetteer_unique_names_set)
 
-    filtered_n_grams = filterout_overlaps(valid_ngrams)
+    timer.lap("filterout_overlaps")
 
     # set of: ((offsets), probability), full_mention)
     location_names_in_query = remove_non_full_mentions( filtered_n_grams,
                                                         valid_ngrams,
-                                                        query_tokens)
+                                                        query_tokens,
+                                                env.gazetteer_unique_names_set)
+
+    timer.lap("remove_non_full_mentions")
 
     # --------------------------------------------------------------------------
 
@@ -604,240 +1274,2054 @@ def extract(tweet):
                         geo_location,
                         geo_info_ids))
 
+    timer.lap("output")
+
     return result
 
 ################################################################################
 
-def do_they_overlap(tub1, tub2):
-    '''Checks whether two substrings of the tweet overlaps based on their start
-    and end offsets.'''
+def add_exact_matches(sub_query_tokens, sub_query_offsets, valid_ngrams):
+    '''Adds the gazetteer names which exactly match a sequence of tokens of the
+    sub-query to valid_ngrams in a single pass of the gazetteer automaton.
 
-    if tub2[1] >= tub1[0] and tub1[1] >= tub2[0]:
-        return True
+        returns the list of runs of consecutive tokens which are not covered by
+        any exact match, as pairs of their tokens and offsets'''
+
+    _check_env()
+
+    return _add_exact_matches(env, sub_query_tokens, sub_query_offsets,
+                              valid_ngrams)
 
 ################################################################################
 
-def filterout_overlaps(valid_ngrams):
-    '''Filters the overlapping ngrams from the tree of valid ngrams'''
+def _add_exact_matches(env, sub_query_tokens, sub_query_offsets, valid_ngrams):
+    '''add_exact_matches using the automaton of the environment'''
 
-    full_location_names = list()
-    lengths = list()
+    resolved = set()
 
-    # this will keep a list of full location names and their lengths
-    for ngram_offsets in valid_ngrams:
-        ngram = valid_ngrams[ngram_offsets]
+    for start, end, name in env.gaz_automaton.scan(sub_query_tokens):
 
-        for ngram_tuple in ngram:
-            if ngram_tuple[0] in env.gazetteer_unique_names_set:
-                full_location_names.append(ngram_offsets)
+        index_tub = (sub_query_offsets[start][0], sub_query_offsets[end][1] + 1)
+
+        valid_ngrams[index_tub].append((name, end - start + 1))
+
+        resolved.update(range(start, end + 1))
+
+    # split the sub-query on the resolved tokens
+    unresolved = list()
+
+    for __, run in groupby(range(len(sub_query_tokens)),
+                           key=lambda idx: idx in resolved):
+
+        run = list(run)
+
+        if run[0] not in resolved:
+            unresolved.append(([sub_query_tokens[idx] for idx in run],
+                               [sub_query_offsets[idx] for idx in run]))
+
+    return unresolved
+
+################################################################################
+
+def _extract_exact_first(env, engine, sub_query_tokens, sub_query_offsets,
+                         valid_ngrams, budget=None, timer=null_timer):
+    '''Extracts a sub-query as _extract_sub_query, after resolving its exact
+    gazetteer matches in a single pass of the automaton. The engine only runs
+    on the windows of the tokens which no match resolves, extended by the
+    matches next to them, so that the longer names are still built across the
+    boundaries of the matches, e.g., "new" and the exact "avadi rd" of "new
+    avadi rd". A window counts as a sub-query of the budget.
+
+    The matches are the leftmost longest ones, which do not overlap, and the
+    ones built by the engine in a window with as many tokens are skipped.'''
+
+    matches = list()
+
+    # the leftmost longest matches
+    for start, end, name in sorted(env.gaz_automaton.scan(sub_query_tokens),
+                                   key=lambda x: (x[0], x[0] - x[1])):
+
+        if not matches or start > matches[-1][1]:
+            matches.append((start, end, name))
+
+    timer.lap("exact_matches")
+
+    # the match resolving every token
+    resolving = dict()
+
+    for match in matches:
+        for idx in range(match[0], match[1] + 1):
+            resolving[idx] = match
+
+    # the runs of unresolved tokens extended by the matches next to them, the
+    # windows sharing a match are merged
+    windows = list()
+
+    for resolved, run in groupby(range(len(sub_query_tokens)),
+                                 key=lambda idx: idx in resolving):
+
+        if resolved:
+            continue
+
+        run = list(run)
+
+        start = resolving[run[0] - 1][0] if run[0] - 1 in resolving else run[0]
+        end = resolving[run[-1] + 1][1] if run[-1] + 1 in resolving else run[-1]
+
+        if windows and windows[-1][1] >= start:
+            windows[-1] = (windows[-1][0], end)
+        else:
+            windows.append((start, end))
+
+    built = defaultdict(list)
+
+    for start, end in windows:
+        _extract_sub_query(env, engine, sub_query_tokens[start:end + 1],
+                           sub_query_offsets[start:end + 1], built, budget,
+                           timer)
+
+    # the number of tokens of the longest full location name built at every
+    # offsets
+    lengths = dict()
+
+    for index_tub, ngrams in built.iteritems():
+        lengths[index_tub] = max([length for mached_ln, length in ngrams
+                                  if mached_ln in env.gazetteer_unique_names_set]
+                                 or [0])
+
+    for start, end, name in matches:
+
+        index_tub = (sub_query_offsets[start][0], sub_query_offsets[end][1] + 1)
+
+        if lengths.get(index_tub, 0) < end - start + 1:
+            built[index_tub].append((name, end - start + 1))
+
+    for index_tub, ngrams in built.iteritems():
+        valid_ngrams[index_tub].extend(ngrams)
+
+################################################################################
+################################################################################
+
+def extract(tweet):
+    '''Extracts all location names from a tweet using the global extractor,
+    see Extractor.extract'''
+
+    # --------------------------------------------------------------------------
+    # check if environment was correctly initialized
+    _check_env()
+
+    # --------------------------------------------------------------------------
+
+    return global_extractor.extract(tweet)
+
+################################################################################
+
+def extract_exact(tweet):
+    '''Extracts only the location names which exactly match gazetteer names
+    using the global extractor, see Extractor.extract_exact'''
+
+    # --------------------------------------------------------------------------
+    # check if environment was correctly initialized
+    _check_env()
+
+    # --------------------------------------------------------------------------
+
+    return global_extractor.extract_exact(tweet)
+
+################################################################################
+
+class PrefilterCounters(object):
+    '''Counters of the tweets checked and rejected by the pre-filter of an
+    extractor. They are kept in shared memory, so the tweets extracted by
+    forked workers are counted too.'''
+
+    def __init__(self):
+
+        self.tweets = multiprocessing.Value("l", 0)
+        self.rejected = multiprocessing.Value("l", 0)
+
+    def count(self, rejected):
+
+        with self.tweets.get_lock():
+            self.tweets.value += 1
+            if rejected:
+                self.rejected.value += 1
+
+    def clear(self):
+
+        with self.tweets.get_lock():
+            self.tweets.value = 0
+            self.rejected.value = 0
+
+    def stats(self):
+        '''Returns the counters and the rate of rejected tweets'''
+
+        with self.tweets.get_lock():
+            tweets = self.tweets.value
+            rejected = self.rejected.value
+
+        return {"tweets": tweets,
+                "rejected": rejected,
+                "reject_rate": rejected / float(tweets) if tweets else 0.0}
+
+################################################################################
+
+class ExtractionStats(object):
+    '''Opt-in instrumentation of an extractor (see Extractor.enable_stats):
+    histograms of the wall time (seconds) of the stages of the extraction and
+    of whole tweets, and counters of the work done. They are kept in shared
+    memory, so the tweets extracted by forked workers are recorded too.'''
+
+    # the stages timed by StageTimer, in the order they run, and the whole
+    # tweet. A histogram counts the tweets which ran its stage.
+    stages = ("strip_non_ascii",
+              "prefilter",
+              "preprocess_tweet",
+              "align_tokens",
+              "split_query",
+              "exact_matches",
+              "expand_tokens",
+              "build_tree",
+              "build_spans",
+              "degraded_matches",
+              "add_ngrams",
+              "filterout_overlaps",
+              "remove_non_full_mentions",
+              "output",
+              "tweet")
+
+    # the counters of the work done, see WorkBudget
+    counters = ("tweets",
+                "degraded_tweets",
+                "sub_queries",
+                "degraded_sub_queries",
+                "engine_nodes",
+                "phrases",
+                "lm_calls")
+
+    # the upper bounds (seconds) of the buckets of the histograms, the last
+    # bucket is unbounded
+    buckets = (0.00001, 0.00003, 0.0001, 0.0003, 0.001, 0.003,
+               0.01, 0.03, 0.1, 0.3, 1.0, 3.0, 10.0)
+
+    def __init__(self):
+
+        self._stage_index = dict((x, i) for i, x in enumerate(self.stages))
+
+        self._counts = multiprocessing.Array("l", len(self.stages) *
+                                                  (len(self.buckets) + 1))
+        self._sums = multiprocessing.Array("d", len(self.stages), lock=False)
+        self._counters = multiprocessing.Array("l", len(self.counters),
+                                               lock=False)
+
+    def record(self, timer, budget):
+        '''Records the stage times of a tweet (StageTimer) and its work
+        (WorkBudget)'''
+
+        times = dict(timer.times)
+        times["tweet"] = timer.last - timer.start
+
+        width = len(self.buckets) + 1
+
+        work = (1, budget.degraded, budget.sub_queries,
+                budget.degraded_sub_queries, budget.nodes, budget.spent,
+                budget.scored)
+
+        with self._counts.get_lock():
+
+            for stage, seconds in times.iteritems():
+
+                idx = self._stage_index.get(stage)
+
+                # e.g., the stages of a custom engine
+                if idx is None:
+                    continue
+
+                bucket = bisect.bisect_left(self.buckets, seconds)
+
+                self._counts[idx * width + bucket] += 1
+                self._sums[idx] += seconds
+
+            for idx, value in enumerate(work):
+                self._counters[idx] += value
+
+    def clear(self):
+
+        with self._counts.get_lock():
+
+            for idx in range(len(self._counts)):
+                self._counts[idx] = 0
+
+            for idx in range(len(self.stages)):
+                self._sums[idx] = 0.0
+
+            for idx in range(len(self.counters)):
+                self._counters[idx] = 0
+
+    def stats(self):
+        '''Returns a dict of the "counters" and of the histograms of the
+        "stages", each a dict of the "count" of tweets, the "sum" of their
+        seconds and the cumulative counts of the "buckets", as a list of pairs
+        of the upper bound of a bucket (None for unbounded) and the count of the
+        tweets up to it'''
+
+        with self._counts.get_lock():
+            counts = list(self._counts)
+            sums = list(self._sums)
+            counters = list(self._counters)
+
+        width = len(self.buckets) + 1
+
+        stages = dict()
+
+        for idx, stage in enumerate(self.stages):
+
+            cumulative = list()
+
+            for count in counts[idx * width:(idx + 1) * width]:
+                cumulative.append(count + (cumulative[-1] if cumulative else 0))
+
+            stages[stage] = {"count": cumulative[-1],
+                             "sum": sums[idx],
+                             "buckets": zip(self.buckets + (None,),
+                                            cumulative)}
+
+        return {"counters": dict(zip(self.counters, counters)),
+                "stages": stages}
+
+################################################################################
+
+def memory_usage(pid=None):
+    '''Returns the memory of a process (this process by default) in kB, as a
+    dict of its "rss", its "pss" (the private memory plus its proportional
+    share of the pages shared with other processes), and its "shared" and
+    "private" memory. Read from /proc, so it is only available on Linux,
+    otherwise returns None.'''
+
+    proc = "/proc/%s/" % (pid or "self")
+
+    fname = proc + "smaps_rollup"
+    if not os.path.exists(fname):
+        fname = proc + "smaps"
+
+    try:
+        with open(fname) as f:
+            lines = f.read().splitlines()
+    except (IOError, OSError):
+        return None
+
+    fields = defaultdict(int)
+
+    # e.g., Shared_Clean:       1234 kB
+    for line in lines:
+        parts = line.split()
+
+        if len(parts) == 3 and parts[2] == "kB":
+            fields[parts[0].rstrip(":")] += int(parts[1])
+
+    return {"rss": fields["Rss"],
+            "pss": fields["Pss"],
+            "shared": fields["Shared_Clean"] + fields["Shared_Dirty"],
+            "private": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+################################################################################
+
+# the extractor of a worker process of a WorkerPool
+worker_extractor = None
+
+def _init_worker(extractor):
+    '''Sets the extractor of a worker process when it is forked'''
+
+    global worker_extractor
+    worker_extractor = extractor
+
+    # sent back with the outputs, see WorkerPool.merge_outputs
+    extractor.segmenter().record_new()
+
+def _worker_extract(tweet):
+    '''Returns the output of extract, the hashtag segmentations added to the
+    cache of the worker meanwhile, if any, and the pid of the worker with the
+    stats of its caches'''
+
+    output = worker_extractor.extract(tweet)
+
+    return (output, worker_extractor.segmenter().pop_new() or None,
+            (os.getpid(), worker_extractor.cache_stats()))
+
+################################################################################
+
+class WorkerPool(object):
+    '''Pool of worker processes which extract the location names of tweets
+    using an extractor (the global extractor by default). The workers are
+    forked once the environment is initialized, so they inherit it instead of
+    rebuilding it. A pool can be reused across calls of extract_batch and
+    extract_stream of its extractor.'''
+
+    def __init__(self, workers=None, extractor=None):
+
+        if extractor is None:
+            # check if environment was correctly initialized before forking
+            _check_env()
+
+            extractor = global_extractor
+
+        self.extractor = extractor
+
+        # the last cache stats sent by every worker, keyed by its pid
+        self.caches = dict()
+        self._lock = threading.Lock()
+
+        # loaded before forking so that the workers share the model
+        extractor.segmenter().load()
+
+        # the extractor is inherited by the forked workers, not pickled
+        self.pool = multiprocessing.Pool(processes=workers,
+                                         initializer=_init_worker,
+                                         initargs=(extractor,))
+
+    def map(self, tweets, chunksize=None):
+        return self.merge_outputs(self.pool.map(_worker_extract, tweets,
+                                                chunksize))
+
+    def map_async(self, tweets, chunksize=None):
+        '''Returns a WorkerResult of the outputs of map'''
+
+        return WorkerResult(self, self.pool.map_async(_worker_extract, tweets,
+                                                      chunksize))
+
+    def merge_outputs(self, results):
+        '''Returns the outputs of the results of the workers and adds the
+        hashtag segmentations sent with them to the cache of this process, so
+        that save_hashtag_cache saves them. The workers themselves only share
+        the segmentations cached before they were forked.'''
+
+        segmenter = self.extractor.segmenter()
+
+        outputs = list()
+        caches = dict()
+
+        for output, segmentations, (pid, stats) in results:
+
+            if segmentations:
+                segmenter.update(segmentations)
+
+            outputs.append(output)
+
+            # the results of a worker come in the order it extracted them
+            caches[pid] = stats
+
+        with self._lock:
+            self.caches.update(caches)
+
+        return outputs
+
+    def cache_stats(self):
+        '''Returns the stats of the caches of the workers (see
+        Extractor.cache_stats) summed over the workers, as last sent with their
+        outputs'''
+
+        with self._lock:
+            caches = self.caches.values()
+
+        stats = dict()
+
+        for worker in caches:
+            for name, cache in worker.iteritems():
+
+                total = stats.setdefault(name, dict.fromkeys(
+                            ("hits", "misses", "evictions", "size",
+                             "maxsize"), 0))
+
+                for key in total:
+                    total[key] += cache[key]
+
+        for total in stats.values():
+
+            lookups = total["hits"] + total["misses"]
+
+            total["hit_rate"] = total["hits"] / float(lookups) \
+                                if lookups else 0.0
+
+        return stats
+
+    def memory_usage(self):
+        '''Returns the memory_usage of every worker keyed by its pid, which
+        shows how much of the environment the workers share'''
+
+        # the worker processes of multiprocessing.Pool
+        return dict((p.pid, memory_usage(p.pid)) for p in self.pool._pool)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def terminate(self):
+        self.pool.terminate()
+        self.pool.join()
+
+class WorkerResult(object):
+    '''The pending outputs of WorkerPool.map_async, see
+    multiprocessing.pool.AsyncResult'''
+
+    def __init__(self, pool, result):
+
+        self.pool = pool
+        self.result = result
+
+    def ready(self):
+        return self.result.ready()
+
+    def wait(self, timeout=None):
+        self.result.wait(timeout)
+
+    def get(self, timeout=None):
+        return self.pool.merge_outputs(self.result.get(timeout))
+
+################################################################################
+
+def extract_batch(tweets, workers=None, chunksize=None, pool=None):
+    '''Extracts all location names from a list (or an iterator) of tweets
+    using the global extractor, see Extractor.extract_batch'''
+
+    # --------------------------------------------------------------------------
+    # check if environment was correctly initialized before forking
+    _check_env()
+
+    # --------------------------------------------------------------------------
+
+    return global_extractor.extract_batch(tweets, workers, chunksize, pool)
+
+################################################################################
+
+def extract_stream(tweets, workers=1, batch_size=1000, chunksize=None,
+                   pool=None):
+    '''Lazily extracts all location names from an iterable of tweets using
+    the global extractor, see Extractor.extract_stream'''
+
+    # --------------------------------------------------------------------------
+    # check if environment was correctly initialized before forking
+    _check_env()
+
+    # --------------------------------------------------------------------------
+
+    return global_extractor.extract_stream(tweets, workers, batch_size,
+                                           chunksize, pool)
+
+################################################################################
+
+def do_they_overlap(tub1, tub2):
+    '''Checks whether two substrings of the tweet overlaps based on their start
+    and end offsets.'''
+
+    if tub2[1] >= tub1[0] and tub1[1] >= tub2[0]:
+        return True
+
+################################################################################
+
+def _full_location_names(valid_ngrams, gazetteer_names):
+    '''Returns the offsets of the ngrams which are full location names and
+    the lengths (number of tokens) of the names'''
+
+    full_location_names = list()
+    lengths = list()
+
+    for ngram_offsets in valid_ngrams:
+        ngram = valid_ngrams[ngram_offsets]
+
+        for ngram_tuple in ngram:
+            if ngram_tuple[0] in gazetteer_names:
+                full_location_names.append(ngram_offsets)
                 lengths.append(ngram_tuple[1])
                 break
 
+    return full_location_names, lengths
+
+def _overlapping_longer(full_location_names, lengths):
+    '''Returns the set of the offsets of the full location names overlapping
+    a longer one, both are kept if they have the same length. The names are
+    swept from the longest, the ends of the longer names are kept in a tree of
+    maxima (Fenwick) indexed by the rank of their starts.'''
+
+    starts = sorted(set(x[0] for x in full_location_names))
+    max_ends = [-1] * (len(starts) + 1)
+
+    shorter = set()
+
+    by_length = sorted(zip(lengths, full_location_names), reverse=True)
+
+    for __, names in groupby(by_length, key=itemgetter(0)):
+
+        names = [x[1] for x in names]
+
+        for offsets in names:
+
+            # the max end of the longer names starting before this one ends
+            idx = bisect.bisect_right(starts, offsets[1])
+            end = -1
+            while idx > 0:
+                end = max(end, max_ends[idx])
+                idx -= idx & -idx
+
+            if end >= offsets[0]:
+                shorter.add(offsets)
+
+        for offsets in names:
+
+            idx = bisect.bisect_right(starts, offsets[0])
+            while idx < len(max_ends):
+                max_ends[idx] = max(max_ends[idx], offsets[1])
+                idx += idx & -idx
+
+    return shorter
+
+def filterout_overlaps(valid_ngrams, gazetteer_names=None):
+    '''Filters the overlapping ngrams from the tree of valid ngrams. The full
+    location names are the gazetteer_names, by default the names of the global
+    environment.
+
+    The overlaps are found in O(n log n) by sweeping the offsets sorted by
+    their start, as two offsets overlap if the one starting first ends at or
+    after the start of the other.'''
+
+    if gazetteer_names is None:
+        gazetteer_names = env.gazetteer_unique_names_set
+
+    full_location_names, lengths = _full_location_names(valid_ngrams,
+                                                        gazetteer_names)
+
+    shorter = _overlapping_longer(full_location_names, lengths)
+
+    ############################################################################
+    # Now, we will remove all the ngrams that overlaps with the longest location
+    #   names and leaving the rest to be decided in the next step of extracting
+    #   only full location names from non-overlapping ngrams (including the
+    #   ones we already know are full location names).
+
+    original_set = set(valid_ngrams) - shorter
+
+    longest_full_location_names = sorted(set(full_location_names) - shorter)
+
+    starts = [x[0] for x in longest_full_location_names]
+    ranks = dict((x, idx) for idx, x in enumerate(longest_full_location_names))
+
+    # the max end of the longest names up to each of them
+    max_ends = list()
+    for x in longest_full_location_names:
+        max_ends.append(max(max_ends[-1], x[1]) if max_ends else x[1])
+
+    final_set = set()
+
+    for ngram in original_set:
+
+        idx = ranks.get(ngram)
+
+        # a longest name overlapping another one is removed as well, the ones
+        #   after it overlap it if the next one starts before it ends
+        if idx is not None:
+            overlaps = (idx > 0 and max_ends[idx - 1] >= ngram[0]) or \
+                       (idx + 1 < len(starts) and starts[idx + 1] <= ngram[1])
+
+        else:
+            idx = bisect.bisect_right(starts, ngram[1])
+            overlaps = idx > 0 and max_ends[idx - 1] >= ngram[0]
+
+        if not overlaps:
+            final_set.add(ngram)
+
+    return final_set
+
+################################################################################
+
+def remove_shorter_duplicates(valid_ngrams, gazetteer_names):
+    '''Removes from valid_ngrams the full location names (gazetteer_names)
+    which are also found at longer offsets covering them. The engines remove
+    the consecutive duplicate tokens (e.g., "road road" or "street st" once
+    expanded), so the same name is found with and without the duplicate token,
+    i.e., at overlapping offsets with the same number of tokens, which would
+    filter out each other (see filterout_overlaps).'''
+
+    # the offsets of the full location names
+    names = defaultdict(list)
+
+    for offsets, ngrams in valid_ngrams.iteritems():
+        for ngram in ngrams:
+            if ngram[0] in gazetteer_names:
+                names[ngram[0]].append(offsets)
+
+    shorter = set()
+
+    for name, name_offsets in names.iteritems():
+
+        if len(name_offsets) < 2:
+            continue
+
+        # the offsets covering others start before (or with) them and end
+        # after them
+        max_end = -1
+
+        for offsets in sorted(name_offsets, key=lambda x: (x[0], -x[1])):
+
+            if offsets[1] <= max_end:
+                shorter.add((offsets, name))
+
+            max_end = max(max_end, offsets[1])
+
+    for offsets in set(x[0] for x in shorter):
+
+        ngrams = [x for x in valid_ngrams[offsets]
+                  if (offsets, x[0]) not in shorter]
+
+        if ngrams:
+            valid_ngrams[offsets] = ngrams
+        else:
+            del valid_ngrams[offsets]
+
+################################################################################
+
+def remove_inexact_ties(valid_ngrams, query_tokens, gazetteer_names):
+    '''Removes from valid_ngrams the full location names (gazetteer_names)
+    overlapping a name with the same number of tokens which exactly matches the
+    tokens of the tweet, e.g., "police station street" built over "police
+    station st" of "vadapalani police station st". filterout_overlaps would
+    keep neither of the two names.'''
+
+    full_location_names, lengths = _full_location_names(valid_ngrams,
+                                                        gazetteer_names)
+
+    # the names overlapping a longer one are removed by filterout_overlaps
+    shorter = _overlapping_longer(full_location_names, lengths)
+
+    tokens = sorted(query_tokens, key=itemgetter(1))
+    starts = [x[1] for x in tokens]
+
+    # the offsets of the exact and of the other names by their length
+    exact = defaultdict(list)
+    inexact = defaultdict(list)
+
+    for offsets, length in zip(full_location_names, lengths):
+
+        if offsets in shorter:
+            continue
+
+        # the first full location name of the offsets, as the length
+        name = next(x[0] for x in valid_ngrams[offsets]
+                    if x[0] in gazetteer_names)
+
+        mention = tokens[bisect.bisect_left(starts, offsets[0]):
+                         bisect.bisect_left(starts, offsets[1])]
+
+        if " ".join(x[0] for x in mention) == name:
+            exact[length].append(offsets)
+        else:
+            inexact[length].append(offsets)
+
+    for length, length_offsets in inexact.iteritems():
+
+        if length not in exact:
+            continue
+
+        exact_starts = sorted(exact[length])
+
+        # the max end of the exact names up to each of them
+        max_ends = list()
+
+        for x in exact_starts:
+            max_ends.append(max(max_ends[-1], x[1]) if max_ends else x[1])
+
+        exact_starts = [x[0] for x in exact_starts]
+
+        for offsets in length_offsets:
+
+            # the exact names starting before this one ends overlap it if one
+            # of them ends after it starts, as in filterout_overlaps
+            idx = bisect.bisect_right(exact_starts, offsets[1])
+
+            if idx > 0 and max_ends[idx - 1] >= offsets[0]:
+                del valid_ngrams[offsets]
+
+################################################################################
+
+def pairwise_filterout_overlaps(valid_ngrams, gazetteer_names=None):
+    '''Returns the ngrams of filterout_overlaps by comparing every pair of
+    ngrams, kept as the reference of its results (see tests/test_overlaps.py)'''
+
+    if gazetteer_names is None:
+        gazetteer_names = env.gazetteer_unique_names_set
+
+    full_location_names = list()
+    lengths = list()
+
+    # this will keep a list of full location names and their lengths
+    for ngram_offsets in valid_ngrams:
+        ngram = valid_ngrams[ngram_offsets]
+
+        for ngram_tuple in ngram:
+            if ngram_tuple[0] in gazetteer_names:
+                full_location_names.append(ngram_offsets)
+                lengths.append(ngram_tuple[1])
+                break
+
+    ############################################################################
+    # remove the overlapping full location names preferring the longest and
+    #   will keep both if they have the same length
+
+    original_set = set(valid_ngrams.keys())
+
+    for idx, item in enumerate(full_location_names):
+        for y in range(idx + 1, len(full_location_names)):
+
+            offsets_1 = item
+            offsets_2 = full_location_names[y]
+
+            try:
+                # if they overlap then the shorter is removed
+                if do_they_overlap(offsets_1, offsets_2):
+
+                    if lengths[idx] > lengths[y]:
+                        original_set.remove(full_location_names[y])
+
+                    # NOTE: this was changed since the IJCAI submission to leave
+                    #       the ones of equal length
+                    elif lengths[idx] < lengths[y]:
+                        original_set.remove(item)
+
+            except BaseException:
+                pass
+
+    ############################################################################
+    # Now, we will remove all the ngrams that overlaps with the longest location
+    #   names and leaving the rest to be decided in the next step of extracting
+    #   only full location names from non-overlapping ngrams (including the
+    #   ones we already know are full location names).
+
+    longest_full_location_names = original_set & set(full_location_names)
+
+    final_set = set(original_set)
+
+    for ln in longest_full_location_names:
+        for ngram in original_set:
+
+            if ln != ngram:
+
+                if do_they_overlap(ln, ngram):
+
+                    try:
+                        final_set.remove(ngram)
+                    except BaseException:
+                        pass
+
+    return final_set
+
+################################################################################
+
+def find_ngrams(input_list, n):
+    '''Generates grams of length (n) from the list of unigrams (input_list)'''
+
+    return zip(*[input_list[i:] for i in range(n)])
+
+################################################################################
+
+def index_query_tokens(query_tokens):
+    '''Returns a dict of the text of the query tokens to the lists of the start
+    offsets and of the tokens with that text, sorted by their start'''
+
+    index = dict()
+
+    for query_token in sorted(query_tokens, key=itemgetter(1)):
+
+        starts, tokens = index.setdefault(query_token[0], (list(), list()))
+
+        starts.append(query_token[1])
+        tokens.append(query_token)
+
+    return index
+
+################################################################################
+
+def remove_non_full_mentions(filtered_n_grams, valid_ngrams, query_tokens,
+                             gazetteer_names=None):
+    '''Removes all valid ngrams but non full mention location names as the final
+    step in this system. The full location names are the gazetteer_names, by
+    default the names of the global environment.'''
+
+    if gazetteer_names is None:
+        gazetteer_names = env.gazetteer_unique_names_set
+
+    final_set = set()
+
+    # the query tokens by text and start offset, indexed on the first full
+    # location name found inside an ngram
+    tokens_index = None
+
+    for ngram_offsets in filtered_n_grams:
+        ngram = valid_ngrams[ngram_offsets]
+
+        # add ngrams to the final set of location names if they are full
+        # location names.
+        full_ln = False
+
+        for ngram_tuple in ngram:
+            if ngram_tuple[0] in gazetteer_names:
+                final_set.add((ngram_offsets, ngram_tuple[0]))
+                full_ln = True
+                break
+
+        # if the ngram is not a full location name then search inside it for
+        # a full location name. e.g., The Louisiana > Louisiana
+        if not full_ln:
+
+            # keep track of the token offsets
+            ngram_min_range = ngram_offsets[0]
+            ngram_max_range = (ngram_offsets[1]) - 1
+
+            for ngram_tuple in ngram:
+
+                unigrams = ngram_tuple[0].split()
+
+                # generate all possible grams from the list of unigrams
+                for new_ngram_len in range(len(unigrams) - 1, -1, -1):
+
+                    # search the new ngram for a possible full location name
+                    for new_ngram in find_ngrams(unigrams, new_ngram_len + 1):
+
+                        candidate_ln = " ".join(new_ngram)
+
+                        # if it is a full mention then get the offsets from the
+                        # query_tokens list
+                        if candidate_ln in gazetteer_names:
+
+                            if tokens_index is None:
+                                tokens_index = index_query_tokens(query_tokens)
+
+                            starts, tokens = tokens_index.get(candidate_ln,
+                                                              ((), ()))
+
+                            # get the indecies from the original query tokens
+                            # with the text of the candidate starting inside
+                            # the ngram
+                            first = bisect.bisect_left(starts, ngram_min_range)
+                            last = bisect.bisect_right(starts, ngram_max_range)
+
+                            for query_token in tokens[first:last]:
+
+                                # the token also ends inside the ngram
+                                if ngram_max_range >= query_token[2]:
+
+                                    t = ((query_token[1], query_token[2]+1),
+                                        candidate_ln)
+
+                                    final_set.add(t)
+
+    return final_set
+
+################################################################################
+
+def _merge_geo_info_ids(geo_info_ids, new_geo_info_ids):
+    '''Merges the geo info ids of a location name, either a list of ids or,
+    for augmented gazetteers, a dict of the lists of "main" and "meta" ids'''
+
+    # the ids of a different format are merged as main ids
+    if isinstance(geo_info_ids, dict) and \
+       not isinstance(new_geo_info_ids, dict):
+        new_geo_info_ids = {"main": new_geo_info_ids}
+
+    elif not isinstance(geo_info_ids, dict) and \
+         isinstance(new_geo_info_ids, dict):
+        new_geo_info_ids = list(new_geo_info_ids.get("main", [])) + \
+                           list(new_geo_info_ids.get("meta", []))
+
+    if isinstance(geo_info_ids, dict):
+        return dict((k, _merge_geo_info_ids(geo_info_ids.get(k, []),
+                                            new_geo_info_ids.get(k, [])))
+                    for k in set(geo_info_ids) | set(new_geo_info_ids))
+
+    known = set(geo_info_ids)
+
+    return list(geo_info_ids) + [x for x in new_geo_info_ids
+                                 if x not in known]
+
+################################################################################
+
+class init_Env(object):
+    '''Where all the gazetteer data, dictionaries and language model resides'''
+
+    # converted to read-only flat buffers, see freeze
+    frozen = False
+
+    def __init__(self, geo_locations, extended_words3, lm_cache_size=100000,
+                 lm_cache_eviction="lru"):
+        '''Initialized the system using the location names and list of english
+        words (words3). The phrase probabilities of the language model are
+        cached using lm_cache_size and lm_cache_eviction (see
+        Language_Modeling.ScoreCache)'''
+
+        # the seconds taken by the stages of the initialization, see
+        # Extractor.stats
+        timer = StageTimer()
+
+        ###################################################
+        # OSM abbr dictionary
+        ###################################################
+
+        dicts_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                        "_Dictionaries/")
+
+        fname = dicts_dir + "osm_abbreviations.csv"
+
+        # read lines to list
+        with open(fname) as f:
+            lines = f.read().splitlines()
+
+        self.osm_abbreviations = defaultdict(list)
+
+        for x in lines:
+            line = x.split(",")
+
+            # apartments > apts
+            self.osm_abbreviations[line[0]].append(line[1])
+            # apartments > apts.
+            self.osm_abbreviations[line[0]].append(line[1] + ".")
+
+            # apts > apartments
+            self.osm_abbreviations[line[1]].append(line[0])
+            # apts. > apartments
+            self.osm_abbreviations[line[1] + "."].append(line[0])
+
+        ########################################################################
+
+        self.gazetteer_unique_names = geo_locations
+
+        self.gazetteer_unique_names_set = set(self.gazetteer_unique_names.keys())
+
+        # NOTE BLACKLIST CODE GOES HERE
+
+        # this list has all the english words in addition to the names
+        # from the combined gazetteer, any word not in the list is
+        # considered misspilled.
+
+        self.extended_words3 = extended_words3
+        self.extended_words3 = set(self.extended_words3)
+
+        ########################################################################
+
+        streets_suffixes_dict_file = dicts_dir + "streets_suffixes_dict.json"
+
+        with open(streets_suffixes_dict_file) as f:
+
+            self.streets_suffixes_dict = json.load(f)
+
+        timer.lap("dictionaries")
+
+        ########################################################################
+
+        # only street suffixes and abbreviations are expanded, every other token
+        # is a vector of itself. Thus, precomputing the vectors of these tokens
+        # covers the whole vocabulary.
+        self.token_expansions = dict()
+
+        for token in set(self.streets_suffixes_dict) | set(self.osm_abbreviations):
+            self.token_expansions[token] = self.expand_token(token)
+
+        timer.lap("token_expansions")
+
+        ########################################################################
+
+        # gazetteer-based language model
+        self.glm = Language_Modeling.GazBasedModel(geo_locations,
+                                                   lm_cache_size,
+                                                   lm_cache_eviction)
+
+        timer.lap("language_model")
+
+        # token windows of the gazetteer names for pruning candidate phrases
+        self.gaz_prefixes = NgramPrefixSet(geo_locations)
+
+        timer.lap("gaz_prefixes")
+
+        # automaton for the single pass exact matching of the gazetteer names
+        self.gaz_automaton = aho_corasick.TokenAutomaton(
+                                                self.gazetteer_unique_names_set)
+
+        timer.lap("gaz_automaton")
+
+        ########################################################################
+
+        # list of unigrams
+        unigrams = self.glm.unigrams["words"].keys()
+
+        self.stopwords_notin_gazetteer = set(
+            self.extended_words3) - set(unigrams)
+
+        # the two least frequent tokens of every gazetteer name, preferably of
+        # three characters or more, the first one mapped to the set of the
+        # second ones, a tweet contains a name only if it contains both (see
+        # has_gazetteer_vocabulary)
+        self.gaz_key_tokens = dict()
+        self._add_key_tokens(self.gazetteer_unique_names_set)
+
+        # the words added to extended_words3 by add_locations
+        self.added_words = set()
+
+        # hashtag segmenter using the unigrams of the language model
+        self.gaz_segmenter = segmentation.GazetteerSegmenter(self)
+
+        timer.lap("vocabulary")
+
+        self.build_times = timer.times
+
+    ############################################################################
+
+    def __getstate__(self):
+        '''The gazetteer built using the elastic index is a defaultdict which
+        can not be pickled, so it is pickled as a dict. The set of the names
+        is rebuilt when unpickling, unless the environment is frozen.'''
+
+        state = dict(self.__dict__)
+
+        if isinstance(self.gazetteer_unique_names, dict):
+            state["gazetteer_unique_names"] = dict(self.gazetteer_unique_names)
+            del state["gazetteer_unique_names_set"]
+
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+
+        if "gazetteer_unique_names_set" not in state:
+            self.gazetteer_unique_names_set = set(self.gazetteer_unique_names)
+
+    def copy(self):
+        '''Returns a deep copy of the environment with empty caches, e.g., to
+        be updated while this one is used'''
+
+        return cPickle.loads(cPickle.dumps(self, cPickle.HIGHEST_PROTOCOL))
+
+    ############################################################################
+
+    def _check_mutable(self):
+
+        if self.frozen:
+            raise ValueError("A frozen LNEx environment can not be updated")
+
+    def _add_key_tokens(self, names):
+        '''Adds the key tokens of the names, the ones of removed names are
+        kept since they only let more tweets through the pre-filter'''
+
+        words = self.glm.unigrams["words"]
+
+        for ln in names:
+
+            tokens = sorted(set(ln.split()),
+                            key=lambda x: (len(x) < 3, words.get(x, 0), x))
+
+            if not tokens:
+                continue
+
+            # the token is its own second key in single token names
+            keys = self.gaz_key_tokens.setdefault(tokens[0], set())
+            keys.add(tokens[1] if len(tokens) > 1 else tokens[0])
+
+    def _update_expansions(self, tokens):
+        '''Recomputes the vectors of the expanded tokens among the tokens whose
+        membership of extended_words3 changed'''
+
+        for token in tokens:
+            if token in self.token_expansions:
+                self.token_expansions[token] = self.expand_token(token)
+
+    def add_locations(self, geo_locations_delta):
+        '''Adds the (already filtered or augmented) location names of
+        geo_locations_delta to the gazetteer, the language model and the
+        dictionaries in place. The geo info ids of the names which are already
+        in the gazetteer are merged. The cost of the update is proportional to
+        the number of names added, not to the size of the gazetteer.'''
+
+        self._check_mutable()
+
+        tokens = set()
+
+        for ln in geo_locations_delta:
+
+            geo_info_ids = geo_locations_delta[ln]
+
+            if ln in self.gazetteer_unique_names_set:
+
+                old_ids = self.gazetteer_unique_names[ln]
+                geo_info_ids = _merge_geo_info_ids(old_ids, geo_info_ids)
+
+                # counted again with the merged number of mentions
+                self.glm.remove_name(ln, len(old_ids))
+
+            self.gazetteer_unique_names[ln] = geo_info_ids
+            self.gazetteer_unique_names_set.add(ln)
+
+            self.glm.add_name(ln, len(geo_info_ids))
+            self.gaz_prefixes.add(ln, len(geo_info_ids))
+
+            tokens.update(ln.split())
+
+        self.gaz_automaton.add_names(geo_locations_delta)
+
+        self._add_key_tokens(geo_locations_delta)
+
+        # the tokens of the gazetteer names are words, but not stop words
+        new_words = tokens - self.extended_words3
+
+        self.extended_words3.update(new_words)
+        self.added_words.update(new_words)
+
+        self.stopwords_notin_gazetteer -= tokens
+
+        self._update_expansions(new_words)
+
+        self.gaz_segmenter.cache.clear()
+
+    def remove_locations(self, names):
+        '''Removes location names from the gazetteer, the language model and
+        the dictionaries in place. The tokens which are no longer part of any
+        name become stop words, unless they were added by add_locations.'''
+
+        self._check_mutable()
+
+        removed = [ln for ln in set(names)
+                   if ln in self.gazetteer_unique_names_set]
+
+        for ln in removed:
+
+            geo_info_ids = self.gazetteer_unique_names.pop(ln)
+            self.gazetteer_unique_names_set.discard(ln)
+
+            self.glm.remove_name(ln, len(geo_info_ids))
+
+        # the windows are discarded once all the names are discounted
+        for ln in removed:
+            self.gaz_prefixes.discard(ln, self.glm)
+
+        self.gaz_automaton.remove_names(removed)
+
+        # the tokens which are no longer part of any gazetteer name
+        unused = set(token for ln in removed for token in ln.split()
+                     if token not in self.glm.unigrams["words"])
+
+        dropped_words = unused & self.added_words
+
+        self.extended_words3 -= dropped_words
+        self.added_words -= dropped_words
+
+        self.stopwords_notin_gazetteer |= unused - dropped_words
+
+        self._update_expansions(dropped_words)
+
+        self.gaz_segmenter.cache.clear()
+
+    ############################################################################
+
+    def freeze(self):
+        '''Converts the large dictionaries and sets of the environment, the
+        language model and the automaton to read-only flat buffers (see
+        frozen.FrozenStringMap). Worker processes forked afterwards share a
+        single physical copy of them instead of gradually copying every page
+        by updating the reference counts of their objects.'''
+
+        self.gazetteer_unique_names = frozen.FrozenStringMap(
+                                                self.gazetteer_unique_names)
+
+        # the frozen gazetteer is also the set of its names
+        self.gazetteer_unique_names_set = self.gazetteer_unique_names
+
+        self.extended_words3 = frozen.FrozenStringMap(self.extended_words3)
+
+        self.stopwords_notin_gazetteer = frozen.FrozenStringMap(
+                                                self.stopwords_notin_gazetteer)
+
+        self.gaz_key_tokens = frozen.FrozenStringMap(self.gaz_key_tokens)
+
+        self.glm.freeze()
+        self.gaz_prefixes.freeze()
+        self.gaz_automaton.freeze()
+
+        self.frozen = True
+
+    ############################################################################
+
+    def expand_token(self, token):
+        '''Expands a token to the vector of its possible forms, i.e., the token
+        itself, its full street suffix and its abbreviations'''
+
+        token_edited = ''.join(ch for ch in token if ch not in exclude)
+
+        # if the token is for sure misspilled
+        if  token not in self.extended_words3 and \
+            token_edited not in self.extended_words3:
+
+            vector = [token]
+
+            # expand the token into the full name without abbreviations.
+            # Ex=> rd to road
+            token_exp = self.streets_suffixes_dict.get(token)
+            if token_exp and token_exp not in vector:
+                vector.append(token_exp)
+
+        # do not expand the word if it is not misspilled
+        else:
+
+            vector = [token]
+
+            # expand the token into the full name without abbreviations.
+            # Ex=> rd to road
+            token_exp = self.streets_suffixes_dict.get(token)
+            if token_exp and token_exp not in vector:
+                vector.append(token_exp)
+
+            vector = list(set(vector))
+
+        # ----------------------------------------------------------------------
+
+        # Expand a token to its abbreviation and visa versa
+        exp_words = list()
+        for x in vector:
+            if x in self.osm_abbreviations:
+                exp_words += self.osm_abbreviations[x]
+
+        vector += exp_words
+
+        return vector
+
+################################################################################
+
+def _process_geo_locations(geo_locations, augment):
+    '''Augments (or only filters) raw location names the same way
+    osm_gazetteer.build_bb_gazetteer does'''
+
+    if augment:
+        geo_locations = gaz_augmentation_and_filtering.augment_geo_locations(
+                                                                geo_locations)
+    else:
+        geo_locations = gaz_augmentation_and_filtering.filter_geo_locations(
+                                                                geo_locations)
+
+    # for serialization
+    return dict((ln, {"main": list(geo_locations[ln]["main"]),
+                      "meta": list(geo_locations[ln]["meta"])})
+                for ln in geo_locations)
+
+################################################################################
+
+class Extractor(object):
+    '''Extracts location names using its own LNEx environment (init_Env) and
+    options, so that several gazetteers (e.g., of different regions) can be
+    used at the same time in one process. The environment is only read while
+    extracting, so an extractor can be shared by the threads of a thread pool.
+
+        capital_word_shape:   use the capitalization orthographic feature
+
+        engine:               the engine used for building the valid n-grams,
+                              i.e., "tree" (the bottom-up tree) or "dp"
+                              (dynamic programming over spans), see engines
+
+        exact_first_matching: resolve the exact gazetteer matches in a single
+                              pass first, and run the engine only around the
+                              tokens they do not resolve (see
+                              _extract_exact_first)
+
+        hashtag_segmenter:    "wordsegment" breaks the hashtags using the
+                              general-purpose wordsegment model and
+                              "gazetteer" using the unigrams of the gazetteer
+                              (see segmentation), without loading wordsegment
+
+        work_budget:          the candidate phrases allowed per tweet and per
+                              sub-query (see WorkBudget), as a pair of which
+                              either can be None (unlimited). Past the budget
+                              only the exact and unigram matches are extracted
+                              and the output is flagged as degraded. None is
+                              the default budget of the engine (see
+                              default_work_budgets)
+
+    The size and eviction policy of the cache of the language model
+    probabilities are set by lm_cache_size and lm_cache_eviction.
+
+    The environment can be rebuilt in the background and swapped atomically
+    while extracting (see rebuild and swap_environment). The tweets being
+    extracted finish using the previous environment.'''
+
+    def __init__(self, geo_locations, extended_words3, capital_word_shape=False,
+                 engine="tree", exact_first_matching=False,
+                 lm_cache_size=100000, lm_cache_eviction="lru",
+                 hashtag_segmenter="wordsegment",
+                 work_budget=None):
+
+        self._check_options(engine, hashtag_segmenter, work_budget)
+
+        g_env = init_Env(geo_locations, extended_words3, lm_cache_size,
+                         lm_cache_eviction)
+
+        self._set_options(g_env, capital_word_shape, engine,
+                          exact_first_matching, hashtag_segmenter, work_budget)
+
+    @classmethod
+    def from_environment(cls, g_env, capital_word_shape=False, engine="tree",
+                         exact_first_matching=False,
+                         hashtag_segmenter="wordsegment",
+                         work_budget=None):
+        '''Creates an extractor of an already built environment'''
+
+        cls._check_options(engine, hashtag_segmenter, work_budget)
+
+        extractor = cls.__new__(cls)
+        extractor._set_options(g_env, capital_word_shape, engine,
+                               exact_first_matching, hashtag_segmenter,
+                               work_budget)
+
+        return extractor
+
+    @classmethod
+    def load(cls, path, capital_word_shape=False, engine="tree",
+             exact_first_matching=False, hashtag_segmenter="wordsegment",
+             work_budget=None):
+        '''Creates an extractor of the environment saved at path (see save)'''
+
+        cls._check_options(engine, hashtag_segmenter, work_budget)
+
+        return cls.from_environment(snapshot.load_environment(path),
+                                    capital_word_shape, engine,
+                                    exact_first_matching, hashtag_segmenter,
+                                    work_budget)
+
+    @staticmethod
+    def _check_options(engine, hashtag_segmenter="wordsegment",
+                       work_budget=None):
+
+        if engine not in engines:
+            raise ValueError("Unknown LNEx engine: %s" % engine)
+
+        if hashtag_segmenter not in hashtag_segmenters:
+            raise ValueError("Unknown LNEx hashtag segmenter: %s" %
+                             hashtag_segmenter)
+
+        if work_budget is not None and (len(work_budget) != 2 or
+           any(x is not None and x < 0 for x in work_budget)):
+            raise ValueError("Invalid LNEx work budget: %r" % (work_budget,))
+
+    def _set_options(self, g_env, capital_word_shape, engine,
+                     exact_first_matching, hashtag_segmenter,
+                     work_budget=None):
+
+        self.env = g_env
+        self.capital_word_shape = capital_word_shape
+        self.engine = engine
+        self.exact_first = exact_first_matching
+        self.hashtag_segmenter = hashtag_segmenter
+        self.work_budget = None if work_budget is None else tuple(work_budget)
+
+        # the number of times the environment was swapped
+        self.version = 0
+
+        # seconds taken by the last rebuild of the environment and by
+        # publishing it once built
+        self.rebuild_time = None
+        self.swap_latency = None
+
+        # the exception raised by the last rebuild, if it failed
+        self.rebuild_error = None
+
+        self._rebuilding = 0
+        self._swap_lock = threading.Lock()
+
+        # the tweets rejected before the extraction, see
+        # has_gazetteer_vocabulary
+        self.prefilter = PrefilterCounters()
+
+        # the opt-in stage times and counters, see enable_stats
+        self.extraction_stats = None
+
+    ############################################################################
+
+    def save(self, path):
+        '''Saves the environment to a snapshot file at path'''
+
+        snapshot.save_environment(self.env, path)
+
+    def freeze(self):
+        '''Freezes the environment (see init_Env.freeze) before forking the
+        worker processes'''
+
+        self.env.freeze()
+
+        # free the replaced objects now rather than in the workers
+        gc.collect()
+
+    ############################################################################
+
+    def enable_stats(self):
+        '''Starts recording the wall time of the stages of the extraction and
+        the work done (see ExtractionStats). Enable them before forking the
+        worker processes, so that their tweets are recorded too.'''
+
+        if self.extraction_stats is None:
+            self.extraction_stats = ExtractionStats()
+
+    def disable_stats(self):
+
+        self.extraction_stats = None
+
+    def stats(self):
+        '''Returns the stats of the extraction (see ExtractionStats.stats), or
+        None if they are disabled, and the seconds taken by the stages of
+        building the environment as "initialization"'''
+
+        if self.extraction_stats is None:
+            return None
+
+        stats = self.extraction_stats.stats()
+        stats["initialization"] = dict(self.env.build_times)
+
+        return stats
+
+    def cache_stats(self):
+        '''Returns the stats of the caches of the language model probabilities
+        and of the hashtag segmentations, which are kept by every process (see
+        Language_Modeling.ScoreCache.stats)'''
+
+        return {"language_model": self.env.glm.cache.stats(),
+                "hashtags": self.segmenter().cache.stats()}
+
     ############################################################################
-    # remove the overlapping full location names preferring the longest and
-    #   will keep both if they have the same length
 
-    original_set = set(valid_ngrams.keys())
+    def segmenter(self, g_env=None):
+        '''Returns the hashtag segmenter of the extractor for its environment
+        (or g_env), see segmentation'''
 
-    for idx, item in enumerate(full_location_names):
-        for y in range(idx + 1, len(full_location_names)):
+        if self.hashtag_segmenter == "gazetteer":
+            return (g_env or self.env).gaz_segmenter
 
-            offsets_1 = item
-            offsets_2 = full_location_names[y]
+        return word_segmenter
+
+    def save_hashtag_cache(self, path):
+        '''Saves the cached hashtag segmentations to a json file'''
+
+        self.segmenter().save_cache(path)
+
+    def load_hashtag_cache(self, path):
+        '''Loads the hashtag segmentations saved by save_hashtag_cache, e.g.,
+        before forking the worker processes which then share them'''
+
+        self.segmenter().load_cache(path)
+
+    ############################################################################
+
+    def swap_environment(self, g_env):
+        '''Atomically publishes a new environment, the tweets being extracted
+        finish using the previous one. Worker pools (see WorkerPool) keep the
+        environment they were forked with and must be recreated.
+
+            returns the new version'''
+
+        start = time.time()
+
+        with self._swap_lock:
+            return self._swap(g_env, start)
+
+    def _swap(self, g_env, start):
+        '''swap_environment with the swap lock held'''
+
+        self.env = g_env
+        self.version += 1
+
+        # the global environment follows the global extractor
+        if self is global_extractor:
+            set_global_extractor(self)
+
+        self.swap_latency = time.time() - start
+
+        return self.version
+
+    def rebuild(self, geo_locations, extended_words3, lm_cache_size=100000,
+                lm_cache_eviction="lru", wait=False):
+        '''Builds a new environment from the (e.g., updated) location names
+        and english words in a background thread, off the extraction path, then
+        swaps it in (see swap_environment). The new environment is frozen if
+        the current one is.
+
+            wait: block until the new environment is published
+
+            returns the rebuilding thread'''
+
+        def run():
 
             try:
-                # if they overlap then the shorter is removed
-                if do_they_overlap(offsets_1, offsets_2):
+                start = time.time()
 
-                    if lengths[idx] > lengths[y]:
-                        original_set.remove(full_location_names[y])
+                g_env = init_Env(geo_locations, extended_words3, lm_cache_size,
+                                 lm_cache_eviction)
 
-                    # NOTE: this was changed since the IJCAI submission to leave
-                    #       the ones of equal length
-                    elif lengths[idx] < lengths[y]:
-                        original_set.remove(item)
+                if self.env.frozen:
+                    g_env.freeze()
 
-            except BaseException:
-                pass
+                self.rebuild_time = time.time() - start
+                self.rebuild_error = None
+
+                self.swap_environment(g_env)
+
+            except Exception as e:
+                self.rebuild_error = e
+                raise
+
+            finally:
+                with self._swap_lock:
+                    self._rebuilding -= 1
+
+        with self._swap_lock:
+            self._rebuilding += 1
+
+        thread = threading.Thread(target=run, name="LNEx-rebuild")
+        thread.daemon = True
+        thread.start()
+
+        if wait:
+            thread.join()
+
+        return thread
+
+    def add_locations(self, geo_locations_delta, augment=None):
+        '''Adds location names to a copy of the environment (see
+        init_Env.copy and init_Env.add_locations) and swaps it in, so the
+        tweets being extracted never see a partial update. With augment=True
+        (or False) the raw names of geo_locations_delta, i.e., {name: {"main":
+        ids, "meta": ids}}, are augmented (or only filtered) using the same
+        rules as a full build of the gazetteer (see
+        gaz_augmentation_and_filtering), otherwise they are added as they are.
+
+            returns the new version'''
+
+        if augment is not None:
+            geo_locations_delta = _process_geo_locations(geo_locations_delta,
+                                                         augment)
+
+        return self._update(lambda g_env:
+                                g_env.add_locations(geo_locations_delta))
+
+    def remove_locations(self, names):
+        '''Removes location names from a copy of the environment (see
+        init_Env.remove_locations) and swaps it in
+
+            returns the new version'''
+
+        return self._update(lambda g_env: g_env.remove_locations(names))
+
+    def _update(self, update):
+        '''Applies the update to a copy of the environment and swaps it in.
+        The swap lock is held from the copy, so that concurrent updates and
+        swaps are not lost.'''
+
+        self.env._check_mutable()
+
+        with self._swap_lock:
+
+            g_env = self.env.copy()
+            update(g_env)
+
+            return self._swap(g_env, time.time())
+
+    def reload(self, path):
+        '''Swaps in the environment saved at path (see save), e.g., rebuilt by
+        another process
+
+            returns the new version'''
+
+        return self.swap_environment(snapshot.load_environment(path))
+
+    def status(self):
+        '''Returns a dict of the version of the environment, whether it is
+        being rebuilt, the duration (seconds) of the last rebuild and swap,
+        and the counters of the pre-filter'''
+
+        return {"version": self.version,
+                "rebuilding": self._rebuilding > 0,
+                "rebuild_time": self.rebuild_time,
+                "swap_latency": self.swap_latency,
+                "rebuild_error": None if self.rebuild_error is None
+                                 else repr(self.rebuild_error),
+                "frozen": self.env.frozen,
+                "prefilter": self.prefilter.stats()}
 
     ############################################################################
-    # Now, we will remove all the ngrams that overlaps with the longest location
-    #   names and leaving the rest to be decided in the next step of extracting
-    #   only full location names from non-overlapping ngrams (including the
-    #   ones we already know are full location names).
 
-    longest_full_location_names = original_set & set(full_location_names)
+    def extract(self, tweet):
+        '''Extracts all location names from a tweet.
 
-    final_set = set(original_set)
+            returns a list of the following 4 items tuple:
+                tweet_mention, mention_offsets, geo_location, geo_info_id
 
-    for ln in longest_full_location_names:
-        for ngram in original_set:
+                tweet_mention:   is the location mention in the tweet
+                                 (substring retrieved from the mention offsets)
 
-            if ln != ngram:
+                mention_offsets: a tuple of the start and end offsets of the LN
 
-                if do_they_overlap(ln, ngram):
+                geo_location:    the matched location name from the gazetteer.
+                                 e.g., new avadi rd > New Avadi Road
 
-                    try:
-                        final_set.remove(ngram)
-                    except BaseException:
-                        pass
+                geo_info_id:     contains the attached metadata of all the
+                                 matched location names from the gazetteer
 
-    return final_set
+            the list is an ExtractedLocations, flagged as degraded if the work
+            budget of the tweet was exhausted'''
 
-################################################################################
+        # the same environment is used for the whole tweet
+        env = self.env
 
-def find_ngrams(input_list, n):
-    '''Generates grams of length (n) from the list of unigrams (input_list)'''
+        # the stats may be enabled or disabled while extracting
+        stats = self.extraction_stats
+        timer = null_timer if stats is None else StageTimer()
 
-    return zip(*[input_list[i:] for i in range(n)])
+        work_budget = self.work_budget
+
+        if work_budget is None:
+            work_budget = default_work_budgets[self.engine]
+
+        budget = WorkBudget(*work_budget)
+
+        result = ExtractedLocations(self._extract(env, tweet, budget, timer))
+        result.degraded = budget.degraded
+
+        if stats is not None:
+            stats.record(timer, budget)
+
+        return result
+
+    def _extract(self, env, tweet, budget, timer):
+
+        #will contain for example: (0, 11): [(u'new avadi road', 3)]
+        valid_ngrams = defaultdict(list)
+
+        tweet, query_tokens, query_filtered = _split_query(env, tweet,
+                                                  self.segmenter(env), timer)
+
+        self.prefilter.count(query_tokens is None)
+
+        # rejected by the pre-filter, the tweet has no location name
+        if query_tokens is None:
+            return []
+
+        ########################################################################
+
+        # start the core extraction procedure using the bottom up trees
+        for sub_query in query_filtered: # ------------------------------- for I
+
+            sub_query_tokens = sub_query["tokens"]
+            sub_query_offsets = sub_query["offsets"]
+
+            if self.exact_first:
+                _extract_exact_first(env, self.engine, sub_query_tokens,
+                                     sub_query_offsets, valid_ngrams, budget,
+                                     timer)
+            else:
+                _extract_sub_query(env, self.engine, sub_query_tokens,
+                                   sub_query_offsets, valid_ngrams, budget,
+                                   timer)
+
+        # ------------------------------------------------------------ end for I
+
+        return _resolve_location_names(env, self.capital_word_shape, tweet,
+                                       valid_ngrams, query_tokens, timer)
+
+    ############################################################################
+
+    def extract_exact(self, tweet):
+        '''Extracts only the location names which exactly match gazetteer
+        names, without expanding abbreviations or misspelled tokens. The
+        sub-queries are scanned in a single linear pass using an Aho-Corasick
+        automaton of the gazetteer names.
+
+            returns a list of the same 4 items tuple as extract'''
+
+        env = self.env
+
+        stats = self.extraction_stats
+        timer = null_timer if stats is None else StageTimer()
+
+        result = self._extract_exact(env, tweet, timer)
+
+        # no phrases are scored
+        if stats is not None:
+            stats.record(timer, WorkBudget())
+
+        return result
+
+    def _extract_exact(self, env, tweet, timer):
+
+        valid_ngrams = defaultdict(list)
+
+        tweet, query_tokens, query_filtered = _split_query(env, tweet,
+                                                  self.segmenter(env), timer)
+
+        self.prefilter.count(query_tokens is None)
+
+        # rejected by the pre-filter, the tweet has no location name
+        if query_tokens is None:
+            return []
+
+        for sub_query in query_filtered:
+            _add_exact_matches(env, sub_query["tokens"], sub_query["offsets"],
+                               valid_ngrams)
+
+        timer.lap("exact_matches")
+
+        return _resolve_location_names(env, self.capital_word_shape, tweet,
+                                       valid_ngrams, query_tokens, timer)
+
+    ############################################################################
+
+    def extract_batch(self, tweets, workers=None, chunksize=None, pool=None):
+        '''Extracts all location names from a list (or an iterator) of tweets
+        by fanning them out across a pool of worker processes.
+
+            workers:   number of worker processes, defaults to the number of
+                       CPUs. With workers=1 the tweets are processed in this
+                       process.
+
+            chunksize: number of tweets sent to a worker at a time, see
+                       multiprocessing.Pool.map
+
+            pool:      an existing WorkerPool of this extractor used instead of
+                       creating one, it is left open
+
+        The workers are forked after initialization, so they inherit the
+        already built LNEx environment (gazetteer, language model and
+        dictionaries) instead of rebuilding it.
+
+        returns a list with the output of extract for every tweet, in the same
+        order as the input tweets'''
+
+        if pool is not None:
+            return pool.map(tweets, chunksize)
+
+        if workers == 1:
+            return [self.extract(tweet) for tweet in tweets]
+
+        pool = WorkerPool(workers, self)
+
+        try:
+            results = pool.map(tweets, chunksize)
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+
+        return results
+
+    ############################################################################
+
+    def extract_stream(self, tweets, workers=1, batch_size=1000,
+                       chunksize=None, pool=None):
+        '''Lazily extracts all location names from an iterable of tweets (e.g.,
+        an open file or sys.stdin) and yields the output of extract for every
+        tweet, in the same order as the input tweets.
+
+            workers:    number of worker processes. With workers=1 (default)
+                        the tweets are processed one by one in this process.
+
+            batch_size: number of tweets read ahead from the iterable and
+                        handed to the workers at a time, which bounds the
+                        memory used.
+
+            chunksize:  number of tweets sent to a worker at a time
+
+            pool:       an existing WorkerPool of this extractor used instead
+                        of creating one, it is left open
+
+        The pool of workers is created once for the whole stream, while the
+        next batch is being processed the outputs of the previous one are
+        yielded.'''
+
+        if pool is None and workers == 1:
+            for tweet in tweets:
+                yield self.extract(tweet)
+            return
+
+        tweets = iter(tweets)
+
+        own_pool = pool is None
+
+        if own_pool:
+            pool = WorkerPool(workers, self)
+
+        try:
+            pending = None
+
+            while True:
+
+                batch = list(itertools.islice(tweets, batch_size))
+
+                submitted = None
+                if batch:
+                    submitted = pool.map_async(batch, chunksize)
+
+                if pending is not None:
+                    for output in pending.get():
+                        yield output
+
+                if submitted is None:
+                    break
+
+                pending = submitted
+
+            if own_pool:
+                pool.close()
+        except BaseException:
+            if own_pool:
+                pool.terminate()
+            raise
 
 ################################################################################
 
-def remove_non_full_mentions(filtered_n_grams, valid_ngrams, query_tokens):
-    '''Removes all valid ngrams but non full mention location names as the final
-    step in this system'''
+def initialize(geo_locations, extended_words3, capital_word_shape,
+               engine="tree", exact_first_matching=False, lm_cache_size=100000,
+               lm_cache_eviction="lru", hashtag_segmenter="wordsegment",
+               work_budget=None):
+    '''Initializing the global extractor here, see Extractor for the
+    options'''
 
-    final_set = set()
+    Extractor._check_options(engine, hashtag_segmenter, work_budget)
 
-    for ngram_offsets in filtered_n_grams:
-        ngram = valid_ngrams[ngram_offsets]
+    print "Initializing LNEx ..."
+    set_global_extractor(Extractor(geo_locations, extended_words3,
+                                   capital_word_shape, engine,
+                                   exact_first_matching, lm_cache_size,
+                                   lm_cache_eviction, hashtag_segmenter,
+                                   work_budget))
 
-        # add ngrams to the final set of location names if they are full
-        # location names.
-        full_ln = False
+    print "Done Initialization ..."
 
-        for ngram_tuple in ngram:
-            if ngram_tuple[0] in env.gazetteer_unique_names_set:
-                final_set.add((ngram_offsets, ngram_tuple[0]))
-                full_ln = True
-                break
+################################################################################
 
-        # if the ngram is not a full location name then search inside it for
-        # a full location name. e.g., The Louisiana > Louisiana
-        if not full_ln:
+def save_environment(path):
+    '''Saves the initialized environment to a snapshot file at path'''
 
-            # keep track of the token offsets
-            ngram_min_range = ngram_offsets[0]
-            ngram_max_range = (ngram_offsets[1]) - 1
+    _check_env()
 
-            for ngram_tuple in ngram:
+    global_extractor.save(path)
 
-                unigrams = ngram_tuple[0].split()
+################################################################################
 
-                # generate all possible grams from the list of unigrams
-                for new_ngram_len in range(len(unigrams) - 1, -1, -1):
+def load_environment(path, capital_word_shape=False, engine="tree",
+                     exact_first_matching=False,
+                     hashtag_segmenter="wordsegment",
+                     work_budget=None):
+    '''Initializes the global extractor from a snapshot file saved by
+    save_environment instead of building the environment, the options are the
+    same as of initialize'''
 
-                    # search the new ngram for a possible full location name
-                    for new_ngram in find_ngrams(unigrams, new_ngram_len + 1):
+    set_global_extractor(Extractor.load(path, capital_word_shape, engine,
+                                        exact_first_matching,
+                                        hashtag_segmenter, work_budget))
 
-                        candidate_ln = " ".join(new_ngram)
+################################################################################
 
-                        # if it is a full mention then get the offsets from the
-                        # query_tokens list
-                        if candidate_ln in env.gazetteer_unique_names_set:
+def freeze_environment():
+    '''Freezes the initialized environment (see init_Env.freeze) before
+    forking the worker processes, e.g., using WorkerPool'''
 
-                            # get the indecies from the original query tokens
-                            for query_token in query_tokens:
+    _check_env()
 
-                                # NOTE: apparently at the time of development
-                                # and testing I had a good reason for having the                                 # first two conditions. They can be removed
-                                # in the future.
+    global_extractor.freeze()
 
-                                if ngram_min_range <= query_token[1] and \
-                                   ngram_max_range >= query_token[2] and \
-                                   candidate_ln == query_token[0]:
+################################################################################
 
-                                    t = ((query_token[1], query_token[2]+1),
-                                        candidate_ln)
+def rebuild_environment(geo_locations, extended_words3, lm_cache_size=100000,
+                        lm_cache_eviction="lru", wait=False):
+    '''Rebuilds the global environment in the background and swaps it in
+    atomically, see Extractor.rebuild'''
 
-                                    final_set.add(t)
+    _check_env()
 
-    return final_set
+    return global_extractor.rebuild(geo_locations, extended_words3,
+                                    lm_cache_size, lm_cache_eviction, wait)
 
 ################################################################################
 
-class init_Env(object):
-    '''Where all the gazetteer data, dictionaries and language model resides'''
+def environment_status():
+    '''Returns the version and the rebuild and swap times of the global
+    environment, see Extractor.status'''
 
-    def __init__(self, geo_locations, extended_words3):
-        '''Initialized the system using the location names and list of english
-        words (words3)'''
+    _check_env()
 
-        ###################################################
-        # OSM abbr dictionary
-        ###################################################
+    return global_extractor.status()
 
-        dicts_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)),
-                        "_Dictionaries/")
+################################################################################
 
-        fname = dicts_dir + "osm_abbreviations.csv"
+def enable_stats():
+    '''Starts recording the stage times and counters of the global extractor,
+    see Extractor.enable_stats'''
 
-        # read lines to list
-        with open(fname) as f:
-            lines = f.read().splitlines()
+    _check_env()
 
-        self.osm_abbreviations = defaultdict(list)
+    global_extractor.enable_stats()
 
-        for x in lines:
-            line = x.split(",")
+################################################################################
 
-            # apartments > apts
-            self.osm_abbreviations[line[0]].append(line[1])
-            # apartments > apts.
-            self.osm_abbreviations[line[0]].append(line[1] + ".")
+def disable_stats():
+    '''Stops recording the stats of the global extractor'''
 
-            # apts > apartments
-            self.osm_abbreviations[line[1]].append(line[0])
-            # apts. > apartments
-            self.osm_abbreviations[line[1] + "."].append(line[0])
+    _check_env()
 
-        ########################################################################
+    global_extractor.disable_stats()
 
-        self.gazetteer_unique_names = geo_locations
+################################################################################
 
-        self.gazetteer_unique_names_set = set(self.gazetteer_unique_names.keys())
+def extraction_stats():
+    '''Returns the stats of the global extractor, see Extractor.stats'''
 
-        # NOTE BLACKLIST CODE GOES HERE
+    _check_env()
 
-        # this list has all the english words in addition to the names
-        # from the combined gazetteer, any word not in the list is
-        # considered misspilled.
+    return global_extractor.stats()
 
-        self.extended_words3 = extended_words3
-        self.extended_words3 = set(self.extended_words3)
+################################################################################
 
-        ########################################################################
+def cache_stats():
+    '''Returns the stats of the caches of the global extractor in this
+    process, see Extractor.cache_stats'''
 
-        streets_suffixes_dict_file = dicts_dir + "streets_suffixes_dict.json"
+    _check_env()
 
-        with open(streets_suffixes_dict_file) as f:
+    return global_extractor.cache_stats()
 
-            self.streets_suffixes_dict = json.load(f)
+################################################################################
 
-        ########################################################################
+def add_locations(geo_locations_delta, augment=None):
+    '''Adds location names to the global environment, see
+    Extractor.add_locations'''
 
-        # gazetteer-based language model
-        self.glm = Language_Modeling.GazBasedModel(geo_locations)
+    _check_env()
 
-        ########################################################################
+    return global_extractor.add_locations(geo_locations_delta, augment)
 
-        # list of unigrams
-        unigrams = self.glm.unigrams["words"].keys()
+################################################################################
 
-        self.stopwords_notin_gazetteer = set(
-            self.extended_words3) - set(unigrams)
+def remove_locations(names):
+    '''Removes location names from the global environment, see
+    Extractor.remove_locations'''
+
+    _check_env()
+
+    return global_extractor.remove_locations(names)
 
 ################################################################################
 
-def initialize(geo_locations, extended_words3, capital_word_shape):
-    '''Initializing the system here'''
+def save_hashtag_cache(path):
+    '''Saves the hashtag segmentations cached by the global extractor, see
+    Extractor.save_hashtag_cache'''
 
-    print "Initializing LNEx ..."
-    g_env = init_Env(geo_locations, extended_words3)
-    set_global_env(g_env)
+    _check_env()
 
-    # use the capitalization orthographic feature
-    global cap_word_shape
-    cap_word_shape = capital_word_shape
+    global_extractor.save_hashtag_cache(path)
 
-    print "Done Initialization ..."
+################################################################################
+
+def load_hashtag_cache(path):
+    '''Loads the hashtag segmentations saved by save_hashtag_cache into the
+    cache of the global extractor'''
+
+    _check_env()
+
+    global_extractor.load_hashtag_cache(path)
@@ -0,0 +1,234 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Read-only mappings stored in a few flat buffers instead of millions of Python
+# objects. Forked worker processes share the pages of the buffers for as long
+# as they are not written, while looking up a dict or a set of Python objects
+# writes to the reference counts (and the garbage collector headers) of the
+# objects and gradually gives every worker a private copy of them.
+
+import zlib
+import marshal
+from array import array
+from bisect import bisect_left
+
+################################################################################
+################################################################################
+
+__all__ = [ 'FrozenStringMap',
+            'FrozenIntMap']
+
+################################################################################
+
+class _FrozenValues(object):
+    '''The values of a frozen mapping, kept in an array if they are all
+    integers, otherwise marshaled into a single string'''
+
+    def _freeze_values(self, values):
+
+        self._int_values = None
+        self._values = None
+        self._value_offsets = None
+
+        if values is None:
+            return
+
+        if all(isinstance(v, (int, long)) and not isinstance(v, bool)
+               for v in values):
+            self._int_values = array('l', values)
+            return
+
+        encoded = [marshal.dumps(v) for v in values]
+
+        self._values = "".join(encoded)
+        self._value_offsets = _offsets(encoded)
+
+    def _value(self, idx):
+
+        if self._int_values is not None:
+            return self._int_values[idx]
+
+        if self._values is None:
+            raise TypeError("%s holds no values" % type(self).__name__)
+
+        return marshal.loads(self._values[self._value_offsets[idx]:
+                                          self._value_offsets[idx + 1]])
+
+################################################################################
+
+def _offsets(strings):
+    '''Returns the array of the start offsets of the concatenated strings
+    followed by the total length'''
+
+    offsets = array('l', [0]) * (len(strings) + 1)
+
+    for idx, s in enumerate(strings):
+        offsets[idx + 1] = offsets[idx] + len(s)
+
+    return offsets
+
+################################################################################
+
+class FrozenStringMap(_FrozenValues):
+    '''Read-only hash set (from an iterable of strings) or dict (from a dict
+    with string keys) of strings. The keys are concatenated into one string
+    and found using an open addressing hash table of their crc32 values.'''
+
+    def __init__(self, items):
+
+        if hasattr(items, "keys"):
+            keys = list(items.keys())
+            values = [items[k] for k in keys]
+        else:
+            keys = list(items)
+            values = None
+
+        # unicode keys are stored utf-8 encoded and decoded when iterated
+        self._unicode = any(isinstance(k, unicode) for k in keys)
+
+        keys = [k.encode("utf-8") if isinstance(k, unicode) else k
+                for k in keys]
+
+        self._keys = "".join(keys)
+        self._key_offsets = _offsets(keys)
+
+        self._freeze_values(values)
+
+        # hash table of the key positions, at most half full
+        size = 8
+        while size < 2 * len(keys):
+            size *= 2
+
+        self._mask = size - 1
+        self._slots = array('i', [-1]) * size
+
+        for idx, key in enumerate(keys):
+
+            slot = zlib.crc32(key) & self._mask
+
+            while self._slots[slot] >= 0:
+                slot = (slot + 1) & self._mask
+
+            self._slots[slot] = idx
+
+    def _find(self, key):
+        '''Returns the position of the key or -1'''
+
+        if isinstance(key, unicode):
+            key = key.encode("utf-8")
+
+        elif not isinstance(key, str):
+            return -1
+
+        slot = zlib.crc32(key) & self._mask
+
+        while True:
+
+            idx = self._slots[slot]
+
+            if idx < 0:
+                return -1
+
+            if self._keys[self._key_offsets[idx]:
+                          self._key_offsets[idx + 1]] == key:
+                return idx
+
+            slot = (slot + 1) & self._mask
+
+    def _key(self, idx):
+
+        key = self._keys[self._key_offsets[idx]:self._key_offsets[idx + 1]]
+
+        if self._unicode:
+            return key.decode("utf-8")
+
+        return key
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __getitem__(self, key):
+
+        idx = self._find(key)
+
+        if idx < 0:
+            raise KeyError(key)
+
+        return self._value(idx)
+
+    def get(self, key, default=None):
+
+        idx = self._find(key)
+
+        if idx < 0:
+            return default
+
+        return self._value(idx)
+
+    def __len__(self):
+        return len(self._key_offsets) - 1
+
+    def __iter__(self):
+        for idx in xrange(len(self)):
+            yield self._key(idx)
+
+    def keys(self):
+        return list(self)
+
+################################################################################
+
+class FrozenIntMap(_FrozenValues):
+    '''Read-only dict with integer keys, kept sorted in an array and found
+    using binary search'''
+
+    def __init__(self, items):
+
+        keys = sorted(items)
+
+        self._keys = array('l', keys)
+
+        self._freeze_values([items[k] for k in keys])
+
+    def _find(self, key):
+        '''Returns the position of the key or -1'''
+
+        idx = bisect_left(self._keys, key)
+
+        if idx < len(self._keys) and self._keys[idx] == key:
+            return idx
+
+        return -1
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __getitem__(self, key):
+
+        idx = self._find(key)
+
+        if idx < 0:
+            raise KeyError(key)
+
+        return self._value(idx)
+
+    def get(self, key, default=None):
+
+        idx = self._find(key)
+
+        if idx < 0:
+            return default
+
+        return self._value(idx)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def keys(self):
+        return list(self._keys)
@@ -21,7 +21,8 @@ __all__ = [ 'get_dicts_dir',
             'find_ngrams',
             'get_extended_words3',
             'filter_geo_locations',
-            'augment']
+            'augment',
+            'augment_geo_locations']
 
 ################################################################################
 
@@ -318,6 +319,17 @@ def filter_geo_locations(geo_locations):
 
 def augment(geo_locations):
 
+    '''Augments the location names using skip grams, returns the augmented
+    location names and the extended list of english words'''
+
+    new_geo_locations = augment_geo_locations(geo_locations)
+
+    return new_geo_locations, get_extended_words3(new_geo_locations.keys())
+
+################################################################################
+
+def augment_geo_locations(geo_locations):
+
     '''Augments the location names using skip grams'''
 
     # augmentation includes filtering
@@ -455,4 +467,4 @@ def augment(geo_locations):
                     new_geo_locations[new_name]["meta"] = \
                         set(new_geo_locations[name]["meta"]).union(new_geo_locations[new_name]["meta"])
 
-    return new_geo_locations, get_extended_words3(new_geo_locations.keys())
+    return new_geo_locations
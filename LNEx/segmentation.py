@@ -0,0 +1,203 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Breaking hashtags into words, e.g., #ChennaiFloods > chennai floods. The same
+# few hundred hashtags of an event repeat over and over in a stream of tweets,
+# so the segmentations are kept in a bounded cache which can be saved to a file
+# and loaded before the worker processes are forked, so that they share it. The
+# worker processes send the segmentations they add back to the parent process,
+# which merges them into its cache before saving it.
+
+import abc
+import json
+import math
+import threading
+
+from Language_Modeling import ScoreCache
+
+################################################################################
+################################################################################
+
+__all__ = [ 'HashtagSegmenter',
+            'WordSegmenter',
+            'GazetteerSegmenter']
+
+################################################################################
+
+class HashtagSegmenter(object):
+    '''Segments hashtags with a bounded cache of the segmentations (see
+    Language_Modeling.ScoreCache for cache_size and cache_eviction)'''
+
+    __metaclass__ = abc.ABCMeta
+
+    def __init__(self, cache_size=10000, cache_eviction="lru"):
+
+        self.cache = ScoreCache(cache_size, cache_eviction)
+
+        # the segmentations added to the cache since the last pop_new, if
+        # they are recorded (see record_new)
+        self.new_segmentations = None
+
+    def load(self):
+        '''Loads the model of the segmenter, if any, before it is used'''
+
+        pass
+
+    def segment(self, text):
+        '''Returns the list of the words of the text'''
+
+        words = self.cache.get(text)
+
+        if words is None:
+            words = self._segment(text)
+            self.cache.put(text, words)
+
+            if self.new_segmentations is not None:
+                self.new_segmentations.append((text, words))
+
+        return words
+
+    def cached(self, text):
+        '''Returns the cached list of the words of the text or None'''
+
+        return self.cache.peek(text)
+
+    @abc.abstractmethod
+    def _segment(self, text):
+        '''Returns the list of the words of the text, without the cache'''
+
+    ############################################################################
+
+    def record_new(self):
+        '''Records the segmentations added to the cache from now on, e.g., by
+        a worker process which sends them to the parent process'''
+
+        self.new_segmentations = list()
+
+    def pop_new(self):
+        '''Returns the recorded segmentations as (text, words) pairs and
+        forgets them'''
+
+        if self.new_segmentations is None:
+            return []
+
+        new_segmentations, self.new_segmentations = self.new_segmentations, []
+
+        return new_segmentations
+
+    def update(self, segmentations):
+        '''Adds (text, words) pairs of segmentations to the cache, e.g., the
+        ones recorded by the worker processes'''
+
+        for text, words in segmentations:
+            self.cache.put(text, words)
+
+    ############################################################################
+
+    def save_cache(self, path):
+        '''Saves the cached segmentations to a json file'''
+
+        with open(path, "w") as f:
+            json.dump(self.cache.items(), f)
+
+    def load_cache(self, path):
+        '''Adds the segmentations saved by save_cache to the cache'''
+
+        with open(path) as f:
+            self.update(json.load(f))
+
+################################################################################
+
+class WordSegmenter(HashtagSegmenter):
+    '''Segments hashtags using the general-purpose English model of the
+    wordsegment package. Loading its corpora takes longer than importing LNEx,
+    so they are loaded on the first hashtag.'''
+
+    def __init__(self, cache_size=10000, cache_eviction="lru"):
+
+        super(WordSegmenter, self).__init__(cache_size, cache_eviction)
+
+        self.wordsegment = None
+        self._lock = threading.Lock()
+
+    def load(self):
+
+        with self._lock:
+
+            if self.wordsegment is None:
+
+                import wordsegment
+                wordsegment.load()
+
+                self.wordsegment = wordsegment
+
+    def _segment(self, text):
+
+        if self.wordsegment is None:
+            self.load()
+
+        return self.wordsegment.segment(text)
+
+################################################################################
+
+class GazetteerSegmenter(HashtagSegmenter):
+    '''Segments hashtags using the unigram counts of the gazetteer language
+    model of an environment (core.init_Env), where the english words of the
+    environment count once. The segmentation maximizes the product of the
+    probabilities of the words as in wordsegment, without loading its model.'''
+
+    # the longest word considered
+    max_word_length = 24
+
+    def __init__(self, env, cache_size=10000, cache_eviction="lru"):
+
+        super(GazetteerSegmenter, self).__init__(cache_size, cache_eviction)
+
+        self.env = env
+
+    def _segment(self, text):
+
+        # as wordsegment.clean
+        text = "".join(ch for ch in text.lower() if ch.isalnum())
+
+        unigrams = self.env.glm.unigrams["words"]
+        words = self.env.extended_words3
+
+        total = float(self.env.glm.unigrams["words_count"] + len(words))
+
+        def log_probability(word):
+
+            count = unigrams.get(word, 0) + (word in words)
+
+            if count:
+                return math.log10(count / total)
+
+            # unknown words are less likely the longer they are
+            return math.log10(10.0 / (total * 10 ** len(word)))
+
+        # best[end] is the log probability of the best segmentation of
+        # text[:end] and starts[end] the start of its last word
+        best = [0.0] + [None] * len(text)
+        starts = [0] * (len(text) + 1)
+
+        for end in xrange(1, len(text) + 1):
+            for start in xrange(max(0, end - self.max_word_length), end):
+
+                score = best[start] + log_probability(text[start:end])
+
+                if best[end] is None or score > best[end]:
+                    best[end] = score
+                    starts[end] = start
+
+        segments = list()
+
+        end = len(text)
+        while end > 0:
+            segments.append(text[starts[end]:end])
+            end = starts[end]
+
+        return segments[::-1]
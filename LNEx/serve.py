@@ -0,0 +1,550 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# A local HTTP service around an initialized LNEx environment, e.g.:
+#
+#   python -m LNEx.serve --environment chennai.lnex --workers 4 --port 8700
+#
+#   curl -d '{"texts": ["New avadi rd is closed"]}' localhost:8700/extract
+#   curl localhost:8700/metrics
+#
+# The texts of concurrent requests are micro-batched into the batch extraction
+# path, and the metrics are exposed in the Prometheus text format.
+
+import sys
+import json
+import time
+import Queue
+import signal
+import argparse
+import threading
+import SocketServer
+import BaseHTTPServer
+
+import LNEx as lnex
+from LNEx import core
+from LNEx.__main__ import (add_environment_arguments,
+                           check_environment_arguments,
+                           initialize_environment,
+                           to_json)
+
+################################################################################
+################################################################################
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(prog="python -m LNEx.serve",
+        description="Serves the extraction of location names over HTTP. POST "
+                    "{\"texts\": [...]} to /extract, the metrics are at "
+                    "/metrics.")
+
+    add_environment_arguments(parser)
+
+    parser.add_argument("--host", default="127.0.0.1",
+        help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8700,
+        help="port to listen on (default: 8700)")
+
+    parser.add_argument("--workers", type=int, default=1,
+        help="number of worker processes (default: 1)")
+    parser.add_argument("--batch-size", type=int, default=256,
+        help="number of texts after which a batch is extracted without "
+             "waiting for more requests (default: 256)")
+    parser.add_argument("--batch-wait", type=float, default=5,
+        help="milliseconds a batch waits for more requests after its first "
+             "one (default: 5)")
+    parser.add_argument("--max-request-bytes", type=int, default=16 << 20,
+        help="largest accepted request body (default: 16 MB)")
+    parser.add_argument("--access-log", action="store_true",
+        help="log every request to stderr")
+
+    args = parser.parse_args(argv)
+
+    check_environment_arguments(parser, args)
+
+    return args
+
+################################################################################
+
+class BatchRequest(object):
+    '''The texts of a request waiting for their outputs'''
+
+    def __init__(self, texts):
+
+        self.texts = texts
+        self.outputs = None
+        self.error = None
+
+        self.done = threading.Event()
+
+class MicroBatcher(object):
+    '''Extracts the texts of concurrent requests in batches using a pool of
+    worker processes, or this process if there is none. A batch is extracted
+    once it has batch_size texts or batch_wait seconds after its first
+    request, and the requests arriving meanwhile wait for the next batch.'''
+
+    def __init__(self, extractor, pool=None, workers=1, batch_size=256,
+                 batch_wait=0.005):
+
+        self.extractor = extractor
+        self.pool = pool
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+
+        self.queue = Queue.Queue()
+
+        self._lock = threading.Lock()
+
+        # texts waiting for a batch and batches extracted
+        self.queued = 0
+        self.batches = 0
+        self.batched_texts = 0
+
+        self.thread = threading.Thread(target=self.run, name="LNEx-batcher")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def extract(self, texts):
+        '''Returns the outputs of extract for the texts once their batch is
+        extracted'''
+
+        request = BatchRequest(texts)
+
+        with self._lock:
+            self.queued += len(texts)
+
+        self.queue.put(request)
+
+        # the timeout keeps the wait interruptible
+        while not request.done.wait(1):
+
+            # e.g., stopped by an error in an earlier batch
+            if not self.thread.is_alive() and not request.done.is_set():
+                raise RuntimeError("the batcher thread has stopped")
+
+        if request.error is not None:
+            raise request.error
+
+        return request.outputs
+
+    ############################################################################
+
+    def run(self):
+
+        while True:
+
+            requests = [self.queue.get()]
+            size = len(requests[0].texts)
+
+            deadline = time.time() + self.batch_wait
+
+            while size < self.batch_size:
+
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+
+                try:
+                    requests.append(self.queue.get(timeout=timeout))
+                except Queue.Empty:
+                    break
+
+                size += len(requests[-1].texts)
+
+            with self._lock:
+                self.queued -= size
+                self.batches += 1
+                self.batched_texts += size
+
+            self._extract(requests)
+
+    def _extract(self, requests):
+
+        texts = [text for request in requests for text in request.texts]
+
+        try:
+            outputs = self._extract_texts(texts)
+
+            start = 0
+            for request in requests:
+
+                request.outputs = outputs[start:start + len(request.texts)]
+                start += len(request.texts)
+
+        except BaseException as e:
+            for request in requests:
+                request.error = e
+
+            # e.g., SystemExit stops the batcher thread
+            if not isinstance(e, Exception):
+                raise
+
+        finally:
+            # no request is left waiting, whatever happened
+            for request in requests:
+                request.done.set()
+
+    def _extract_texts(self, texts):
+
+        if self.pool is None:
+            return self.extractor.extract_batch(texts, workers=1)
+
+        # a few chunks per worker balance the load
+        chunksize = max(1, -(-len(texts) // (4 * self.workers)))
+
+        return self.extractor.extract_batch(texts, chunksize=chunksize,
+                                            pool=self.pool)
+
+    ############################################################################
+
+    def stats(self):
+        '''Returns the counters of the batches and the stats of the caches of
+        the processes extracting, summed over the workers of the pool'''
+
+        with self._lock:
+
+            stats = {"queued": self.queued,
+                     "batches": self.batches,
+                     "batched_texts": self.batched_texts}
+
+        if self.pool is None:
+            stats["caches"] = self.extractor.cache_stats()
+        else:
+            stats["caches"] = self.pool.cache_stats()
+
+        return stats
+
+################################################################################
+
+def format_value(value):
+
+    if isinstance(value, float):
+        return repr(value)
+
+    return str(int(value))
+
+def format_labels(labels):
+    '''Returns the labels, pairs of names and values, in the Prometheus text
+    format'''
+
+    if not labels:
+        return ""
+
+    return "{%s}" % ",".join('%s="%s"' % x for x in labels)
+
+def metric_lines(name, kind, help, samples):
+    '''Returns the lines of a metric in the Prometheus text format, the
+    samples are pairs of labels and values'''
+
+    lines = ["# HELP %s %s" % (name, help),
+             "# TYPE %s %s" % (name, kind)]
+
+    for labels, value in samples:
+        lines.append("%s%s %s" % (name, format_labels(labels),
+                                  format_value(value)))
+
+    return lines
+
+def histogram_lines(name, help, samples):
+    '''Returns the lines of a histogram in the Prometheus text format, the
+    samples are pairs of labels and histograms of ExtractionStats.stats'''
+
+    lines = ["# HELP %s %s" % (name, help),
+             "# TYPE %s histogram" % name]
+
+    for labels, stage in samples:
+
+        for le, count in stage["buckets"]:
+
+            le = "+Inf" if le is None else repr(le)
+
+            lines.append("%s_bucket%s %d" % (name,
+                                             format_labels(labels + (("le", le),)),
+                                             count))
+
+        lines.append("%s_sum%s %r" % (name, format_labels(labels), stage["sum"]))
+        lines.append("%s_count%s %d" % (name, format_labels(labels),
+                                        stage["count"]))
+
+    return lines
+
+################################################################################
+
+class Metrics(object):
+    '''Counters of the requests, and the Prometheus text format of all the
+    metrics of the service'''
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+
+        # requests by status code
+        self.requests = dict()
+
+        self.texts = 0
+
+    def count_request(self, code, texts=0):
+
+        with self._lock:
+            self.requests[code] = self.requests.get(code, 0) + 1
+            self.texts += texts
+
+    def render(self, batcher):
+        '''Returns the metrics of the service, of the batcher and of the global
+        extractor in the Prometheus text format'''
+
+        with self._lock:
+            requests = sorted(self.requests.items())
+            texts = self.texts
+
+        lines = list()
+
+        lines += metric_lines("lnex_requests_total", "counter",
+                              "Extraction requests by status code.",
+                              [((("code", code),), count)
+                               for code, count in requests])
+
+        lines += metric_lines("lnex_texts_total", "counter",
+                              "Texts received for extraction.",
+                              [((), texts)])
+
+        # ----------------------------------------------------------------------
+
+        batches = batcher.stats()
+
+        lines += metric_lines("lnex_queue_depth", "gauge",
+                              "Texts waiting for a batch.",
+                              [((), batches["queued"])])
+
+        lines += metric_lines("lnex_batches_total", "counter",
+                              "Batches extracted.",
+                              [((), batches["batches"])])
+
+        lines += metric_lines("lnex_batched_texts_total", "counter",
+                              "Texts extracted in batches.",
+                              [((), batches["batched_texts"])])
+
+        caches = sorted(batches["caches"].items())
+
+        for key in ("hits", "misses", "evictions"):
+            lines += metric_lines("lnex_cache_%s_total" % key, "counter",
+                                  "Cache %s of all the processes." % key,
+                                  [((("cache", name),), cache[key])
+                                   for name, cache in caches])
+
+        lines += metric_lines("lnex_cache_hit_ratio", "gauge",
+                              "Cache hits per lookup of all the processes.",
+                              [((("cache", name),),
+                                cache["hits"] /
+                                float(max(1, cache["hits"] + cache["misses"])))
+                               for name, cache in caches])
+
+        # ----------------------------------------------------------------------
+
+        status = lnex.environment_status()
+
+        lines += metric_lines("lnex_environment_version", "gauge",
+                              "Version of the gazetteer environment, increased "
+                              "by every update or swap.",
+                              [((), status["version"])])
+
+        lines += metric_lines("lnex_environment_rebuilding", "gauge",
+                              "Whether the environment is being rebuilt.",
+                              [((), status["rebuilding"])])
+
+        lines += metric_lines("lnex_gazetteer_names", "gauge",
+                              "Location names in the gazetteer.",
+                              [((), len(core.env.gazetteer_unique_names))])
+
+        lines += metric_lines("lnex_prefilter_rejected_total", "counter",
+                              "Tweets rejected for having no gazetteer "
+                              "vocabulary.",
+                              [((), status["prefilter"]["rejected"])])
+
+        # ----------------------------------------------------------------------
+
+        stats = lnex.extraction_stats()
+
+        if stats is not None:
+
+            for name in core.ExtractionStats.counters:
+                lines += metric_lines("lnex_%s_total" % name, "counter",
+                                      "Extraction counter of %s." %
+                                      name.replace("_", " "),
+                                      [((), stats["counters"][name])])
+
+            lines += histogram_lines("lnex_tweet_duration_seconds",
+                                     "Wall time of extracting a tweet.",
+                                     [((), stats["stages"]["tweet"])])
+
+            lines += histogram_lines("lnex_stage_duration_seconds",
+                                     "Wall time of the stages of extracting a "
+                                     "tweet.",
+                                     [((("stage", stage),),
+                                       stats["stages"][stage])
+                                      for stage in core.ExtractionStats.stages
+                                      if stage != "tweet"])
+
+        return "\n".join(lines) + "\n"
+
+################################################################################
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    # many clients may connect at once, e.g., to be batched together
+    request_queue_size = 128
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''POST /extract: {"texts": [...]} (or a list of texts), returns
+    {"results": [...]} with a {"locations": [...]} object for every text,
+    which is also "degraded" if its work budget was exhausted
+
+    GET /metrics:  the metrics in the Prometheus text format
+
+    GET /status:   the status of the environment as JSON'''
+
+    server_version = "LNEx"
+
+    def do_POST(self):
+
+        if self.path != "/extract":
+            return self.reply(404, {"error": "not found"})
+
+        try:
+            length = int(self.headers.getheader("content-length"))
+
+            if length < 0:
+                raise ValueError()
+
+        except (TypeError, ValueError):
+            return self.reply(400, {"error": "a valid content length is "
+                                             "required"})
+
+        if length > self.server.max_request_bytes:
+            return self.reply(413, {"error": "request too large"})
+
+        try:
+            texts = json.loads(self.rfile.read(length))
+
+            if isinstance(texts, dict):
+                texts = texts["texts"]
+
+            if not isinstance(texts, list) or \
+               not all(isinstance(x, basestring) for x in texts):
+                raise ValueError()
+
+        except (ValueError, KeyError):
+            return self.reply(400, {"error": "expected {\"texts\": [...]} "
+                                             "with a list of strings"})
+
+        try:
+            outputs = self.server.batcher.extract(texts)
+
+        except Exception as e:
+            return self.reply(500, {"error": repr(e)})
+
+        results = list()
+
+        for output in outputs:
+
+            result = {"locations": [to_json(x) for x in output]}
+
+            if getattr(output, "degraded", False):
+                result["degraded"] = True
+
+            results.append(result)
+
+        self.reply(200, {"results": results}, len(texts))
+
+    def do_GET(self):
+
+        if self.path == "/metrics":
+
+            body = self.server.metrics.render(self.server.batcher)
+
+            self.send_response(200)
+            self.send_header("Content-Type",
+                             "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path == "/status":
+            self.reply(200, lnex.environment_status(), count=False)
+
+        else:
+            self.reply(404, {"error": "not found"}, count=False)
+
+    def reply(self, code, obj, texts=0, count=True):
+
+        if count:
+            self.server.metrics.count_request(code, texts)
+
+        body = json.dumps(obj)
+
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+
+        if self.server.access_log:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format,
+                                                              *args)
+
+################################################################################
+
+def main(argv=None):
+
+    args = parse_args(argv)
+
+    initialize_environment(args)
+
+    # before the workers are forked, so that they record into the histograms
+    lnex.enable_stats()
+
+    pool = lnex.WorkerPool(args.workers) if args.workers > 1 else None
+
+    server = Server((args.host, args.port), Handler)
+
+    server.batcher = MicroBatcher(core.global_extractor, pool, args.workers,
+                                  args.batch_size, args.batch_wait / 1000.0)
+    server.metrics = Metrics()
+    server.max_request_bytes = args.max_request_bytes
+    server.access_log = args.access_log
+
+    sys.stderr.write("LNEx is serving on http://%s:%d\n" %
+                     server.server_address)
+
+    # stopped by a service manager, the hashtag cache is still saved. Set
+    # after forking the workers, which are terminated with SIGTERM.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        server.serve_forever()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        server.server_close()
+
+        if pool is not None:
+            pool.terminate()
+
+        if args.hashtag_cache:
+            lnex.save_hashtag_cache(args.hashtag_cache)
+
+################################################################################
+
+if __name__ == "__main__":
+    main()
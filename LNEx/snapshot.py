@@ -0,0 +1,162 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Persists a fully built LNEx environment (gazetteer, language model and
+# dictionaries) to a versioned binary file, which can be loaded without
+# retraining the language model or rebuilding the dictionaries.
+#
+# File layout:
+#
+#   MAGIC | VERSION | array 1 | ... | array n | pickle | header | header offset
+#
+# The flat arrays of the environment (e.g., the count tables of the language
+# model) are written raw and 8-byte aligned, so that they are memory mapped
+# when loading instead of being read. Everything else is pickled and the header
+# (json) locates the pickle and the arrays in the file.
+
+import json
+import mmap
+import ctypes
+import struct
+import cPickle
+from array import array
+from cStringIO import StringIO
+
+################################################################################
+################################################################################
+
+__all__ = [ 'MAGIC',
+            'VERSION',
+            'save_environment',
+            'load_environment']
+
+################################################################################
+
+MAGIC = "LNEXENV\0"
+
+# increase whenever the layout of the file or of the pickled classes changes
+VERSION = 7
+
+# the ctypes types used for mapping the arrays by their array typecodes
+ctypes_types = {'i': ctypes.c_int,
+                'l': ctypes.c_long}
+
+ctypes_typecodes = dict((v, k) for k, v in ctypes_types.items())
+
+################################################################################
+
+def _array_spec(obj):
+    '''Returns the typecode and the number of items of an array, or None if the
+    object is not an array which is stored raw'''
+
+    if isinstance(obj, array) and obj.typecode in ctypes_types:
+        return obj.typecode, len(obj)
+
+    # arrays mapped by load_environment
+    if isinstance(obj, ctypes.Array) and obj._type_ in ctypes_typecodes:
+        return ctypes_typecodes[obj._type_], len(obj)
+
+    return None
+
+################################################################################
+
+def save_environment(env, path):
+    '''Saves the LNEx environment (core.init_Env) to the file at path'''
+
+    arrays = list()
+
+    def persistent_id(obj):
+
+        if _array_spec(obj) is None:
+            return None
+
+        arrays.append(obj)
+
+        return str(len(arrays) - 1)
+
+    payload = StringIO()
+
+    pickler = cPickle.Pickler(payload, cPickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = persistent_id
+    pickler.dump(env)
+
+    payload = payload.getvalue()
+
+    # --------------------------------------------------------------------------
+
+    header = {"version": VERSION, "arrays": list()}
+
+    with open(path, "wb") as f:
+
+        f.write(MAGIC)
+        f.write(struct.pack("<I", VERSION))
+
+        for obj in arrays:
+
+            # align the arrays to 8 bytes
+            f.write("\0" * (-f.tell() % 8))
+
+            typecode, length = _array_spec(obj)
+
+            header["arrays"].append({"typecode": typecode,
+                                     "itemsize": ctypes.sizeof(
+                                                    ctypes_types[typecode]),
+                                     "offset": f.tell(),
+                                     "length": length})
+            f.write(buffer(obj))
+
+        header["pickle"] = [f.tell(), len(payload)]
+
+        f.write(payload)
+
+        header_offset = f.tell()
+
+        f.write(json.dumps(header))
+        f.write(struct.pack("<Q", header_offset))
+
+################################################################################
+
+def load_environment(path):
+    '''Loads the LNEx environment (core.init_Env) saved at path. The arrays are
+    memory mapped copy-on-write from the file, the pages are shared between
+    the processes which load the same file.'''
+
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not an LNEx environment file: %s" % path)
+
+    version = struct.unpack("<I", mm[len(MAGIC):len(MAGIC) + 4])[0]
+
+    if version != VERSION:
+        raise ValueError("Unsupported LNEx environment version %d (expected "
+                         "%d): %s" % (version, VERSION, path))
+
+    header_offset = struct.unpack("<Q", mm[-8:])[0]
+    header = json.loads(mm[header_offset:-8])
+
+    # --------------------------------------------------------------------------
+
+    def persistent_load(pid):
+
+        spec = header["arrays"][int(pid)]
+
+        ctype = ctypes_types[spec["typecode"]]
+
+        if ctypes.sizeof(ctype) != spec["itemsize"]:
+            raise ValueError("The LNEx environment was saved on a platform "
+                             "with different integer sizes: %s" % path)
+
+        return (ctype * spec["length"]).from_buffer(mm, spec["offset"])
+
+    start, length = header["pickle"]
+
+    unpickler = cPickle.Unpickler(StringIO(mm[start:start + length]))
+    unpickler.persistent_load = persistent_load
+
+    return unpickler.load()
@@ -82,6 +82,11 @@ ProtectThese = [
 ]
 Protect_RE = mycompile(regex_or(*ProtectThese))
 
+# one scan for the tokens of simple_tokenize: a run of non-space characters up
+# to where the next protected token starts, or the protected token
+Token_RE = mycompile(r'(?:(?!' + regex_or(*ProtectThese) + r')\S)+|' +
+                     regex_or(*ProtectThese))
+
 
 class Tokenization(list):
   " list of tokens, plus extra info "
@@ -120,13 +125,15 @@ def unicodify(s, encoding='utf8', *args):
   if isinstance(s,str): return s.decode(encoding, *args)
   return unicode(s)
 
-def tokenize(tweet):
+def tokenize(tweet, align_tokens=True):
+  """fast mode (align_tokens=False) skips computing t.alignments"""
   text = unicodify(tweet)
   text = squeeze_whitespace(text)
   t = Tokenization()
-  t += simple_tokenize(text)
+  t += scan_tokenize(text)
   t.text = text
-  t.alignments = align(t, text)
+  if align_tokens:
+    t.alignments = align(t, text)
   return t
 
 def simple_tokenize(text):
@@ -161,6 +168,22 @@ def simple_tokenize(text):
   res = post_process(res)
   return res
 
+def scan_tokenize(text):
+  """same tokens as simple_tokenize, in a single scan of Token_RE"""
+  s = edge_punct_munge(text)
+
+  res = []
+  for m in Token_RE.finditer(s):
+    tok = m.group()
+    # post_process
+    if "'s" in tok:
+      m = AposS.search(tok)
+      if m:
+        res += m.groups()
+        continue
+    res.append(tok)
+  return res
+
 AposS = mycompile(r"(\S+)('s)$")
 
 def post_process(pre_toks):
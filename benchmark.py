@@ -0,0 +1,141 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Benchmarks of LNEx tracked against time budgets. Exits with a non-zero status
+# if a benchmark exceeds its budget, e.g.:
+#
+#   python benchmark.py           (all the benchmarks)
+#   python benchmark.py import
+#   python benchmark.py tokenizer
+#   python benchmark.py overlaps
+
+import os
+import sys
+import time
+import random
+import argparse
+import subprocess
+
+################################################################################
+################################################################################
+
+# seconds taken by "import LNEx" in a fresh interpreter
+IMPORT_TIME_BUDGET = 0.25
+
+root = os.path.dirname(os.path.abspath(__file__))
+
+# the synthetic inputs are shared with the tests
+sys.path.insert(0, os.path.join(root, "tests"))
+
+from corpora import tokenizer_corpus, random_ngrams
+
+################################################################################
+
+def time_import(repeat):
+    '''Returns the list of the times (seconds) of importing LNEx, each in a
+    fresh interpreter'''
+
+    code = "import time; t = time.time(); import LNEx; print time.time() - t"
+
+    return [float(subprocess.check_output([sys.executable, "-c", code],
+                                          cwd=root))
+            for __ in range(repeat)]
+
+################################################################################
+
+def benchmark_import(repeat=5):
+
+    times = sorted(time_import(repeat))
+
+    best = times[0]
+    median = times[len(times) // 2]
+
+    print "import LNEx: best %.3fs, median %.3fs (budget %.3fs)" % (
+        best, median, IMPORT_TIME_BUDGET)
+
+    return best <= IMPORT_TIME_BUDGET
+
+################################################################################
+
+def benchmark_tokenizer(repeat=3):
+    '''Reports the tokens per second of Twokenize.scan_tokenize and of the
+    original simple_tokenize, whose tokens it returns (see
+    tests/test_tokenizer.py)'''
+
+    from LNEx.tokenizer import Twokenize
+
+    tweets = [Twokenize.squeeze_whitespace(x) for x in tokenizer_corpus()]
+
+    for tokenize in (Twokenize.simple_tokenize, Twokenize.scan_tokenize):
+
+        times = list()
+
+        for __ in range(repeat):
+            t = time.time()
+            tokens = sum(len(tokenize(x)) for x in tweets)
+            times.append(time.time() - t)
+
+        print "%s: %d tokens/s" % (tokenize.__name__, tokens / min(times))
+
+    return True
+
+################################################################################
+
+def benchmark_overlaps(repeat=3):
+    '''Reports the time of core.filterout_overlaps and of the original
+    pairwise_filterout_overlaps, whose ngrams it returns (see
+    tests/test_overlaps.py), on a long text'''
+
+    from LNEx import core
+
+    rnd = random.Random(0)
+
+    args = random_ngrams(rnd, 2000, 20000)
+
+    for filterout in (core.pairwise_filterout_overlaps,
+                      core.filterout_overlaps):
+
+        times = list()
+
+        for __ in range(repeat):
+            t = time.time()
+            filterout(*args)
+            times.append(time.time() - t)
+
+        print "%s: %.3fs for %d spans" % (filterout.__name__, min(times),
+                                          len(args[0]))
+
+    return True
+
+################################################################################
+
+benchmarks = {"import": benchmark_import,
+              "tokenizer": benchmark_tokenizer,
+              "overlaps": benchmark_overlaps}
+
+################################################################################
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Runs the LNEx benchmarks.")
+
+    parser.add_argument("names", nargs="*", metavar="benchmark",
+        help="benchmarks to run: %s (default: all)" %
+             ", ".join(sorted(benchmarks)))
+
+    args = parser.parse_args()
+
+    for name in args.names:
+        if name not in benchmarks:
+            parser.error("unknown benchmark: %s" % name)
+
+    within_budget = [benchmarks[name]()
+                     for name in args.names or sorted(benchmarks)]
+
+    if not all(within_budget):
+        print "Over budget"
+        sys.exit(1)
@@ -29,7 +29,6 @@ setup(
     install_requires=[
           'elasticsearch',
           'elasticsearch-dsl<2.0.0',
-          'nltk',
           'geopy',
           'texttable',
           'wordsegment'
@@ -0,0 +1,104 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Fixtures shared by the tests, run from the root of the repository with:
+#
+#   pytest tests
+#
+# (python -m pytest would import the pytest.py script of the repository)
+
+import os
+import sys
+import json
+import random
+
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, root)
+
+from LNEx import core
+from LNEx.tokenizer import Twokenize
+
+################################################################################
+################################################################################
+
+@pytest.fixture(scope="session")
+def sample_tweets():
+
+    with open(os.path.join(root, "_Data", "sample_tweets.txt")) as f:
+        return [line.decode("utf-8") for line in f.read().splitlines()]
+
+################################################################################
+
+@pytest.fixture(scope="session")
+def gazetteer(sample_tweets):
+    '''The chennai gazetteer location names and the words of the names and of
+    the sample tweets as the extended_words3'''
+
+    with open(os.path.join(root, "_Data", "chennai_geo_locations.json")) as f:
+        geo_locations = json.load(f)
+
+    words = set()
+
+    for name in geo_locations:
+        words.update(name.split())
+
+    for tweet in sample_tweets:
+        words.update(x.lower() for x in Twokenize.tokenize(tweet))
+
+    return geo_locations, sorted(words)
+
+################################################################################
+
+@pytest.fixture(scope="session")
+def environment(gazetteer):
+
+    return core.init_Env(*gazetteer)
+
+################################################################################
+
+@pytest.fixture(scope="session")
+def tweets(sample_tweets, gazetteer):
+    '''The sample tweets and synthetic tweets mixing gazetteer names (with
+    repeated tokens and abbreviations) and filler words'''
+
+    names = sorted(gazetteer[0])
+
+    filler = ("the water is rising near please help stuck at on "
+              "#ChennaiFloods rd st road, people food @user "
+              "http://t.co/xyz RT : flood").split()
+
+    rnd = random.Random(0)
+
+    tweets = list(sample_tweets)
+
+    for __ in range(300):
+
+        parts = list()
+
+        for __ in range(rnd.randint(2, 10)):
+
+            if rnd.random() < 0.4:
+                name = rnd.choice(names).split()
+
+                if rnd.random() < 0.2:
+                    i = rnd.randrange(len(name))
+                    name.insert(i, name[i])
+
+                if rnd.random() < 0.5:
+                    name = [x.title() for x in name]
+
+                parts.extend(name)
+
+            else:
+                parts.append(rnd.choice(filler))
+
+        tweets.append(u" ".join(parts))
+
+    return tweets
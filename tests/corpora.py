@@ -0,0 +1,62 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Synthetic inputs of the tests, which benchmark.py times as well.
+
+import os
+import random
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+################################################################################
+################################################################################
+
+# pieces of the synthetic tweets, covering the protected tokens of Twokenize
+# (emoticons, urls, entities, numbers, abbreviations, ...) and edge punctuation
+tokenizer_pieces = [u"a", u"chennai", u"road", u" ", u" ", u"\t", u"'", u"'s",
+                    u"john's", u"don't", u":)", u":-(", u";D", u"=p",
+                    u"http://t.co/xyz", u"www.foo.com", u"bla.com.", u"&amp;",
+                    u"12:30", u"3.14", u"1,000", u"...", u"!!", u"?", u",",
+                    u"u.s.a.", u"e.g", u"--", u"\u266b", u"\u201c", u"(", u")",
+                    u"[", u"]", u"<", u">", u'"', u"#tag", u"@user", u"\xe9"]
+
+def tokenizer_corpus(size=20000, seed=0):
+    '''Returns the sample tweets and a synthetic corpus of size tweets'''
+
+    with open(os.path.join(root, "_Data", "sample_tweets.txt")) as f:
+        tweets = [line.decode("utf-8") for line in f.read().splitlines()]
+
+    rnd = random.Random(seed)
+
+    for __ in range(size):
+        tweets.append(u"".join(rnd.choice(tokenizer_pieces)
+                               for __ in range(rnd.randint(1, 25))))
+
+    return tweets
+
+################################################################################
+
+def random_ngrams(rnd, size, length):
+    '''Returns random valid ngrams of up to size spans over a text of length
+    characters, as built by the extraction, and their full location names'''
+
+    valid_ngrams = dict()
+    gazetteer_names = set()
+
+    for __ in range(size):
+
+        start = rnd.randint(0, length)
+        tokens = rnd.randint(1, 4)
+        offsets = (start, start + rnd.randint(0, 8 * tokens))
+
+        name = "name %d" % rnd.randint(0, size)
+        if rnd.random() < 0.6:
+            gazetteer_names.add(name)
+
+        valid_ngrams.setdefault(offsets, list()).append((name, tokens))
+
+    return valid_ngrams, gazetteer_names
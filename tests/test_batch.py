@@ -0,0 +1,70 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Checks that the worker processes return the outputs of Extractor.extract in
+# the order of the input tweets.
+
+import pytest
+
+from LNEx import core
+
+################################################################################
+################################################################################
+
+@pytest.fixture(scope="module")
+def extractor(environment):
+
+    return core.Extractor.from_environment(environment,
+                                           hashtag_segmenter="gazetteer")
+
+################################################################################
+
+def test_extract_batch_keeps_the_order(extractor, tweets):
+
+    expected = [extractor.extract(tweet) for tweet in tweets]
+
+    # a list and an iterator, in small chunks spread over the workers
+    assert extractor.extract_batch(tweets, workers=2, chunksize=7) == expected
+    assert extractor.extract_batch(iter(tweets), workers=2) == expected
+
+    assert extractor.extract_batch(tweets, workers=1) == expected
+
+    # a pool reused across calls
+    pool = core.WorkerPool(2, extractor)
+
+    try:
+        assert extractor.extract_batch(tweets[::-1], pool=pool) == \
+               expected[::-1]
+        assert extractor.extract_batch(tweets, chunksize=1, pool=pool) == \
+               expected
+
+    finally:
+        pool.terminate()
+
+################################################################################
+
+def test_extract_stream_keeps_the_order_in_bounded_batches(extractor, tweets):
+
+    expected = [extractor.extract(tweet) for tweet in tweets]
+
+    read = list()
+
+    def stream():
+        for tweet in tweets:
+            read.append(tweet)
+            yield tweet
+
+    outputs = extractor.extract_stream(stream(), workers=2, batch_size=13,
+                                       chunksize=3)
+
+    # the first outputs are yielded once the next batch is handed out
+    assert next(outputs) == expected[0]
+    assert len(read) == 26
+
+    assert [expected[0]] + list(outputs) == expected
+
+    assert list(extractor.extract_stream(iter(tweets))) == expected
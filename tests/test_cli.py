@@ -0,0 +1,65 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Checks python -m LNEx on JSON lines of tweets.
+
+import sys
+import json
+import subprocess
+
+from LNEx import core
+from LNEx.__main__ import to_json
+
+from conftest import root
+
+################################################################################
+################################################################################
+
+def test_cli_writes_the_results_of_every_record_in_order(environment,
+                                                          gazetteer, tweets,
+                                                          tmpdir):
+
+    geo_locations, words = tmpdir.join("geo.json"), tmpdir.join("words.json")
+
+    geo_locations.write(json.dumps(gazetteer[0]))
+    words.write(json.dumps(gazetteer[1]))
+
+    # with a blank line and a record without text
+    records = [{"id": i, "body": tweet} for i, tweet in enumerate(tweets)]
+    records.insert(5, {"id": -1})
+
+    lines = [json.dumps(x) for x in records]
+    lines.insert(3, "")
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "LNEx",
+         "--geo-locations", str(geo_locations),
+         "--extended-words3", str(words),
+         "--hashtag-segmenter", "gazetteer",
+         "--format", "jsonl", "--text-field", "body",
+         "--output-field", "places",
+         "--workers", "2", "--batch-size", "50"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        cwd=root)
+
+    stdout, stderr = process.communicate("\n".join(lines) + "\n")
+
+    assert process.returncode == 0, stderr
+
+    extractor = core.Extractor.from_environment(environment,
+                                                hashtag_segmenter="gazetteer")
+
+    results = [json.loads(line) for line in stdout.splitlines()]
+
+    assert [x["id"] for x in results] == [x["id"] for x in records]
+
+    for record, result in zip(records, results):
+
+        expected = [to_json(x) for x in
+                    extractor.extract(record.get("body", u""))]
+
+        assert result["places"] == json.loads(json.dumps(expected))
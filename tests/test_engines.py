@@ -0,0 +1,99 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# The dp engine (core.build_spans) must be interchangeable with the tree
+# (core.build_tree), see core.engines.
+
+import time
+import random
+
+from LNEx import core
+
+################################################################################
+################################################################################
+
+def random_sub_queries(env, size=500, seed=0):
+    '''Yields the token vectors of sub-queries made of gazetteer names with
+    repeated tokens, abbreviations and random gazetteer tokens'''
+
+    rnd = random.Random(seed)
+
+    names = sorted(env.gazetteer_unique_names_set)
+    tokens = sorted(set(x for name in names for x in name.split()))
+
+    for __ in range(size):
+
+        sub_query = list()
+
+        for token in rnd.choice(names).split() + \
+                     [rnd.choice(tokens) for __ in range(rnd.randint(0, 3))]:
+
+            sub_query.append(token)
+
+            if rnd.random() < 0.3:
+                sub_query.append(token)
+
+            if rnd.random() < 0.2:
+                sub_query.append(rnd.choice(["rd", "road", "st", "street"]))
+
+        yield [env.token_expansions.get(x) or [x] for x in sub_query]
+
+################################################################################
+
+def test_engines_build_the_same_ngrams(environment):
+
+    for ts in random_sub_queries(environment):
+
+        if len(ts) < 2:
+            continue
+
+        for prefixes in (None, environment.gaz_prefixes):
+
+            tree = core.build_tree(environment.glm, ts, prefixes)
+            spans = core.build_spans(environment.glm, ts, prefixes)
+
+            # in the same order too, which breaks the ties downstream
+            assert spans.items() == tree.items()
+
+################################################################################
+
+def test_engines_extract_the_same_locations(environment, tweets):
+
+    tree, dp = [core.Extractor.from_environment(environment, engine=engine,
+                                                hashtag_segmenter="gazetteer",
+                                                work_budget=(None, None))
+                for engine in ("tree", "dp")]
+
+    for tweet in tweets:
+        assert dp.extract(tweet) == tree.extract(tweet)
+
+################################################################################
+
+def test_work_budgets_of_the_engines(environment):
+
+    tree, dp = [core.Extractor.from_environment(environment, engine=engine,
+                                                hashtag_segmenter="gazetteer")
+                for engine in ("tree", "dp")]
+
+    tweet = "st " * 60 + "new avadi rd"
+
+    # the tree engine would build millions of phrases, it falls back to the
+    # exact matches instead
+    start = time.time()
+    output = tree.extract(tweet)
+
+    assert time.time() - start < 2
+    assert output.degraded
+    assert [x[2] for x in output] == [u"avadi rd"]
+
+    # within the default budget of the dp engine
+    for tweet in ["st " * 15 + "new avadi rd", "st " * 30 + "new avadi rd"]:
+
+        output = dp.extract(tweet)
+
+        assert not output.degraded
+        assert u"new avadi road" in [x[2] for x in output]
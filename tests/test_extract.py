@@ -0,0 +1,171 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Regression checks of the outputs of Extractor.extract.
+
+from LNEx import core, segmentation
+
+################################################################################
+################################################################################
+
+def geo_locations(extractor, tweet):
+
+    return sorted(x[2] for x in extractor.extract(tweet))
+
+################################################################################
+
+def test_exact_first_builds_names_around_exact_matches(environment, tweets):
+
+    extractor, exact_first = [
+        core.Extractor.from_environment(environment,
+                                        exact_first_matching=exact_first,
+                                        hashtag_segmenter="gazetteer")
+        for exact_first in (False, True)]
+
+    # "avadi rd" exactly matches a gazetteer name, which "new" extends
+    for tweet in [u"Water Stagnation in New Avadi rd and Water tank road",
+                  u"stuck near new avadi rd"]:
+
+        assert u"new avadi road" in geo_locations(exact_first, tweet)
+        assert geo_locations(exact_first, tweet) == \
+               geo_locations(extractor, tweet)
+
+    tweet = u"royapettah road road bajanai 1st st"
+    assert geo_locations(exact_first, tweet) == geo_locations(extractor, tweet)
+
+    # the names of the extraction which exact_first does not find are
+    # overlapped by longer names it finds, or found once per duplicate token
+    # which the engines collapse, e.g., "walkway walkway"
+    for tweet in tweets:
+
+        full = set(x[1] for x in extractor.extract(tweet))
+        seeded = set(x[1] for x in exact_first.extract(tweet))
+
+        for start, end in full - seeded:
+
+            inside = [(s, e) for s, e in seeded if start <= s and e <= end]
+
+            assert any(s < end and start < e and e - s > end - start
+                       for s, e in seeded - full) or \
+                   inside and min(inside)[0] == start and \
+                   max(e for s, e in inside) == end
+
+################################################################################
+
+def test_exact_first_skips_the_resolved_tokens(environment):
+
+    extractor, exact_first = [
+        core.Extractor.from_environment(environment,
+                                        exact_first_matching=exact_first,
+                                        hashtag_segmenter="gazetteer")
+        for exact_first in (False, True)]
+
+    # a long well-spelled name which is not split by stop words
+    tweet = u"Sports Development Authority Of Tamilnadu"
+
+    phrases = list()
+
+    for x in (extractor, exact_first):
+
+        x.enable_stats()
+        x.extract(tweet)
+        phrases.append(x.stats()["counters"]["phrases"])
+
+    assert geo_locations(exact_first, tweet) == \
+           [u"sports development authority of tamilnadu"]
+    assert phrases[1] == 0 < phrases[0]
+
+################################################################################
+
+def test_collapsed_duplicate_tokens_keep_their_names(environment):
+
+    extractor = core.Extractor.from_environment(environment,
+                                                hashtag_segmenter="gazetteer")
+
+    # the engines collapse the duplicate tokens, so the same name is found with
+    # and without them at overlapping offsets
+    for tweet, expected in [
+            (u"3rd cross road road don't", [u"3rd cross road"]),
+            (u"Luz Church Street st. arcot rd",
+             [u"arcot road", u"luz church street"]),
+            (u"no.4 in viduthalai 4th street st.",
+             [u"viduthalai 4th street"]),
+            (u"#MountRoadroad", [u"mount road"])]:
+
+        assert geo_locations(extractor, tweet) == expected
+
+################################################################################
+
+def test_exact_names_break_the_ties_of_overlaps(environment):
+
+    extractor = core.Extractor.from_environment(environment,
+                                                hashtag_segmenter="gazetteer")
+
+    # "police station st" is built into "police station street", which has as
+    # many tokens as the exact "vadapalani police station" it overlaps
+    for tweet, expected in [
+            (u"Vadapalani Police Station st.", [u"vadapalani police station"]),
+            (u"water at Vadapalani Police Station st now",
+             [u"vadapalani police station"]),
+            (u"Peravallur Police Station St George Gate road,",
+             [u"peravallur police station", u"st george gate"])]:
+
+        assert geo_locations(extractor, tweet) == expected
+
+################################################################################
+
+class FixedSegmenter(segmentation.HashtagSegmenter):
+
+    def _segment(self, hashtag):
+
+        return {"waterstagnation": ["water", "stagnation"],
+                "stagnation": ["stagnation"]}[hashtag]
+
+def test_only_the_stop_words_of_the_raw_tweet_split_it(environment):
+
+    def sub_queries(tweet):
+        return [x["tokens"] for x in
+                core._split_query(environment, tweet, FixedSegmenter())[2]
+                if x["tokens"]]
+
+    assert u"stagnation" in environment.stopwords_notin_gazetteer
+
+    # the words of the hashtags are not stop words, unless they are found in
+    # the raw tweet as well
+    assert sub_queries(u"#WaterStagnation 6th rd") == \
+           [["water", "stagnation", "6th", "rd"]]
+
+    assert sub_queries(u"water stagnation 6th rd") == [["water"],
+                                                       ["6th", "rd"]]
+
+    assert sub_queries(u"#Stagnation 6th rd") == [["stagnation", "6th", "rd"]]
+
+    assert sub_queries(u"#WaterStagnation stagnation 6th rd") == \
+           [["water"], ["6th", "rd"]]
+
+################################################################################
+
+def test_tweets_are_tokenized_once(environment, monkeypatch):
+
+    from LNEx.tokenizer import Twokenize
+
+    calls = list()
+    tokenize = Twokenize.tokenize
+
+    def counted_tokenize(tweet, align_tokens=True):
+        calls.append(align_tokens)
+        return tokenize(tweet, align_tokens)
+
+    monkeypatch.setattr(Twokenize, "tokenize", counted_tokenize)
+
+    extractor = core.Extractor.from_environment(environment,
+                                                hashtag_segmenter="gazetteer")
+
+    # with stop words, hashtags and location names
+    extractor.extract(u"water stagnation in 6th rd #ChennaiFloods adyar")
+
+    assert calls == [False]
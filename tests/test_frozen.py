@@ -0,0 +1,105 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Checks that a frozen environment extracts as the environment it was frozen
+# from, and the reported memory of the workers sharing it.
+
+import pytest
+
+from LNEx import core, frozen
+
+################################################################################
+################################################################################
+
+def test_frozen_maps():
+
+    names = frozen.FrozenStringMap({u"anna salai": [1, 2], "adyar": 3,
+                                    u"t\xe9st": {"main": [4]}})
+
+    assert len(names) == 3
+    assert names[u"anna salai"] == [1, 2] and names.get("adyar") == 3
+    assert names[u"t\xe9st"] == {"main": [4]} and u"t\xe9st" in names
+    assert "anna" not in names and names.get(1, 0) == 0
+    assert sorted(names) == sorted([u"anna salai", u"adyar", u"t\xe9st"])
+
+    with pytest.raises(KeyError):
+        names["salai"]
+
+    words = frozen.FrozenStringMap(str(x) for x in range(1000))
+
+    assert all(str(x) in words for x in range(1000)) and "1000" not in words
+
+    with pytest.raises(TypeError):
+        words["1"]
+
+    ids = frozen.FrozenIntMap({7: 1, 3: 2, 11: 3})
+
+    assert list(ids) == [3, 7, 11] and ids[7] == 1 and ids.get(5) is None
+
+################################################################################
+
+def test_frozen_environment_extracts_as_the_mutable_one(environment, tweets):
+
+    g_env = environment.copy()
+    g_env.freeze()
+
+    assert g_env.frozen and not environment.frozen
+
+    for exact_first in (False, True):
+
+        extractor = core.Extractor.from_environment(environment,
+                        hashtag_segmenter="gazetteer",
+                        exact_first_matching=exact_first)
+        frozen_extractor = core.Extractor.from_environment(g_env,
+                               hashtag_segmenter="gazetteer",
+                               exact_first_matching=exact_first)
+
+        assert [frozen_extractor.extract(x) for x in tweets] == \
+               [extractor.extract(x) for x in tweets]
+
+    assert [frozen_extractor.extract_exact(x) for x in tweets] == \
+           [extractor.extract_exact(x) for x in tweets]
+
+    with pytest.raises(ValueError):
+        frozen_extractor.add_locations({u"new shelter": {"main": [1]}})
+
+    assert frozen_extractor.status()["frozen"]
+
+################################################################################
+
+def test_memory_usage_of_the_workers(environment, tweets):
+
+    usage = core.memory_usage()
+
+    if usage is None:
+        pytest.skip("the memory of the processes is read from /proc")
+
+    assert set(usage) == set(["rss", "pss", "shared", "private"])
+    assert usage["rss"] >= usage["private"] > 0
+
+    g_env = environment.copy()
+    g_env.freeze()
+
+    extractor = core.Extractor.from_environment(g_env,
+                                                hashtag_segmenter="gazetteer")
+
+    pool = core.WorkerPool(2, extractor)
+
+    try:
+        assert extractor.extract_batch(tweets[:20], pool=pool) == \
+               [extractor.extract(x) for x in tweets[:20]]
+
+        workers = pool.memory_usage()
+
+    finally:
+        pool.terminate()
+
+    assert len(workers) == 2
+
+    # the forked workers share the pages of the environment
+    for usage in workers.values():
+        assert usage["shared"] > 0 and usage["pss"] < usage["rss"]
@@ -0,0 +1,184 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Checks the probabilities of the gazetteer language model against the estimates
+# of the former NLTK model, and the cache of the probabilities.
+
+import random
+from collections import defaultdict
+
+from LNEx.Language_Modeling import ScoreCache, GazBasedModel
+
+################################################################################
+################################################################################
+
+def test_cache_evictions():
+
+    for eviction, kept in [("lru", ["c", "a", "d"]),
+                           ("fifo", ["b", "c", "d"])]:
+
+        cache = ScoreCache(3, eviction)
+
+        for phrase in "abc":
+            assert cache.get(phrase) is None
+            cache.put(phrase, ord(phrase))
+
+        # a hit makes "a" the most recently used
+        assert cache.get("a") == ord("a")
+
+        cache.put("d", ord("d"))
+
+        assert [x[0] for x in cache.items()] == kept
+
+        stats = cache.stats()
+
+        assert (stats["hits"], stats["misses"], stats["evictions"],
+                stats["size"]) == (1, 3, 1, 3)
+
+    # disabled
+    cache = ScoreCache(0)
+    cache.put("a", 1.0)
+
+    assert cache.get("a") is None and cache.stats()["size"] == 0
+
+################################################################################
+
+def test_cached_probabilities(gazetteer):
+
+    geo_locations = gazetteer[0]
+
+    cached = GazBasedModel(geo_locations, cache_size=50)
+    uncached = GazBasedModel(geo_locations, cache_size=0)
+
+    names = sorted(geo_locations)
+    rnd = random.Random(0)
+
+    # the names, their sub-phrases and phrases of random tokens
+    phrases = list()
+
+    for __ in range(500):
+
+        tokens = rnd.choice(names).split()
+        start = rnd.randrange(len(tokens))
+
+        phrases.append(" ".join(tokens[start:start + rnd.randint(1, 4)]))
+        phrases.append(" ".join(rnd.choice(rnd.choice(names).split())
+                                for __ in range(rnd.randint(1, 3))))
+
+    expected = [uncached.phrase_probability(x) for x in phrases]
+
+    assert [cached.phrase_probability(x) for x in phrases] == expected
+    assert cached.phrase_probability_batch(phrases) == expected
+
+    stats = cached.cache.stats()
+
+    assert stats["hits"] > 0 and stats["size"] == 50
+    assert stats["hits"] + stats["misses"] == \
+           len(phrases) + len(set(phrases))
+
+################################################################################
+
+class ReferenceModel(object):
+    '''The maximum likelihood estimates of the former NLTK model, which counted
+    the n-grams of a copy of every name per mention in nested dictionaries'''
+
+    def __init__(self, geo_locations):
+
+        self.words = defaultdict(int)
+        self.words_count = 0
+
+        self.bigrams = defaultdict(lambda: defaultdict(int))
+        self.trigrams = defaultdict(lambda: defaultdict(int))
+
+        for ln in geo_locations:
+
+            n_gram = ln.split()
+
+            for token in n_gram:
+                self.words_count += 1
+                self.words[token] += 1
+
+            for copy in [n_gram] * len(geo_locations[ln]):
+
+                for bg in zip(copy, copy[1:]):
+                    self.bigrams[bg[0]][bg[1]] += 1
+
+                for tg in zip(copy, copy[1:], copy[2:]):
+                    self.trigrams[" ".join(tg[:2])][tg[2]] += 1
+
+    def prob(self, dist, context, token):
+
+        total = sum(dist[context].values()) if context in dist else 0
+
+        return dist[context][token] / float(total) if total else 0.0
+
+    def phrase_probability(self, phrase):
+
+        n_gram = phrase.split()
+
+        prob = self.words.get(n_gram[0], 0) / float(self.words_count)
+
+        if len(n_gram) > 1:
+            prob *= self.prob(self.bigrams, n_gram[0], n_gram[1])
+
+        for __x in range(2, len(n_gram)):
+            prob *= self.prob(self.trigrams, " ".join(n_gram[__x - 2:__x]),
+                              n_gram[__x])
+
+        return prob
+
+def random_phrases(names, rnd, n):
+
+    phrases = list()
+
+    for __ in range(n):
+
+        tokens = rnd.choice(names).split()
+        start = rnd.randrange(len(tokens))
+
+        phrase = tokens[start:start + rnd.randint(1, 5)]
+
+        # a token which may never follow the phrase
+        if rnd.random() < 0.3:
+            phrase.append(rnd.choice(rnd.choice(names).split()))
+
+        phrases.append(" ".join(phrase))
+
+    return phrases
+
+def test_probabilities_of_the_former_model(gazetteer):
+
+    geo_locations = gazetteer[0]
+
+    names = sorted(geo_locations)
+    phrases = random_phrases(names, random.Random(1), 5000)
+
+    model = GazBasedModel(geo_locations, cache_size=0)
+    reference = ReferenceModel(geo_locations)
+
+    scores = [model.phrase_probability(x) for x in phrases]
+
+    assert scores == [reference.phrase_probability(x) for x in phrases]
+    assert any(scores) and not all(scores)
+
+    # the names added and removed afterwards
+    delta = random.Random(2).sample(names, 200)
+
+    model = GazBasedModel(dict((x, geo_locations[x]) for x in names
+                               if x not in delta), cache_size=0)
+
+    for ln in delta:
+        model.add_name(ln, len(geo_locations[ln]))
+
+    for ln in delta[:100]:
+        model.remove_name(ln, len(geo_locations[ln]))
+
+    reference = ReferenceModel(dict((x, geo_locations[x]) for x in names
+                                    if x not in delta[:100]))
+
+    assert [model.phrase_probability(x) for x in phrases] == \
+           [reference.phrase_probability(x) for x in phrases]
@@ -0,0 +1,205 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Checks that core.filterout_overlaps returns the ngrams of the original
+# pairwise_filterout_overlaps, and checks of remove_shorter_duplicates which
+# runs before it and of remove_non_full_mentions which runs after it.
+
+import copy
+import random
+
+from LNEx import core
+
+from corpora import random_ngrams
+
+################################################################################
+################################################################################
+
+def filterout(valid_ngrams, gazetteer_names):
+
+    result = core.filterout_overlaps(valid_ngrams, gazetteer_names)
+
+    assert result == core.pairwise_filterout_overlaps(valid_ngrams,
+                                                      gazetteer_names)
+
+    return result
+
+################################################################################
+
+def test_filterout_overlaps_keeps_the_longest_names():
+
+    names = set(["new avadi road", "avadi road", "avadi", "road road"])
+
+    # the longer full name is kept with the ngrams not overlapping it
+    assert filterout({(0, 14): [("new avadi road", 3)],
+                      (4, 14): [("avadi road", 2)],
+                      (4, 9): [("avadi", 1)],
+                      (15, 20): [("water", 1)]}, names) == \
+           set([(0, 14), (15, 20)])
+
+    # overlapping full names of the same length filter out each other, which
+    # also holds for the same name found at overlapping offsets
+    assert filterout({(0, 10): [("avadi road", 2)],
+                      (6, 15): [("road road", 2)]}, names) == set()
+
+    assert filterout({(0, 10): [("avadi road", 2)],
+                      (0, 15): [("avadi road", 2)]}, names) == set()
+
+################################################################################
+
+def test_filterout_overlaps_matches_pairwise_filterout_overlaps():
+
+    rnd = random.Random(0)
+
+    for __ in range(3000):
+
+        size = rnd.randint(0, 30)
+        valid_ngrams, gazetteer_names = random_ngrams(
+            rnd, size, rnd.randint(1, 4 * size + 1))
+
+        # the same names found at overlapping offsets with the same length
+        for offsets, ngrams in valid_ngrams.items():
+            if rnd.random() < 0.2:
+                shift = rnd.randint(0, 8)
+                valid_ngrams.setdefault(
+                    (offsets[0] + rnd.randint(0, 1) * shift,
+                     offsets[1] + shift), list()).extend(ngrams)
+
+        filterout(valid_ngrams, gazetteer_names)
+
+        core.remove_shorter_duplicates(valid_ngrams, gazetteer_names)
+
+        filterout(valid_ngrams, gazetteer_names)
+
+################################################################################
+
+def test_remove_shorter_duplicates():
+
+    names = set(["royapettah road", "road"])
+
+    # "royapettah road road" once the consecutive duplicates are collapsed
+    valid_ngrams = {(0, 15): [("royapettah road", 2)],
+                    (0, 20): [("royapettah road", 2)],
+                    (11, 15): [("road", 1), ("rd", 1)],
+                    (16, 20): [("road", 1)],
+                    (11, 20): [("road", 1)]}
+
+    core.remove_shorter_duplicates(valid_ngrams, names)
+
+    assert valid_ngrams == {(0, 20): [("royapettah road", 2)],
+                            (11, 15): [("rd", 1)],
+                            (11, 20): [("road", 1)]}
+
+    assert filterout(valid_ngrams, names) == set([(0, 20)])
+
+    # the same name at offsets not covering each other is kept
+    valid_ngrams = {(0, 4): [("road", 1)],
+                    (2, 8): [("road", 1)],
+                    (10, 14): [("road", 1)]}
+
+    expected = copy.deepcopy(valid_ngrams)
+
+    core.remove_shorter_duplicates(valid_ngrams, names)
+
+    assert valid_ngrams == expected
+
+################################################################################
+
+def scan_non_full_mentions(filtered_n_grams, valid_ngrams, query_tokens,
+                           gazetteer_names):
+    '''The original remove_non_full_mentions, which scans all the query tokens
+    for every full name found inside an ngram'''
+
+    final_set = set()
+
+    for ngram_offsets in filtered_n_grams:
+
+        ngram = valid_ngrams[ngram_offsets]
+
+        full_names = [x[0] for x in ngram if x[0] in gazetteer_names]
+
+        if full_names:
+            final_set.add((ngram_offsets, full_names[0]))
+            continue
+
+        for ngram_tuple in ngram:
+
+            unigrams = ngram_tuple[0].split()
+
+            for n in range(len(unigrams), 0, -1):
+                for new_ngram in core.find_ngrams(unigrams, n):
+
+                    candidate_ln = " ".join(new_ngram)
+
+                    if candidate_ln not in gazetteer_names:
+                        continue
+
+                    for query_token in query_tokens:
+
+                        if ngram_offsets[0] <= query_token[1] and \
+                           ngram_offsets[1] - 1 >= query_token[2] and \
+                           candidate_ln == query_token[0]:
+
+                            final_set.add(((query_token[1],
+                                            query_token[2] + 1), candidate_ln))
+
+    return final_set
+
+def test_remove_non_full_mentions_finds_the_names_inside_the_ngrams():
+
+    names = set(["adyar", "anna salai", "the"])
+
+    # "the adyar bridge adyar", the query tokens are not sorted
+    query_tokens = [("adyar", 18, 22), ("the", 0, 2), ("adyar", 4, 8),
+                    ("bridge", 10, 15)]
+
+    valid_ngrams = {(0, 16): [("the adyar bridge", 3)],
+                    (18, 23): [("adyar", 1)],
+                    (4, 23): [("adyar bridge adyar", 3)]}
+
+    assert core.remove_non_full_mentions([(0, 16), (18, 23)], valid_ngrams,
+                                         query_tokens, names) == \
+           set([((0, 3), "the"), ((4, 9), "adyar"), ((18, 23), "adyar")])
+
+    # both adyar tokens are inside the ngram
+    assert core.remove_non_full_mentions([(4, 23)], valid_ngrams,
+                                         query_tokens, names) == \
+           set([((4, 9), "adyar"), ((18, 23), "adyar")])
+
+    rnd = random.Random(0)
+
+    words = ["adyar", "anna", "salai", "the", "bridge", "of", "near"]
+
+    # long posts with repeated tokens and many partial ngrams
+    for __ in range(20):
+
+        query_tokens = list()
+        start = 0
+
+        for __ in range(rnd.randint(1, 400)):
+
+            word = rnd.choice(words)
+
+            query_tokens.append((word, start, start + len(word) - 1))
+            start += len(word) + rnd.randint(1, 2)
+
+        valid_ngrams = dict()
+
+        for __ in range(rnd.randint(1, 100)):
+
+            first = rnd.randrange(len(query_tokens))
+            tokens = query_tokens[first:first + rnd.randint(1, 4)]
+
+            valid_ngrams[(tokens[0][1], tokens[-1][2] + 1)] = \
+                [(" ".join(x[0] for x in tokens), len(tokens))]
+
+        rnd.shuffle(query_tokens)
+
+        assert core.remove_non_full_mentions(list(valid_ngrams), valid_ngrams,
+                                             query_tokens, names) == \
+               scan_non_full_mentions(list(valid_ngrams), valid_ngrams,
+                                      query_tokens, names)
@@ -0,0 +1,89 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Checks of the pre-filter rejecting the tweets with no gazetteer vocabulary.
+
+import random
+
+from LNEx import core
+
+################################################################################
+################################################################################
+
+def test_rejected_tweets_do_not_reach_the_segmenter(environment, monkeypatch):
+
+    extractor = core.Extractor.from_environment(environment,
+                                                hashtag_segmenter="gazetteer")
+
+    segmenter = extractor.segmenter()
+
+    segmented = list()
+    segment = type(segmenter).segment
+
+    def counted_segment(self, text):
+        segmented.append(text)
+        return segment(self, text)
+
+    # patched on the class, an instance attribute left by the patch would keep
+    # the shared environment from being pickled
+    monkeypatch.setattr(type(segmenter), "segment", counted_segment)
+
+    for tweet in [u"#HelpNeeded", u"thank you #ThankYou",
+                  u"RT @user: #KeepCalm everyone http://t.co/xyz"]:
+
+        assert extractor.extract(tweet) == []
+
+    assert segmented == []
+    assert extractor.prefilter.stats()["rejected"] == 3
+
+    # the single letters of a hashtag may be segments, e.g., "s" (south) of
+    # #SaveTheBabies with the unigrams of the gazetteer
+    for tweet in [u"water stagnation in #AdyarBridge",
+                  u"please help #SaveTheBabies"]:
+
+        assert extractor.extract(tweet)
+
+    assert segmented == ["adyarbridge", "savethebabies"]
+
+################################################################################
+
+def test_raw_check_keeps_the_tweets_with_gazetteer_vocabulary(environment,
+                                                              tweets):
+
+    segmenter = environment.gaz_segmenter
+
+    rnd = random.Random(0)
+
+    pieces = [u"#", u"@", u"http", u"https", u"\n", u".", u",", u"-", u"'",
+              u":)", u"=p", u"&amp;", u"www.foo.com", u" "]
+
+    queries = list()
+
+    for tweet in tweets:
+
+        tweet = tweet.lower()
+        queries.append(tweet)
+
+        # with the hashtags, urls and punctuations of preprocess_and_map
+        # inserted inside the words
+        for __ in range(3):
+            chars = list(tweet)
+            for __ in range(rnd.randint(1, 6)):
+                chars.insert(rnd.randint(0, len(chars)), rnd.choice(pieces))
+            queries.append(u"".join(chars))
+
+    for query in queries:
+
+        query = core.strip_non_ascii(query)
+
+        text, offsets = core.preprocess_and_map(query, segmenter.segment)
+
+        if core.has_gazetteer_vocabulary(environment,
+                                         core.align_tokens(text, offsets)):
+            assert core.has_raw_gazetteer_vocabulary(environment, query)
+            assert core.has_raw_gazetteer_vocabulary(environment, query,
+                                                     segmenter)
@@ -0,0 +1,72 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Regression checks of preprocess_and_map and align_tokens, which map the
+# characters of the preprocessed tweet back to the raw tweet.
+
+from LNEx import core
+
+################################################################################
+################################################################################
+
+hashtag_segments = {"mountroadroad": ["mount", "road", "road"],
+                    "chennaifloods": ["chennai", "floods"],
+                    "chennai_rains": ["chennai", "rains"]}
+
+def segment(hashtag):
+
+    return hashtag_segments.get(hashtag, [hashtag])
+
+################################################################################
+
+def test_preprocessing_follows_the_original_steps():
+
+    # the outputs of the preprocessing steps applied one after the other,
+    # including their quirks around "http" and the hashtags
+    expected = [
+        ("#h\nhttpschennai@chennai     :!roadhttps", "hchennai : ! roads"),
+        ("@\nhttpshttps b_  \t", "b_"),
+        ("https ##chennaifloods!", "s #chennai floods !"),
+        ("#chennaifloods#chennaifloods", "chennai floodschennai floods"),
+        ("a.b #chennai_rains 6th rd", "a.b chennairains 6th rd"),
+        ("#mountroadroad", "mount road road"),
+        ("rt @user: #chennaifloods near adyar-bridge. https://t.co/x",
+         "chennai floods near adyar bridge ."),
+        ("go to http://x.com/a?b=c now", "go to now"),
+        ("\x01mount\x02 road..", "mount road..")]
+
+    for tweet, preprocessed in expected:
+
+        assert core.preprocess_tweet(tweet, segment) == preprocessed
+
+        text, offsets = core.preprocess_and_map(tweet, segment)
+
+        assert text == preprocessed
+        assert len(offsets) == len(text)
+        assert offsets == sorted(offsets)
+
+################################################################################
+
+def test_tokens_are_aligned_to_the_raw_tweet():
+
+    for tweet in ["3rd cross road road don't",
+                  "luz church street st. arcot rd",
+                  "no.4 in viduthalai 4th street st.",
+                  "rt @user: water in e street st (near adyar-bridge). http://x",
+                  "nandabakkam police station st. dr vsi estate"]:
+
+        text, offsets = core.preprocess_and_map(tweet, segment)
+
+        for token, start, end in core.align_tokens(text, offsets):
+            assert tweet[start:end + 1] == token
+
+    # the segments of a hashtag span its characters
+    text, offsets = core.preprocess_and_map("near #mountroadroad", segment)
+
+    assert [(start, end) for __, start, end in
+            core.align_tokens(text, offsets)] == [(0, 3), (6, 10), (11, 14),
+                                                  (15, 18)]
@@ -0,0 +1,47 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+import pytest
+
+from LNEx import core, segmentation
+
+################################################################################
+################################################################################
+
+hashtag_tweets = [u"#ChennaiFloods near #AnnaSalai", u"#MountRoad is closed",
+                  u"rains at #Velachery #ChennaiRains"] * 4
+
+################################################################################
+
+def test_hashtag_segmenter_is_abstract():
+
+    with pytest.raises(TypeError):
+        segmentation.HashtagSegmenter()
+
+################################################################################
+
+def test_workers_send_back_their_hashtag_segmentations(environment):
+
+    extractor = core.Extractor.from_environment(environment,
+                                                hashtag_segmenter="gazetteer")
+
+    cache = extractor.segmenter().cache
+
+    cache.clear()
+    outputs = extractor.extract_batch(hashtag_tweets, workers=1)
+    segmentations = sorted(cache.items())
+
+    assert segmentations
+
+    cache.clear()
+    assert extractor.extract_batch(hashtag_tweets, workers=2) == outputs
+    assert sorted(cache.items()) == segmentations
+
+    cache.clear()
+    assert list(extractor.extract_stream(hashtag_tweets, workers=2,
+                                         batch_size=5)) == outputs
+    assert sorted(cache.items()) == segmentations
@@ -0,0 +1,157 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Checks the HTTP extraction service on an ephemeral port.
+
+import json
+import httplib
+import threading
+
+import pytest
+
+from LNEx import core, serve
+from LNEx.__main__ import to_json
+
+################################################################################
+################################################################################
+
+@pytest.fixture
+def server(environment):
+
+    extractor = core.Extractor.from_environment(environment,
+                                                hashtag_segmenter="gazetteer")
+
+    server = serve.Server(("127.0.0.1", 0), serve.Handler)
+
+    server.batcher = serve.MicroBatcher(extractor, batch_wait=0.05)
+    server.metrics = serve.Metrics()
+    server.max_request_bytes = 1 << 20
+    server.access_log = False
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+def post(server, body, headers={}):
+
+    connection = httplib.HTTPConnection(*server.server_address)
+    connection.request("POST", "/extract", body, headers)
+
+    response = connection.getresponse()
+
+    return response.status, json.loads(response.read())
+
+################################################################################
+
+def test_concurrent_requests_are_batched_in_order(server, tweets):
+
+    extractor = server.batcher.extractor
+
+    requests = [tweets[i:i + 7] for i in range(0, 70, 7)]
+    responses = [None] * len(requests)
+
+    def send(i):
+        responses[i] = post(server, json.dumps({"texts": requests[i]}))
+
+    threads = [threading.Thread(target=send, args=(i,))
+               for i in range(len(requests))]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    for texts, (status, body) in zip(requests, responses):
+
+        assert status == 200
+        assert body["results"] == [
+            {"locations": json.loads(json.dumps([to_json(x) for x in
+                                                 extractor.extract(text)]))}
+            for text in texts]
+
+    # the requests waiting for a batch are extracted together
+    stats = server.batcher.stats()
+
+    assert stats["batched_texts"] == 70 and stats["batches"] < len(requests)
+    assert stats["caches"]["language_model"]["misses"] > 0
+
+    assert server.metrics.requests == {200: len(requests)}
+
+################################################################################
+
+def test_invalid_requests(server):
+
+    assert post(server, "[1, 2]")[0] == 400
+    assert post(server, '{"tweets": []}')[0] == 400
+    assert post(server, "[]", {"Content-Length": "-1"})[0] == 400
+
+    # without a content length
+    connection = httplib.HTTPConnection(*server.server_address)
+    connection.putrequest("POST", "/extract")
+    connection.endheaders()
+
+    assert connection.getresponse().status == 400
+
+################################################################################
+
+class FailingExtractor(object):
+
+    def __init__(self, error):
+        self.error = error
+
+    def extract_batch(self, texts, workers=None, chunksize=None, pool=None):
+        raise self.error
+
+def test_failed_batches_do_not_leave_requests_waiting():
+
+    batcher = serve.MicroBatcher(FailingExtractor(ValueError("bad")))
+
+    with pytest.raises(ValueError):
+        batcher.extract([u"adyar"])
+
+    # the batcher thread is stopped by the next batch, but its requests and
+    # the later ones still return
+    batcher.extractor = FailingExtractor(SystemExit())
+
+    with pytest.raises(SystemExit):
+        batcher.extract([u"adyar"])
+
+    batcher.thread.join()
+
+    with pytest.raises(RuntimeError):
+        batcher.extract([u"adyar"])
+
+################################################################################
+
+def test_batches_of_a_worker_pool(environment, tweets):
+
+    extractor = core.Extractor.from_environment(environment,
+                                                hashtag_segmenter="gazetteer")
+
+    pool = core.WorkerPool(2, extractor)
+
+    try:
+        batcher = serve.MicroBatcher(extractor, pool, workers=2)
+
+        assert batcher.extract(tweets[:50]) == \
+               [extractor.extract(tweet) for tweet in tweets[:50]]
+
+        caches = batcher.stats()["caches"]
+
+    finally:
+        pool.terminate()
+
+    # summed over the workers which extracted the chunks
+    assert 1 <= len(pool.caches) <= 2
+    assert caches["language_model"]["misses"] > 0
+    assert caches["hashtags"]["hits"] + caches["hashtags"]["misses"] > 0
@@ -0,0 +1,79 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Checks that an environment loaded from a snapshot extracts as the environment
+# which was saved.
+
+import ctypes
+import struct
+
+import pytest
+
+from LNEx import core, snapshot
+
+################################################################################
+################################################################################
+
+def outputs(extractor, tweets):
+
+    return [extractor.extract(tweet) for tweet in tweets]
+
+################################################################################
+
+def test_snapshots_extract_as_the_saved_environment(environment, tweets,
+                                                    tmpdir):
+
+    extractor = core.Extractor.from_environment(environment,
+                                                hashtag_segmenter="gazetteer")
+
+    expected = outputs(extractor, tweets)
+
+    path = str(tmpdir.join("env.lnex"))
+    extractor.save(path)
+
+    loaded = core.Extractor.load(path, hashtag_segmenter="gazetteer")
+
+    # the count tables of the language model are mapped from the file
+    assert isinstance(loaded.env.glm.bigrams.successors, ctypes.Array)
+
+    assert outputs(loaded, tweets) == expected
+
+    # saved again from the mapped arrays
+    resaved = str(tmpdir.join("resaved.lnex"))
+    loaded.save(resaved)
+
+    assert outputs(core.Extractor.load(resaved, hashtag_segmenter="gazetteer"),
+                   tweets) == expected
+
+    # a frozen environment
+    loaded.freeze()
+    loaded.save(resaved)
+
+    assert outputs(core.Extractor.load(resaved, hashtag_segmenter="gazetteer"),
+                   tweets) == expected
+
+################################################################################
+
+def test_invalid_snapshots(environment, tmpdir):
+
+    path = tmpdir.join("env.lnex")
+
+    path.write("not a snapshot")
+
+    with pytest.raises(ValueError):
+        snapshot.load_environment(str(path))
+
+    snapshot.save_environment(environment, str(path))
+
+    # saved by another version
+    data = path.read("rb")
+    path.write(data[:len(snapshot.MAGIC)] +
+               struct.pack("<I", snapshot.VERSION + 1) +
+               data[len(snapshot.MAGIC) + 4:], "wb")
+
+    with pytest.raises(ValueError):
+        snapshot.load_environment(str(path))
@@ -0,0 +1,108 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Checks the opt-in stage times and work counters of the extraction, recorded
+# by this process and by the forked workers.
+
+from LNEx import core
+
+################################################################################
+################################################################################
+
+def work(extractor, tweets):
+    '''Returns the counters of ExtractionStats summed over the tweets, counted
+    by extracting them with their own work budgets'''
+
+    totals = dict.fromkeys(core.ExtractionStats.counters, 0)
+
+    for tweet in tweets:
+
+        budget = core.WorkBudget(*core.default_work_budgets[extractor.engine])
+        extractor._extract(extractor.env, tweet, budget, core.null_timer)
+
+        for counter, value in zip(core.ExtractionStats.counters,
+                                  (1, budget.degraded, budget.sub_queries,
+                                   budget.degraded_sub_queries, budget.nodes,
+                                   budget.spent, budget.scored)):
+            totals[counter] += value
+
+    return totals
+
+################################################################################
+
+def test_stats_of_the_extraction(environment, tweets):
+
+    extractor = core.Extractor.from_environment(environment,
+                                                hashtag_segmenter="gazetteer")
+
+    assert extractor.stats() is None
+
+    extractor.enable_stats()
+
+    outputs = [extractor.extract(tweet) for tweet in tweets]
+
+    stats = extractor.stats()
+    rejected = extractor.prefilter.stats()["rejected"]
+
+    expected = work(extractor, tweets)
+
+    assert stats["counters"] == expected
+    assert expected["sub_queries"] > 0 and expected["phrases"] > 0
+    assert expected["lm_calls"] > 0
+
+    stages = stats["stages"]
+
+    # every tweet runs the first stages, the tweets which are not rejected by
+    # the pre-filter the last ones and the tree only for their sub-queries
+    for stage in ("tweet", "strip_non_ascii", "prefilter"):
+        assert stages[stage]["count"] == len(tweets)
+
+    assert stages["output"]["count"] == len(tweets) - rejected
+
+    assert 0 < stages["build_tree"]["count"] <= len(tweets)
+
+    for histogram in stages.values():
+
+        assert histogram["buckets"][-1] == (None, histogram["count"])
+        assert histogram["sum"] >= 0
+
+    assert stages["tweet"]["sum"] >= stages["build_tree"]["sum"]
+
+    assert set(stats["initialization"]) >= set(["dictionaries",
+                                                "language_model"])
+
+    # the tweets extracted by the workers are recorded in the shared counters
+    extractor.extraction_stats.clear()
+
+    assert extractor.stats()["counters"] == \
+           dict.fromkeys(core.ExtractionStats.counters, 0)
+
+    assert extractor.extract_batch(tweets, workers=2) == outputs
+    assert extractor.stats()["counters"] == expected
+
+    extractor.disable_stats()
+
+    assert extractor.stats() is None
+
+################################################################################
+
+def test_stats_of_the_degraded_tweets(environment):
+
+    extractor = core.Extractor.from_environment(environment,
+                                                hashtag_segmenter="gazetteer",
+                                                work_budget=(100, 50))
+    extractor.enable_stats()
+
+    extractor.extract(u"st " * 30 + u"new avadi rd")
+
+    counters = extractor.stats()["counters"]
+
+    assert counters["tweets"] == 1 and counters["degraded_tweets"] == 1
+    assert counters["degraded_sub_queries"] >= 1
+    assert counters["phrases"] <= 100
+
+    assert extractor.stats()["stages"]["degraded_matches"]["count"] == 1
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Checks that the single scan of Twokenize.scan_tokenize returns the tokens of
+# the original simple_tokenize.
+
+from LNEx.tokenizer import Twokenize
+
+from corpora import tokenizer_corpus
+
+################################################################################
+################################################################################
+
+def test_scan_tokenize_edge_cases():
+
+    expected = [
+        # punctuation
+        (u"wait... what!!?", [u"wait", u"...", u"what", u"!!?"]),
+        (u"(adyar) [road]", [u"(", u"adyar", u")", u"[", u"road", u"]"]),
+        (u"'chennai'", [u"'", u"chennai", u"'"]),
+        (u"“chennai”", [u"“chennai”"]),
+        (u"a--b ♫", [u"a", u"--", u"b", u"♫"]),
+        (u"john's road, don't go", [u"john", u"'s", u"road", u",", u"don't",
+                                    u"go"]),
+        (u"'s's", [u"'", u"s", u"'s"]),
+        (u"at 12:30 3.14 1,000", [u"at", u"12:30", u"3.14", u"1,000"]),
+        (u"u.s.a. e.g. etc.", [u"u.s.a.", u"e.g.", u"etc", u"."]),
+        (u"url&amp;more", [u"url", u"&amp;", u"more"]),
+        # urls
+        (u"go to bla.com.", [u"go", u"to", u"bla.com", u"."]),
+        (u"see http://t.co/xyz, now", [u"see", u"http://t.co/xyz", u",",
+                                       u"now"]),
+        (u"http://t.co/a... and", [u"http://t.co/a", u"...", u"and"]),
+        (u"(www.foo.com)", [u"(", u"www.foo.com", u")"]),
+        (u"visit <http://x.com/a>", [u"visit", u"<", u"http://x.com/a", u">"]),
+        # emoticons
+        (u"ok :) :-( ;D =p :P", [u"ok", u":)", u":-(", u";D", u"=p", u":P"]),
+        (u"happy:)", [u"happy", u":)"]),
+        (u"(:", [u"(", u":"])]
+
+    for text, tokens in expected:
+
+        assert Twokenize.simple_tokenize(text) == tokens
+        assert Twokenize.scan_tokenize(text) == tokens
+
+################################################################################
+
+def test_scan_tokenize_returns_the_tokens_of_simple_tokenize():
+
+    # the sample tweets and synthetic ones mixing the protected tokens
+    for tweet in tokenizer_corpus(size=5000, seed=1):
+
+        tweet = Twokenize.squeeze_whitespace(tweet)
+
+        assert Twokenize.scan_tokenize(tweet) == \
+               Twokenize.simple_tokenize(tweet)
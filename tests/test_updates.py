@@ -0,0 +1,133 @@
+"""#############################################################################
+Copyright 2017 Hussein S. Al-Olimat, hussein@knoesis.org
+
+This software is released under the GNU Affero General Public License (AGPL)
+v3.0 License.
+#############################################################################"""
+
+# Checks the updates and the background rebuilds of the environment of an
+# extractor, which must extract as a fresh build of the updated gazetteer.
+
+import random
+import threading
+
+from LNEx import core
+
+################################################################################
+################################################################################
+
+def outputs(extractor, tweets):
+
+    return [extractor.extract(tweet) for tweet in tweets]
+
+################################################################################
+
+def test_added_and_removed_locations_extract_as_a_fresh_build(environment,
+                                                               gazetteer,
+                                                               tweets):
+
+    geo_locations, words = gazetteer
+
+    names = sorted(geo_locations)
+    delta = random.Random(0).sample(names, 300)
+
+    # the extractor of the full gazetteer without the names of the delta
+    extractor = core.Extractor.from_environment(
+                    core.init_Env(dict((x, geo_locations[x]) for x in names
+                                       if x not in delta), words),
+                    hashtag_segmenter="gazetteer")
+
+    previous = extractor.env
+
+    assert extractor.add_locations(dict((x, geo_locations[x])
+                                        for x in delta)) == 1
+
+    full = core.Extractor.from_environment(environment,
+                                           hashtag_segmenter="gazetteer")
+
+    assert outputs(extractor, tweets) == outputs(full, tweets)
+
+    # the update is applied to a copy, which is swapped in
+    assert extractor.env is not previous
+    assert not previous.gazetteer_unique_names_set & set(delta)
+
+    assert extractor.remove_locations(delta) == 2
+
+    fresh = core.Extractor.from_environment(previous,
+                                            hashtag_segmenter="gazetteer")
+
+    assert outputs(extractor, tweets) == outputs(fresh, tweets)
+
+################################################################################
+
+def test_rebuilds_are_swapped_in_while_extracting(environment, gazetteer,
+                                                  tweets):
+
+    geo_locations, words = gazetteer
+
+    names = sorted(geo_locations)
+    delta = set(random.Random(1).sample(names, 300))
+
+    extractor = core.Extractor.from_environment(
+                    core.init_Env(dict((x, geo_locations[x]) for x in names
+                                       if x not in delta), words),
+                    hashtag_segmenter="gazetteer")
+
+    previous = extractor.env
+    expected = outputs(extractor, tweets)
+
+    # extract the tweets over and over until the rebuild is swapped in
+    stop = threading.Event()
+    errors = list()
+
+    def extract():
+
+        try:
+            while not stop.is_set():
+                outputs(extractor, tweets[:20])
+
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=extract) for __ in range(2)]
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        thread = extractor.rebuild(geo_locations, words)
+
+        assert extractor.status()["rebuilding"]
+
+        thread.join()
+
+    finally:
+        stop.set()
+
+        for thread in threads:
+            thread.join()
+
+    assert not errors
+
+    status = extractor.status()
+
+    assert status["version"] == 1 and not status["rebuilding"]
+    assert status["rebuild_time"] > 0 and status["swap_latency"] >= 0
+    assert status["rebuild_error"] is None
+
+    full = core.Extractor.from_environment(environment,
+                                           hashtag_segmenter="gazetteer")
+
+    assert outputs(extractor, tweets) == outputs(full, tweets)
+
+    # a tweet which started on the previous environment finishes on it
+    assert extractor.env is not previous
+    assert [extractor._extract(previous, x, core.WorkBudget(), core.null_timer)
+            for x in tweets] == [list(x) for x in expected]
+
+    # a failed rebuild keeps the environment
+    extractor.rebuild(None, words, wait=True)
+
+    status = extractor.status()
+
+    assert status["version"] == 1 and status["rebuild_error"] is not None